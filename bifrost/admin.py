@@ -1,6 +1,7 @@
 from django.contrib import admin
 from .models import CustomerUser
-from .models import UploadHistory
+from .models import UploadHistory, ProcessingJob
+from .jobs import retry_jobs
 from django.utils.html import format_html
 
 admin.site.register(CustomerUser)
@@ -12,7 +13,9 @@ class UploadHistoryAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'get_conversion_option', 'get_uploaded_image', 'created_at')
     list_filter = ('framework_type', 'css_style', 'created_at')
     search_fields = ('user__username', 'framework_type', 'css_style')
-    readonly_fields = ('created_at', 'get_uploaded_image', 'get_conversion_option')
+    # Generated code lives in deduplicated blobs shared between uploads
+    readonly_fields = ('created_at', 'get_uploaded_image', 'get_conversion_option',
+                       'html_code', 'css_code', 'js_code')
     
     fieldsets = (
         ('User Information', {
@@ -37,4 +40,20 @@ class UploadHistoryAdmin(admin.ModelAdmin):
 
     def get_conversion_option(self, obj):
         return f"{obj.get_framework_type_display()} - {obj.get_css_style_display()}"
-    get_conversion_option.short_description = 'Conversion Option'
\ No newline at end of file
+    get_conversion_option.short_description = 'Conversion Option'
+
+
+@admin.register(ProcessingJob)
+class ProcessingJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'user', 'image_name', 'attempts', 'created_at')
+    list_filter = ('kind', 'status', 'created_at')
+    search_fields = ('user__username', 'image_name')
+    readonly_fields = ('upload', 'batch_key', 'created_at', 'started_at', 'finished_at', 'error')
+    exclude = ('image_data',)
+    actions = ['retry']
+
+    @admin.action(description="Retry failed jobs")
+    def retry(self, request, queryset):
+        # Failed image uploads keep their bytes for this (see jobs.KEEP_UPLOAD_ON_FAILURE)
+        count = retry_jobs(queryset)
+        self.message_user(request, f"Queued {count} job(s) again")
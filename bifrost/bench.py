@@ -0,0 +1,463 @@
+import difflib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+from PIL import Image, PngImagePlugin
+
+from bifrost.ocr_pool import ReaderPool, current_rss_mb
+from bifrost.pipeline import StageExecutor
+from bifrost.runtime import ThreadPolicy, apply_thread_policy, available_cpus
+
+FIXTURE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.bmp')
+
+# Real screenshots dropped here are benchmarked along with the synthetic ones
+DEFAULT_FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'bench')
+
+# Run in this order; each is a Benchmark.stage_<name> method
+STAGES = ('decode', 'preprocess', 'detect_components', 'extract_text', 'match_text',
+          'generate_code', 'render_preview', 'end_to_end_cold', 'end_to_end_warm', 'end_to_end_cached')
+
+WORDS = ('Sign in', 'Submit', 'Cancel', 'Email address', 'Password', 'Dashboard', 'Settings',
+         'Search', 'Next', 'Total revenue', 'Add to cart', 'Profile', 'Learn more', 'Subscribe')
+
+
+def synthetic_screenshot(width=1440, height=900, density=1.0, seed=0):
+    """A fake UI screenshot: a header bar and a grid of cards holding text,
+    inputs and buttons. ``density`` scales the number of cards."""
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width, 3), 246, dtype=np.uint8)
+    font = cv2.FONT_HERSHEY_SIMPLEX
+
+    cv2.rectangle(image, (0, 0), (width, 64), (60, 40, 30), -1)
+    cv2.putText(image, 'Bifrost', (24, 42), font, 1.0, (255, 255, 255), 2, cv2.LINE_AA)
+
+    card_w, card_h, gap = 320, 260, 24
+    cols = max(1, (width - gap) // (card_w + gap))
+    rows = max(1, (height - 64 - gap) // (card_h + gap))
+    cards = [(r, c) for r in range(rows) for c in range(cols)]
+    count = min(len(cards), max(1, int(round(len(cards) * density))))
+    for index in sorted(rng.choice(len(cards), size=count, replace=False).tolist()):
+        r, c = cards[index]
+        x, y = gap + c * (card_w + gap), 64 + gap + r * (card_h + gap)
+        cv2.rectangle(image, (x, y), (x + card_w, y + card_h), (255, 255, 255), -1)
+        cv2.rectangle(image, (x, y), (x + card_w, y + card_h), (200, 200, 200), 2)
+        cv2.putText(image, str(rng.choice(WORDS)), (x + 16, y + 36), font, 0.8, (40, 40, 40), 2,
+                    cv2.LINE_AA)
+        # Input field with a placeholder
+        cv2.rectangle(image, (x + 16, y + 60), (x + card_w - 16, y + 110), (255, 255, 255), -1)
+        cv2.rectangle(image, (x + 16, y + 60), (x + card_w - 16, y + 110), (150, 150, 150), 2)
+        cv2.putText(image, str(rng.choice(WORDS)), (x + 28, y + 93), font, 0.6, (140, 140, 140), 1,
+                    cv2.LINE_AA)
+        # Button
+        colour = tuple(int(v) for v in rng.integers(40, 200, size=3))
+        cv2.rectangle(image, (x + 16, y + 140), (x + 176, y + 190), colour, -1)
+        cv2.putText(image, str(rng.choice(WORDS))[:10], (x + 30, y + 173), font, 0.6, (255, 255, 255), 2,
+                    cv2.LINE_AA)
+        cv2.putText(image, str(rng.choice(WORDS)), (x + 16, y + 230), font, 0.5, (90, 90, 90), 1,
+                    cv2.LINE_AA)
+    return image
+
+
+def encode_png(image, run=None):
+    """PNG bytes of a BGR image; ``run`` adds a text chunk so that identical
+    pixels still get distinct bytes (and miss the result cache)"""
+    info = None
+    if run is not None:
+        info = PngImagePlugin.PngInfo()
+        info.add_text('bench-run', str(run))
+    buffer = io.BytesIO()
+    Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)).save(buffer, 'PNG', pnginfo=info)
+    return buffer.getvalue()
+
+
+def synthetic_fixtures(sizes, densities, seed=0):
+    """[(name, png bytes)] for every size x density"""
+    fixtures = []
+    for width, height in sizes:
+        for density in densities:
+            image = synthetic_screenshot(width, height, density, seed)
+            fixtures.append((f'synthetic-{width}x{height}-d{density:g}', encode_png(image)))
+    return fixtures
+
+
+def directory_fixtures(path):
+    """[(name, bytes)] for the images in a directory of real screenshots"""
+    fixtures = []
+    for name in sorted(os.listdir(path)):
+        if name.lower().endswith(FIXTURE_EXTENSIONS):
+            with open(os.path.join(path, name), 'rb') as f:
+                fixtures.append((name, f.read()))
+    return fixtures
+
+
+class RssSampler:
+    """Samples this process's resident memory from a thread while active"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start_mb = self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def __enter__(self):
+        self.start_mb = self.peak_mb = current_rss_mb()
+        self._thread = threading.Thread(target=self._run, name='bench-rss', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+
+def summarize(samples_ms, items, peak_mb, start_mb):
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    total_s = samples.sum() / 1000.0
+    return {
+        'runs': len(samples),
+        'p50_ms': round(float(np.percentile(samples, 50)), 3),
+        'p95_ms': round(float(np.percentile(samples, 95)), 3),
+        'p99_ms': round(float(np.percentile(samples, 99)), 3),
+        'mean_ms': round(float(samples.mean()), 3),
+        'min_ms': round(float(samples.min()), 3),
+        'throughput_per_s': round(items / total_s, 3) if total_s else None,
+        'peak_rss_mb': round(peak_mb, 1),
+        'rss_growth_mb': round(peak_mb - start_mb, 1),
+    }
+
+
+class Fixture:
+    """One benchmark input, with the intermediate results later stages start from"""
+
+    def __init__(self, name, data, processor):
+        self.name = name
+        self.data = data
+        self.image = processor.load_image_bytes(data)
+        self.layout = None
+
+
+class Benchmark:
+    """Runs every stage of one ImageProcessor configuration over the fixtures"""
+
+    def __init__(self, processor, fixtures, repeat=5, warmup=1, cold_runs=1, stages=STAGES):
+        self.processor = processor
+        self.fixtures = [Fixture(name, data, processor) for name, data in fixtures]
+        self.repeat = max(1, repeat)
+        self.warmup = max(0, warmup)
+        self.cold_runs = max(1, cold_runs)
+        self.stages = [stage for stage in STAGES if stage in stages]
+        # fixture name -> OCR text blocks / components, for accuracy comparisons
+        self.texts = {}
+        self.components = {}
+        self._runs = 0
+
+    def unique_bytes(self, fixture):
+        self._runs += 1
+        return encode_png(fixture.image, run=f'{id(self)}-{self._runs}')
+
+    def layout_for(self, fixture):
+        """Analysis the code generation and preview stages start from"""
+        if fixture.layout is None:
+            fixture.layout = self.processor.analyze_image(fixture.image)
+        return fixture.layout
+
+    # Stage bodies: each runs once for one fixture, or for what the stage's
+    # prepare_ method (run outside the timer) made of it
+
+    def stage_decode(self, fixture):
+        self.processor.load_image_bytes(fixture.data)
+
+    def prepare_preprocess(self, fixture):
+        return self.processor.detect_working_copy(fixture.image)[0]
+
+    def stage_preprocess(self, working):
+        self.processor.preprocess_image(working)
+
+    def stage_detect_components(self, fixture):
+        self.components[fixture.name] = self.processor.detect_components_stage(fixture.image)
+
+    def stage_extract_text(self, fixture):
+        self.texts[fixture.name] = self.processor.extract_text_regions(fixture.image).texts
+
+    def stage_match_text(self, fixture):
+        layout = self.layout_for(fixture)
+        self.processor.match_text_to_components(layout)
+
+    def stage_generate_code(self, fixture):
+        self.processor.build_result(self.layout_for(fixture), 'react', 'external')
+
+    def stage_render_preview(self, fixture):
+        self.processor.render_preview(fixture.data, self.layout_for(fixture))
+
+    def prepare_end_to_end_warm(self, fixture):
+        return self.unique_bytes(fixture)
+
+    def stage_end_to_end_warm(self, data):
+        # Models loaded, result cache missed
+        self.check(self.processor.process_image_bytes(data))
+
+    def stage_end_to_end_cached(self, fixture):
+        self.check(self.processor.process_image_bytes(fixture.data))
+
+    def check(self, result):
+        if not result.get('success'):
+            raise RuntimeError(result.get('error', 'Processing failed'))
+
+    def run_end_to_end_cold(self):
+        """First conversion with a freshly loaded OCR model and an unseen image"""
+        samples = []
+        original = self.processor.reader_pool
+        try:
+            for i in range(self.cold_runs):
+                fixture = self.fixtures[i % len(self.fixtures)]
+                pool = self.processor._reader_pool = ReaderPool(
+                    size=1, languages=original.languages, gpu=original.gpu,
+                    quantize=original.quantize, acceleration=original.acceleration)
+                path = os.path.join(self.tmpdir, f'cold-{i}.png')
+                with open(path, 'wb') as f:
+                    f.write(self.unique_bytes(fixture))
+                started = time.perf_counter()
+                self.check(self.processor.process_uploaded_image(path))
+                samples.append((time.perf_counter() - started) * 1000)
+                del pool
+        finally:
+            self.processor._reader_pool = original
+        return samples, len(samples)
+
+    def run_stage(self, stage):
+        if stage == 'end_to_end_cold':
+            return self.run_end_to_end_cold()
+        body = getattr(self, f'stage_{stage}')
+        prepare = getattr(self, f'prepare_{stage}', lambda fixture: fixture)
+        for fixture in self.fixtures:
+            # Warm-up runs also prime per-fixture state (layouts, cache entries)
+            for _ in range(self.warmup):
+                body(prepare(fixture))
+        samples = []
+        for _ in range(self.repeat):
+            for fixture in self.fixtures:
+                arg = prepare(fixture)
+                started = time.perf_counter()
+                body(arg)
+                samples.append((time.perf_counter() - started) * 1000)
+        return samples, len(samples)
+
+    def run(self, tmpdir, log=None):
+        """{stage: summary}; stages that raise are reported with their error"""
+        self.tmpdir = tmpdir
+        results = {}
+        for stage in self.stages:
+            try:
+                with RssSampler() as rss:
+                    samples, items = self.run_stage(stage)
+                results[stage] = summarize(samples, items, rss.peak_mb, rss.start_mb)
+            except Exception as e:
+                results[stage] = {'error': f"{type(e).__name__}: {str(e)}"}
+            if log:
+                log(stage, results[stage])
+        return results
+
+
+def _split_worker(slot, images, policy, runs, pipeline_threads, ready, start, results):
+    """One simulated web worker of a thread-split run (in a spawned process)"""
+    import django
+    django.setup()
+    from bifrost.image_processor import ImageProcessor
+
+    try:
+        apply_thread_policy(policy)
+        processor = ImageProcessor(reader_pool=ReaderPool(size=1),
+                                   stage_executor=StageExecutor(pipeline_threads))
+        processor.process_image_bytes(encode_png(images[0], run=f'warm-{slot}'))
+        payloads = [encode_png(images[i % len(images)], run=f'{slot}-{i}') for i in range(runs)]
+    except Exception as e:
+        ready.put(None)
+        results.put((slot, 0.0, [], f"{type(e).__name__}: {str(e)}"))
+        return
+
+    ready.put(slot)
+    start.wait()
+    samples, errors = [], 0
+    started = time.perf_counter()
+    for data in payloads:
+        t = time.perf_counter()
+        if not processor.process_image_bytes(data).get('success'):
+            errors += 1
+        samples.append((time.perf_counter() - t) * 1000)
+    results.put((slot, time.perf_counter() - started, samples, f"{errors} failed" if errors else None))
+
+
+def thread_split_throughput(images, workers, threads, runs=4, affinity=False, pipeline_threads=2,
+                            timeout=600):
+    """Aggregate end-to-end throughput of ``workers`` processes with ``threads`` each
+
+    Every worker converts ``runs`` unseen images at the same time as the
+    others, like gunicorn workers sharing a box. With ``affinity`` each is
+    pinned to its own block of CPUs. Workers are spawned, not forked: by
+    now this process has loaded torch and started thread pools, which a
+    fork would inherit half-initialised. A worker that has not loaded its
+    model, or finished, within ``timeout`` seconds fails the run.
+    """
+    context = multiprocessing.get_context('spawn')
+    ready, results, start = context.Queue(), context.Queue(), context.Event()
+    cpus = available_cpus()
+    processes = []
+    for slot in range(workers):
+        pinned = set(cpus[(slot * threads) % len(cpus):][:threads]) if affinity else None
+        policy = ThreadPolicy(threads, 1, threads, pinned, slot)
+        process = context.Process(target=_split_worker, daemon=True,
+                                  args=(slot, images, policy, runs, pipeline_threads, ready, start, results))
+        process.start()
+        processes.append(process)
+
+    # Time only the conversions: start once every worker has loaded its model
+    try:
+        for _ in processes:
+            ready.get(timeout=timeout)
+        start.set()
+        outcomes = [results.get(timeout=timeout) for _ in processes]
+    except queue.Empty:
+        for process in processes:
+            process.terminate()
+        outcomes = None
+    for process in processes:
+        process.join()
+    if outcomes is None:
+        return {'workers': workers, 'threads': threads, 'affinity': affinity, 'images': 0,
+                'seconds': None, 'images_per_s': None, 'errors': [f"timed out after {timeout}s"]}
+
+    samples = [sample for _, _, worker_samples, _ in outcomes for sample in worker_samples]
+    errors = [f"worker {slot}: {error}" for slot, _, _, error in outcomes if error]
+    seconds = max(elapsed for _, elapsed, _, _ in outcomes)
+    report = {
+        'workers': workers,
+        'threads': threads,
+        'affinity': affinity,
+        'images': len(samples),
+        'seconds': round(seconds, 3),
+        'images_per_s': round(len(samples) / seconds, 3) if seconds else None,
+    }
+    if samples:
+        report['p50_ms'] = round(float(np.percentile(samples, 50)), 3)
+        report['p95_ms'] = round(float(np.percentile(samples, 95)), 3)
+    if errors:
+        report['errors'] = errors
+    return report
+
+
+def text_agreement(reference, candidate):
+    """How closely one configuration's OCR output matches another's
+
+    ``reference`` and ``candidate`` map fixture names to text block lists
+    (see Benchmark.texts). Similarity is difflib's ratio of the joined
+    text, averaged over the fixtures both read.
+    """
+    names = sorted(set(reference) & set(candidate))
+    if not names:
+        return None
+    ratios, exact, block_delta = [], 0, 0
+    for name in names:
+        a, b = '\n'.join(reference[name]), '\n'.join(candidate[name])
+        ratios.append(difflib.SequenceMatcher(None, a, b).ratio())
+        exact += a == b
+        block_delta += abs(len(reference[name]) - len(candidate[name]))
+    return {
+        'images': len(names),
+        'text_similarity': round(sum(ratios) / len(ratios), 4),
+        'identical_images': exact,
+        'block_count_delta': block_delta,
+    }
+
+
+def box_iou(a, b):
+    """IoU of every box in component array ``a`` against every box in ``b``"""
+    ax0, ay0 = a['x'][:, None].astype(np.float64), a['y'][:, None].astype(np.float64)
+    ax1, ay1 = ax0 + a['width'][:, None], ay0 + a['height'][:, None]
+    bx0, by0 = b['x'][None, :].astype(np.float64), b['y'][None, :].astype(np.float64)
+    bx1, by1 = bx0 + b['width'][None, :], by0 + b['height'][None, :]
+    inter = (np.clip(np.minimum(ax1, bx1) - np.maximum(ax0, bx0), 0, None) *
+             np.clip(np.minimum(ay1, by1) - np.maximum(ay0, by0), 0, None))
+    union = (ax1 - ax0) * (ay1 - ay0) + (bx1 - bx0) * (by1 - by0) - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def component_agreement(reference, candidate, threshold=0.5):
+    """Component recall and precision of one configuration against another's
+
+    ``reference`` and ``candidate`` map fixture names to component arrays
+    (see Benchmark.components). A component counts as found when a
+    candidate component of the same type overlaps it with IoU >= threshold.
+    """
+    names = sorted(set(reference) & set(candidate))
+    if not names:
+        return None
+    total_ref = total_cand = found = matched = 0
+    for name in names:
+        a, b = reference[name], candidate[name]
+        total_ref, total_cand = total_ref + len(a), total_cand + len(b)
+        if not len(a) or not len(b):
+            continue
+        hit = (box_iou(a, b) >= threshold) & (a['type'][:, None] == b['type'][None, :])
+        found += int(hit.any(axis=1).sum())
+        matched += int(hit.any(axis=0).sum())
+    return {
+        'images': len(names),
+        'component_recall': round(found / total_ref, 4) if total_ref else 1.0,
+        'component_precision': round(matched / total_cand, 4) if total_cand else 1.0,
+    }
+
+
+def environment():
+    """Machine description stored with every report, so runs stay comparable"""
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'opencv_threads': cv2.getNumThreads(),
+        'torch': torch_version(),
+    }
+
+
+def torch_version():
+    try:
+        import torch
+    except ImportError:
+        return None
+    return {'version': torch.__version__, 'threads': torch.get_num_threads()}
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_reports(baseline, current, threshold, metric='p50_ms'):
+    """Stages slower than the baseline by more than ``threshold`` (a fraction)
+
+    Returns ``[(config, stage, baseline value, current value)]``. A stage
+    the baseline measured that now fails or is missing counts too, with a
+    current value of None; stages the baseline has no value for are skipped.
+    """
+    regressions = []
+    for config, stages in current.get('configs', {}).items():
+        base_stages = baseline.get('configs', {}).get(config, {})
+        for stage, base_summary in base_stages.items():
+            before, after = base_summary.get(metric), stages.get(stage, {}).get(metric)
+            if before and (after is None or after > before * (1 + threshold)):
+                regressions.append((config, stage, before, after))
+    return regressions
@@ -0,0 +1,115 @@
+import hashlib
+import logging
+import threading
+import zlib
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CODEC_RAW = 'raw'
+CODEC_ZLIB = 'zlib'
+CODEC_ZLIB_DICT = 'zlib-dict'  # zlib with a preset dictionary stored as another blob
+
+_dictionary = None
+_dictionaries = {}  # digest -> bytes, for decompression
+_lock = threading.Lock()
+
+
+def blob_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def dictionary_seed():
+    """Text every generated page shares: stylesheet boilerplate and page skeletons
+
+    Used as a zlib preset dictionary, so each stored page only pays for
+    what is specific to it.
+    """
+    import numpy as np
+
+    from bifrost.codegen import CodeEmitter
+    from bifrost.image_processor import processor
+    from bifrost.layout import Layout
+
+    empty = Layout(0, 0)
+    parts = [
+        CodeEmitter(empty, np.zeros(0, dtype=bool), 'inline').html(),
+        CodeEmitter(empty, np.zeros(0, dtype=bool), 'external').html(),
+        processor.generate_javascript(empty, 'react'),
+        processor.generate_javascript(empty, 'vanilla'),
+    ]
+    # zlib favours matches near the end of the dictionary
+    return '\n'.join(parts).encode('utf-8')[-32768:]
+
+
+def current_dictionary():
+    """(digest, bytes) of the preset dictionary for new blobs, stored once"""
+    global _dictionary
+    if _dictionary is None:
+        with _lock:
+            if _dictionary is None:
+                data = dictionary_seed()
+                digest = _save(data, CODEC_ZLIB, zlib.compress(data, 9), '')
+                _dictionaries[digest] = data
+                _dictionary = (digest, data)
+    return _dictionary
+
+
+def _save(data, codec, payload, dictionary):
+    from bifrost.models import CodeBlob
+
+    digest = blob_digest(data)
+    CodeBlob.objects.bulk_create([CodeBlob(
+        digest=digest,
+        codec=codec,
+        dictionary=dictionary,
+        data=payload,
+        size=len(data),
+        stored_size=len(payload),
+    )], ignore_conflicts=True)
+    # An existing blob gets its created_at refreshed, so that pruning (which
+    # spares recent blobs) cannot delete it before the upload that now refers
+    # to it is saved. MySQL has no upsert on a named key for bulk_create.
+    CodeBlob.objects.filter(digest=digest).update(created_at=timezone.now())
+    return digest
+
+
+def encode(data):
+    """Smallest of raw, zlib and dictionary zlib: (codec, payload, dictionary digest)"""
+    dict_digest, dict_data = current_dictionary()
+    compressor = zlib.compressobj(9, zdict=dict_data)
+    with_dict = compressor.compress(data) + compressor.flush()
+    plain = zlib.compress(data, 9)
+    return min(
+        (len(data), CODEC_RAW, data, ''),
+        (len(plain), CODEC_ZLIB, plain, ''),
+        (len(with_dict), CODEC_ZLIB_DICT, with_dict, dict_digest),
+    )[1:]
+
+
+def store_text(text):
+    """Store ``text`` once, keyed by its hash, and return the digest"""
+    data = (text or '').encode('utf-8')
+    codec, payload, dictionary = encode(data)
+    return _save(data, codec, payload, dictionary)
+
+
+def dictionary_bytes(digest):
+    if digest not in _dictionaries:
+        from bifrost.models import CodeBlob
+        _dictionaries[digest] = decode(CodeBlob.objects.get(digest=digest))
+    return _dictionaries[digest]
+
+
+def decode(blob):
+    """Raw bytes of a CodeBlob"""
+    payload = bytes(blob.data)
+    if blob.codec == CODEC_RAW:
+        return payload
+    if blob.codec == CODEC_ZLIB:
+        return zlib.decompress(payload)
+    if blob.codec == CODEC_ZLIB_DICT:
+        decompressor = zlib.decompressobj(zdict=dictionary_bytes(blob.dictionary))
+        return decompressor.decompress(payload) + decompressor.flush()
+    raise ValueError(f"Unknown blob codec {blob.codec!r}")
@@ -0,0 +1,195 @@
+from html import escape
+
+import numpy as np
+
+from bifrost.layout import COMPONENT_TYPES
+
+CSS_BASE = """/* Generated by Bifrost */
+:root {
+  --primary-color: #0078d4;
+  --hover-color: #106ebe;
+  --text-color: #323130;
+  --border-color: #d1d1d1;
+  --bg-color: #f5f5f5;
+  --white: #ffffff;
+  --shadow: 0 2px 4px rgba(0,0,0,0.1);
+}
+
+* {
+  box-sizing: border-box;
+  margin: 0;
+  padding: 0;
+  font-family: 'Segoe UI', system-ui, -apple-system, sans-serif;
+}
+
+body {
+  background-color: var(--bg-color);
+  color: var(--text-color);
+  line-height: 1.5;
+  padding: 24px;
+}
+
+.container {
+  max-width: 1200px;
+  margin: 0 auto;
+  position: relative;
+  min-height: 100vh;
+}
+"""
+
+# Declarations shared by every instance of a component type; per-instance
+# rules below only carry geometry
+CSS_SHARED = """
+.btn {
+  position: absolute;
+  background-color: var(--primary-color);
+  color: var(--white);
+  border: none;
+  border-radius: 4px;
+  font-size: 14px;
+  cursor: pointer;
+  padding: 8px 16px;
+  display: flex;
+  align-items: center;
+  justify-content: center;
+  transition: background-color 0.2s;
+}
+
+.btn:hover {
+  background-color: var(--hover-color);
+}
+
+.input-group {
+  position: absolute;
+}
+
+.input-group label {
+  display: block;
+  margin-bottom: 8px;
+  font-weight: 600;
+  color: var(--text-color);
+}
+
+.input-group input {
+  width: 100%;
+  padding: 8px 12px;
+  border: 1px solid var(--border-color);
+  border-radius: 4px;
+  font-size: 14px;
+  transition: border-color 0.2s;
+}
+
+.input-group input:focus {
+  outline: none;
+  border-color: var(--primary-color);
+  box-shadow: 0 0 0 2px rgba(0, 120, 212, 0.1);
+}
+
+.card {
+  position: absolute;
+  background-color: var(--white);
+  border-radius: 8px;
+  box-shadow: var(--shadow);
+  padding: 16px;
+}
+
+.text-block {
+  position: absolute;
+  color: var(--text-color);
+}
+"""
+
+
+class CodeEmitter:
+    """Emits generated HTML/CSS as a sequence of chunks
+
+    Callers join the chunks once (html(), css()), since the stored result
+    needs whole strings.
+    ``layout`` must already have its text matched; ``standalone`` is a
+    per-text-block flag for text that sits outside every component.
+    """
+
+    def __init__(self, layout, standalone, css_type='external'):
+        self.layout = layout
+        self.standalone = standalone
+        self.css_type = css_type
+
+    def _components(self):
+        """(index, type name, x, y, width, height) per component"""
+        for i, (kind, x, y, width, height) in enumerate(self.layout.components.tolist()):
+            yield i, COMPONENT_TYPES[kind], x, y, width, height
+
+    def _standalone_text(self):
+        """(index, text, x, y, height) for text outside every component"""
+        text = self.layout.text
+        for i in np.flatnonzero(self.standalone).tolist():
+            x, y, _, height, _ = text.boxes[i].tolist()
+            yield i, text.texts[i], x, y, height
+
+    def iter_css(self):
+        """Yield the stylesheet chunk by chunk"""
+        yield CSS_BASE
+        yield CSS_SHARED
+
+        for i, kind, x, y, width, height in self._components():
+            if kind == 'button':
+                yield f"\n.btn-{i} {{ left: {x}px; top: {y}px; width: {width}px; height: {height}px; }}\n"
+            elif kind == 'input':
+                yield f"\n.input-{i} {{ left: {x}px; top: {y}px; width: {width}px; }}\n"
+            elif kind == 'container':
+                yield f"\n.card-{i} {{ left: {x}px; top: {y}px; width: {width}px; height: {height}px; }}\n"
+
+        for i, _, x, y, height in self._standalone_text():
+            yield f"\n.text-{i} {{ left: {x}px; top: {y}px; font-size: {max(12, int(height * 0.7))}px; }}\n"
+
+    def iter_body(self):
+        """Yield the markup for every component and standalone text block"""
+        labels = self.layout.component_labels()
+        for i, kind, _, _, _, _ in self._components():
+            if kind == 'button':
+                yield f'    <button class="btn btn-{i}">{escape(labels[i])}</button>\n'
+            elif kind == 'input':
+                label = escape(labels[i])
+                yield f'    <div class="input-group input-{i}">\n'
+                if label:
+                    yield f'      <label>{label}</label>\n'
+                yield f'      <input type="text" placeholder="{label}">\n'
+                yield '    </div>\n'
+            elif kind == 'container':
+                yield (f'    <div class="card card-{i}">\n'
+                       '      <!-- Card content would go here -->\n'
+                       '    </div>\n')
+
+        for i, text, _, _, _ in self._standalone_text():
+            yield f'    <div class="text-block text-{i}">{escape(text)}</div>\n'
+
+    def iter_html(self):
+        """Yield the full HTML document; inline mode embeds the stylesheet"""
+        yield ('<!DOCTYPE html>\n'
+               '<html lang="en">\n'
+               '<head>\n'
+               '  <meta charset="UTF-8">\n'
+               '  <meta name="viewport" content="width=device-width, initial-scale=1.0">\n'
+               '  <title>Generated UI</title>\n')
+
+        if self.css_type == 'external':
+            yield '  <link rel="stylesheet" href="styles.css">\n'
+        else:
+            yield '  <style>\n'
+            yield from self.iter_css()
+            yield '  </style>\n'
+
+        yield ('</head>\n'
+               '<body>\n'
+               '  <div class="container">\n')
+        yield from self.iter_body()
+        yield ('  </div>\n'
+               '</body>\n'
+               '</html>')
+
+    def html(self):
+        return ''.join(self.iter_html())
+
+    def css(self):
+        """External stylesheet, or '' when the CSS is inlined in the HTML"""
+        return ''.join(self.iter_css()) if self.css_type == 'external' else ''
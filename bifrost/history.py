@@ -0,0 +1,44 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+from bifrost.models import UploadHistory
+
+HISTORY_FIELDS = ('id', 'created_at', 'framework_type', 'css_style', 'thumbnail_url', 'cloud_image_url')
+
+
+def encode_cursor(upload):
+    """Opaque keyset cursor pointing just past ``upload``"""
+    raw = f"{upload.created_at.isoformat()}|{upload.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor; ValueError if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except Exception:
+        raise ValueError("Invalid history cursor")
+
+
+def history_page(user, cursor=None, limit=24):
+    """One page of a user's history, newest first: (uploads, next_cursor)
+
+    Keyset pagination on (created_at, id) walks the (user, -created_at, -id)
+    index, so every page costs the same however deep it is. The code and OCR
+    columns are never loaded.
+    """
+    uploads = (UploadHistory.objects
+               .filter(user=user)
+               .only(*HISTORY_FIELDS)
+               .order_by('-created_at', '-id'))
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        uploads = uploads.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+    page = list(uploads[:limit + 1])
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return page[:limit], next_cursor
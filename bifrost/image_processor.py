@@ -1,23 +1,113 @@
 import cv2
+import io
 import numpy as np
-import easyocr
 import logging
 import os
-import base64
 import re
 from PIL import Image
-from collections import defaultdict
+from collections import deque
+from django.conf import settings
+from concurrent.futures import ThreadPoolExecutor
+from bifrost.codegen import CodeEmitter
+from bifrost.incremental import (block_hashes, changed_regions, decode_hashes, encode_hashes,
+                                 grow_regions, outside_regions)
+from bifrost.layout import COMPONENT_DTYPE, COMPONENT_TYPES, LABELLED_TYPES, Layout, TextBlocks, quad
+from bifrost.metrics import CONTOURS, record_pipeline, timed
+from bifrost.ocr_pool import get_reader_pool
+from bifrost.pipeline import get_stage_executor, stage_timer
+from bifrost.result_cache import analysis_key, get_result_cache, params_key
+
+PREPROCESS_MODES = ('off', 'fast', 'full')
+# 'full': detection and recognition of the whole page in one readtext call.
+# 'two_phase': text detector first, then recognition of the boxes that survive
+# size and component filters only
+OCR_MODES = ('full', 'two_phase')
 
 # Initialize logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class InvalidImageError(ValueError):
+    """The input is not a decodable image; retrying will not help"""
+
+def polygon_features(polygons):
+    """Shoelace areas and bounding boxes (x, y, w, h) for many OpenCV polygons at once
+
+    Areas match cv2.contourArea and boxes match cv2.boundingRect, but all
+    polygons are handled in a handful of NumPy calls instead of a Python loop.
+    """
+    if len(polygons) == 0:
+        return np.zeros(0), np.zeros((0, 4), dtype=np.int64)
+
+    counts = np.fromiter(map(len, polygons), dtype=np.intp, count=len(polygons))
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    points = np.concatenate(polygons).reshape(-1, 2).astype(np.int64)
+    xs, ys = points[:, 0], points[:, 1]
+
+    # Index of the next vertex, wrapping around within each polygon
+    nxt = np.arange(1, len(points) + 1)
+    nxt[ends - 1] = starts
+    cross = xs * ys[nxt] - xs[nxt] * ys
+    areas = np.abs(np.add.reduceat(cross, starts)) / 2.0
+
+    x0 = np.minimum.reduceat(xs, starts)
+    y0 = np.minimum.reduceat(ys, starts)
+    x1 = np.maximum.reduceat(xs, starts)
+    y1 = np.maximum.reduceat(ys, starts)
+    boxes = np.stack([x0, y0, x1 - x0 + 1, y1 - y0 + 1], axis=1)
+    return areas, boxes
+
 class ImageProcessor:
-    def __init__(self):
-        self.reader = easyocr.Reader(['en'], gpu=False)
+    def __init__(self, reader_pool=None, stage_executor=None):
+        # OCR readers are borrowed from a shared pool and loaded on first use
+        self._reader_pool = reader_pool
+        self._stage_executor = stage_executor
         self.min_confidence = 0.7  # Higher confidence threshold
         self.min_component_area = 1000
         self.max_aspect_ratio = 5.0
+        self.ocr_options = {
+            'text_threshold': 0.7,
+            'link_threshold': 0.4,
+            'width_ths': 0.5,
+            'height_ths': 0.5,
+        }
+        # Preprocessing for contour detection: 'off', 'fast' or 'full'
+        self.preprocess_mode = getattr(settings, 'BIFROST_PREPROCESS_MODE', 'off')
+        self.preprocess_scale = getattr(settings, 'BIFROST_PREPROCESS_SCALE', 1.0)
+        # Working resolution for contour detection (width) and OCR (longest
+        # side); 0 keeps the original size
+        self.detect_max_width = getattr(settings, 'BIFROST_DETECT_MAX_WIDTH', 0)
+        self.ocr_max_side = getattr(settings, 'BIFROST_OCR_MAX_SIDE', 0)
+        # Pages taller than tile + overlap are read in overlapping bands
+        self.ocr_tile_height = getattr(settings, 'BIFROST_OCR_TILE_HEIGHT', 2048)
+        self.ocr_tile_overlap = getattr(settings, 'BIFROST_OCR_TILE_OVERLAP', 160)
+        # Incremental re-conversion: block size for change detection (0
+        # disables it) and the changed fraction above which a full run is cheaper
+        self.incremental_block = getattr(settings, 'BIFROST_INCREMENTAL_BLOCK', 64)
+        self.incremental_max_changed = getattr(settings, 'BIFROST_INCREMENTAL_MAX_CHANGED', 0.4)
+        # Batch conversion: images per detector batch, crops per recognizer batch (GPU only)
+        self.ocr_batch_images = 4
+        self.ocr_batch_size = 16
+        # OCR mode (see OCR_MODES); in two-phase mode, detected boxes lower
+        # than this (working pixels) or narrower than aspect x their height
+        # are not recognised: they read as one character at most
+        self.ocr_mode = getattr(settings, 'BIFROST_OCR_MODE', 'full')
+        self.ocr_min_box_height = 8
+        self.ocr_min_box_aspect = 0.6
+        self.decode_workers = min(8, os.cpu_count() or 1)
+
+    @property
+    def stage_executor(self):
+        if self._stage_executor is None:
+            self._stage_executor = get_stage_executor()
+        return self._stage_executor
+
+    @property
+    def reader_pool(self):
+        if self._reader_pool is None:
+            self._reader_pool = get_reader_pool()
+        return self._reader_pool
 
     def load_image(self, file_path):
         """Load image with multiple fallback methods"""
@@ -35,85 +125,494 @@ class ImageProcessor:
                 
         except Exception as e:
             logger.error(f"Image loading failed: {str(e)}")
-            raise ValueError(f"Unsupported image format or corrupted file: {str(e)}")
+            raise InvalidImageError(f"Unsupported image format or corrupted file: {str(e)}")
+
+    def decode_image(self, data):
+        """Decode an in-memory encoded image (bytes or memoryview, not copied)"""
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise InvalidImageError("Unsupported image format or corrupted file")
+        return image
+
+    def load_image_bytes(self, data):
+        """Decode an in-memory image, falling back to PIL like load_image"""
+        try:
+            return self.decode_image(data)
+        except ValueError:
+            pass
+        try:
+            with Image.open(io.BytesIO(data)) as pil_img:
+                if pil_img.mode != 'RGB':
+                    pil_img = pil_img.convert('RGB')
+                return cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
+        except Exception as e:
+            logger.error(f"Image loading failed: {str(e)}")
+            raise InvalidImageError(f"Unsupported image format or corrupted file: {str(e)}")
 
     def preprocess_image(self, image):
-        """Advanced image preprocessing pipeline"""
+        """Optional preprocessing feeding contour detection.
+
+        'off' returns None (detection uses its own blur + Canny), 'fast'
+        returns a smoothed grayscale image for Canny, and 'full' returns the
+        CLAHE/NL-means/adaptive-threshold binary map used directly as the
+        edge map. With preprocess_scale < 1 the work is done on a smaller
+        copy and scaled back up.
+        """
+        mode = self.preprocess_mode
+        if mode == 'off':
+            return None
+        if mode not in PREPROCESS_MODES:
+            raise ValueError(f"Unknown preprocess mode: {mode}")
+
         try:
             # Convert to grayscale
             gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            height, width = gray.shape[:2]
             
-            # Contrast enhancement
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-            contrast = clahe.apply(gray)
+            scale = self.preprocess_scale
+            if 0 < scale < 1:
+                gray = cv2.resize(gray, (max(1, int(width * scale)), max(1, int(height * scale))),
+                                  interpolation=cv2.INTER_AREA)
             
-            # Denoising
-            denoised = cv2.fastNlMeansDenoising(contrast, h=15, 
-                                              templateWindowSize=7, 
-                                              searchWindowSize=21)
-            
-            # Adaptive thresholding
-            thresh = cv2.adaptiveThreshold(denoised, 255, 
-                                         cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                                         cv2.THRESH_BINARY_INV, 11, 2)
-            
-            # Morphological operations
-            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3,3))
-            cleaned = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
+            if mode == 'fast':
+                # Edge-preserving smoothing, a fraction of the NL-means cost
+                processed = cv2.bilateralFilter(cv2.medianBlur(gray, 3), 5, 50, 50)
+            else:
+                processed = self._full_preprocess(gray)
             
-            return cleaned
+            if processed.shape[:2] != (height, width):
+                interpolation = cv2.INTER_NEAREST if mode == 'full' else cv2.INTER_LINEAR
+                processed = cv2.resize(processed, (width, height), interpolation=interpolation)
+            return processed
             
         except Exception as e:
             logger.error(f"Preprocessing failed: {str(e)}")
             raise
 
-    def extract_text_regions(self, image):
-        """Advanced text extraction with layout analysis"""
+    def _full_preprocess(self, gray):
+        """Advanced image preprocessing pipeline"""
+        # Contrast enhancement
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+        contrast = clahe.apply(gray)
+        
+        # Denoising
+        denoised = cv2.fastNlMeansDenoising(contrast, h=15, 
+                                          templateWindowSize=7, 
+                                          searchWindowSize=21)
+        
+        # Adaptive thresholding
+        thresh = cv2.adaptiveThreshold(denoised, 255, 
+                                     cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+                                     cv2.THRESH_BINARY_INV, 11, 2)
+        
+        # Morphological operations
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3,3))
+        return cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
+
+    def extract_text_regions(self, image, scale=None, components=None):
+        """Advanced text extraction with layout analysis
+
+        ``scale`` forces the OCR working scale (e.g. the page's own when
+        ``image`` is a crop of it). In two-phase mode, ``components`` (page
+        coordinates) lets recognition skip text the generated code drops.
+        """
+        if self.ocr_mode == 'two_phase':
+            return self.recognize_text_candidates(image, self.detect_text_candidates(image, scale), components)
+        if self.ocr_mode not in OCR_MODES:
+            raise ValueError(f"Unknown OCR mode: {self.ocr_mode}")
+        if len(self.text_bands(image.shape[0])) > 1:
+            return TextBlocks.concat(self.iter_text_regions(image))
         try:
+            if scale is None:
+                working, scale = self.working_copy(image, self.ocr_max_side)
+            else:
+                working = self.scaled_copy(image, scale)
+
             # Get text with detailed layout information
-            results = self.reader.readtext(image, 
-                                         paragraph=True, 
-                                         detail=1,
-                                         batch_size=4,
-                                         text_threshold=0.7,
-                                         link_threshold=0.4,
-                                         width_ths=0.5,
-                                         height_ths=0.5)
+            with self.reader_pool.borrow() as reader:
+                results = reader.readtext(working, 
+                                          paragraph=True, 
+                                          detail=1,
+                                          batch_size=4,
+                                          **self.ocr_options)
             
-            text_blocks = []
-            for item in results:
-                if len(item) < 3:
-                    continue
-                    
-                bbox, text, conf = item[:3]
-                if conf < self.min_confidence:
+            return self.text_blocks_from_results(results, scale)
+            
+        except Exception as e:
+            logger.error(f"Text extraction failed: {str(e)}")
+            raise
+
+    def text_bands(self, height):
+        """(top, bottom) rows of the overlapping bands OCR reads a page in"""
+        tile, overlap = self.ocr_tile_height, self.ocr_tile_overlap
+        if not tile or height <= tile + overlap:
+            return [(0, height)]
+        bands = []
+        top = 0
+        while True:
+            bottom = min(top + tile, height)
+            bands.append((max(0, bottom - tile), bottom))
+            if bottom == height:
+                return bands
+            top += tile - overlap
+
+    def _read_rows(self, image, top, bottom):
+        """OCR image rows [top, bottom) into TextBlocks in row coordinates"""
+        working, scale = self.working_copy(image[top:bottom], self.ocr_max_side)
+        with self.reader_pool.borrow() as reader:
+            results = reader.readtext(working,
+                                      paragraph=True,
+                                      detail=1,
+                                      batch_size=4,
+                                      **self.ocr_options)
+        return self.text_blocks_from_results(results, scale)
+
+    def _read_band(self, image, bands, k):
+        """OCR one band; keeps only the blocks this band owns, in page coordinates"""
+        top, bottom = bands[k]
+        blocks = self._read_rows(image, top, bottom)
+        if not len(blocks):
+            return blocks
+        window = self.straddle_window(blocks.boxes, bands, k, image.shape[0])
+        blocks = blocks.take(self.band_owned(blocks.boxes, bands, k)).shift(dy=top)
+        if window is None:
+            return blocks
+        again = self._read_rows(image, *window).shift(dy=window[0])
+        return TextBlocks.concat([blocks, again.take(self.straddling(again.boxes, bands, k, window,
+                                                                     image.shape[0]))])
+
+    def band_owned(self, boxes, bands, k):
+        """Mask of the boxes (band coordinates) band ``k`` keeps
+
+        Text cut by a band edge is dropped: the neighbouring band sees it
+        whole. Of the rest, each band keeps the blocks centred in its half
+        of the overlaps, so text read twice is kept once.
+        """
+        top, bottom = bands[k]
+        y0 = boxes['y'].astype(np.int64)
+        y1 = y0 + boxes['height']
+        edge = 2
+        keep = np.ones(len(boxes), dtype=bool)
+        if k > 0:
+            keep &= y0 > edge
+        if k < len(bands) - 1:
+            keep &= y1 < bottom - top - edge
+
+        center = top + (y0 + y1) / 2.0
+        if k > 0:
+            keep &= center >= (bands[k - 1][1] + top) / 2.0
+        if k < len(bands) - 1:
+            keep &= center < (bottom + bands[k + 1][0]) / 2.0
+        return keep
+
+    def straddle_window(self, boxes, bands, k, height):
+        """Rows band ``k`` re-reads for text cut by both it and band ``k + 1``, or None
+
+        Text taller than the overlap that crosses the boundary is cut in
+        both bands, so neither owns it. ``boxes`` are in band coordinates;
+        the window is a tile starting just above the highest such text.
+        """
+        if k >= len(bands) - 1 or not len(boxes):
+            return None
+        top = bands[k][0]
+        cut = self.straddling(boxes, bands, k, dy=top)
+        if not cut.any():
+            return None
+        start = max(0, top + int(boxes['y'][cut].min()) - self.ocr_tile_overlap // 2)
+        return start, min(height, start + self.ocr_tile_height)
+
+    def straddling(self, boxes, bands, k, window=None, height=None, dy=0):
+        """Mask of boxes cut by both band ``k``'s bottom edge and band ``k + 1``'s top
+
+        Boxes are in page coordinates, or offset by ``dy``. With a
+        re-read ``window`` (rows, page of ``height`` rows), boxes cut by
+        its own edges are left out.
+        """
+        edge = 2
+        y0 = dy + boxes['y'].astype(np.int64)
+        y1 = y0 + boxes['height']
+        mask = (y1 >= bands[k][1] - edge) & (y0 <= bands[k + 1][0] + edge)
+        if window is not None:
+            if window[0] > 0:
+                mask &= y0 > window[0] + edge
+            if window[1] < height:
+                mask &= y1 < window[1] - edge
+        return mask
+
+    def iter_text_regions(self, image):
+        """Yield the text of a tall page band by band, top to bottom
+
+        Bands are views into ``image`` and at most one per OCR reader is in
+        flight, so peak memory depends on the band size, not the page height.
+        """
+        bands = self.text_bands(image.shape[0])
+        workers = max(1, min(len(bands), self.reader_pool.size))
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bifrost-ocr-band') as pool:
+                pending = deque()
+                for k in range(len(bands)):
+                    pending.append(pool.submit(self._read_band, image, bands, k))
+                    if len(pending) >= workers:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+        except Exception as e:
+            logger.error(f"Tiled text extraction failed: {str(e)}")
+            raise
+
+    def extract_text_regions_batch(self, images, components=None):
+        """Text extraction for several images, batching detection across images
+
+        ``components`` optionally holds each image's components, for
+        two-phase mode (which reads images one by one).
+        """
+        if self.ocr_mode == 'two_phase':
+            components = components or [None] * len(images)
+            return [self.extract_text_regions(image, components=comps) for image, comps in zip(images, components)]
+
+        # Full-page captures go through the tiled path one by one
+        tall = [i for i, image in enumerate(images) if len(self.text_bands(image.shape[0])) > 1]
+        if tall:
+            tall_blocks = {i: self.extract_text_regions(images[i]) for i in tall}
+            rest = [i for i in range(len(images)) if i not in tall_blocks]
+            rest_blocks = self.extract_text_regions_batch([images[i] for i in rest]) if rest else []
+            text_blocks = [None] * len(images)
+            for i, blocks in zip(rest, rest_blocks):
+                text_blocks[i] = blocks
+            for i, blocks in tall_blocks.items():
+                text_blocks[i] = blocks
+            return text_blocks
+
+        try:
+            scaled = [self.working_copy(image, self.ocr_max_side) for image in images]
+            images = [image for image, _ in scaled]
+
+            # Similar sizes go together so padding to a shared canvas stays small
+            order = sorted(range(len(images)), key=lambda i: images[i].shape[0] * images[i].shape[1])
+            text_blocks = [None] * len(images)
+
+            for start in range(0, len(order), self.ocr_batch_images):
+                chunk = order[start:start + self.ocr_batch_images]
+                height = max(images[i].shape[0] for i in chunk)
+                width = max(images[i].shape[1] for i in chunk)
+
+                # Pad bottom/right with white: coordinates stay in page space
+                canvases = []
+                for i in chunk:
+                    canvas = np.full((height, width, 3), 255, dtype=np.uint8)
+                    canvas[:images[i].shape[0], :images[i].shape[1]] = images[i]
+                    canvases.append(canvas)
+
+                with self.reader_pool.borrow() as reader:
+                    results = reader.readtext_batched(canvases,
+                                                      paragraph=True,
+                                                      detail=1,
+                                                      batch_size=self.ocr_batch_size,
+                                                      **self.ocr_options)
+
+                for i, image_results in zip(chunk, results):
+                    text_blocks[i] = self.text_blocks_from_results(image_results, scaled[i][1])
+
+            return text_blocks
+
+        except Exception as e:
+            logger.error(f"Batched text extraction failed: {str(e)}")
+            raise
+
+    def detect_text_candidates(self, image, scale=None):
+        """Phase one of two-phase OCR: text boxes from the detector alone
+
+        Returns one dict per band (see text_bands), plus one per re-read of
+        text cut by two bands (see straddle_window), with the rows read, the
+        OCR working scale, the boxes as (x0, y0, x1, y1) working pixels and
+        the same boxes as text-less TextBlocks in page coordinates. Boxes too
+        small to hold more than one character (clean_text drops those) and
+        text another band owns are discarded here.
+        """
+        bands = self.text_bands(image.shape[0])
+        candidates = []
+        try:
+            for k, (top, bottom) in enumerate(bands):
+                candidate = self._detect_rows(image, top, bottom, scale if len(bands) == 1 else None)
+                if len(bands) == 1:
+                    candidates.append(candidate)
                     continue
-                
-                # Clean and validate text
-                cleaned_text = self.clean_text(text)
-                if not cleaned_text:
+
+                # As in _read_band: owned boxes, plus a re-read of text cut by both bands
+                window = self.straddle_window(candidate['blocks'].boxes, bands, k, image.shape[0])
+                keep = self.band_owned(candidate['blocks'].boxes, bands, k)
+                candidates.append(self._take_candidates(candidate, keep))
+                if window is not None:
+                    again = self._detect_rows(image, *window)
+                    keep = self.straddling(again['blocks'].boxes, bands, k, window, image.shape[0],
+                                           dy=window[0])
+                    candidates.append(self._take_candidates(again, keep))
+            return candidates
+        except Exception as e:
+            logger.error(f"Text detection failed: {str(e)}")
+            raise
+
+    def _detect_rows(self, image, top, bottom, scale=None):
+        """Detector boxes of image rows [top, bottom), as a detect_text_candidates entry
+
+        Blocks are still in row coordinates; _take_candidates moves them.
+        """
+        if scale is not None:
+            working = self.scaled_copy(image[top:bottom], scale)
+        else:
+            working, scale = self.working_copy(image[top:bottom], self.ocr_max_side)
+        with self.reader_pool.borrow() as reader:
+            horizontal, free = reader.detect(working, **self.ocr_options)
+        boxes = self.text_box_array(horizontal[0], free[0], working.shape)
+        boxes = boxes[self.readable_text_boxes(boxes)]
+
+        blocks = TextBlocks.from_polygons([''] * len(boxes), self.box_polygons(boxes) / scale,
+                                          np.zeros(len(boxes)))
+        return {'top': top, 'bottom': bottom, 'scale': scale, 'boxes': boxes, 'blocks': blocks}
+
+    def _take_candidates(self, candidate, keep):
+        """Keep the masked boxes of a _detect_rows entry, blocks moved to page coordinates"""
+        return dict(candidate, boxes=candidate['boxes'][keep],
+                    blocks=candidate['blocks'].take(keep).shift(dy=candidate['top']))
+
+    def text_box_array(self, horizontal, free, shape):
+        """EasyOCR detector boxes as an (n, 4) array of x0, y0, x1, y1 in the image
+
+        Slanted boxes (rare in screenshots) become their bounding rectangle.
+        """
+        rows = [[box[0], box[2], box[1], box[3]] for box in horizontal]
+        for points in free:
+            points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+            (x0, y0), (x1, y1) = points.min(axis=0), points.max(axis=0)
+            rows.append([x0, y0, x1, y1])
+        boxes = np.array(rows, dtype=np.float64).reshape(-1, 4).astype(np.int64)
+        height, width = shape[:2]
+        boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, width)
+        boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, height)
+        return boxes[(boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])]
+
+    def box_polygons(self, boxes):
+        """(n, 4, 2) corner polygons of x0, y0, x1, y1 boxes"""
+        x0, y0, x1, y1 = boxes.T.astype(np.float64)
+        return np.stack([np.stack([x0, y0], axis=1), np.stack([x1, y0], axis=1),
+                         np.stack([x1, y1], axis=1), np.stack([x0, y1], axis=1)], axis=1)
+
+    def readable_text_boxes(self, boxes):
+        """Mask of boxes large enough to read as more than one character"""
+        width = boxes[:, 2] - boxes[:, 0]
+        height = boxes[:, 3] - boxes[:, 1]
+        return (height >= self.ocr_min_box_height) & (width >= self.ocr_min_box_aspect * height)
+
+    def useful_text_mask(self, components, boxes):
+        """Mask of text boxes (TEXT_DTYPE) whose text can reach the generated code
+
+        Code uses standalone text (see standalone_text_mask) and labels of
+        buttons and inputs (see match_text_to_components); text inside a
+        component whose smallest overlapping component is a container is
+        dropped either way. Every label candidate is kept, since the latest
+        one that survives recognition wins.
+        """
+        if not len(components) or not len(boxes):
+            return np.ones(len(boxes), dtype=bool)
+        index = Layout(0, 0, components).component_index()
+        keep = ~index.covered_points(boxes['x'], boxes['y'])
+        q, b = self.smallest_components(index, boxes)
+        keep[q[np.isin(components['type'][b], LABELLED_TYPES)]] = True
+        return keep
+
+    def recognize_text_candidates(self, image, candidates, components=None):
+        """Phase two of two-phase OCR: recognise the detected boxes worth reading
+
+        With ``components`` (page coordinates), boxes whose text generated
+        code would drop are skipped (see useful_text_mask).
+        """
+        parts = []
+        try:
+            for band in candidates:
+                boxes = band['boxes']
+                if components is not None and len(boxes):
+                    boxes = boxes[self.useful_text_mask(components, band['blocks'].boxes)]
+                if not len(boxes):
                     continue
+                working = self.scaled_copy(image[band['top']:band['bottom']], band['scale'])
+                results = self.recognize_boxes(working, boxes)
+                parts.append(self.text_blocks_from_results(results, band['scale']).shift(dy=band['top']))
+            return TextBlocks.concat(parts)
+        except Exception as e:
+            logger.error(f"Text recognition failed: {str(e)}")
+            raise
+
+    def recognize_boxes(self, working, boxes):
+        """EasyOCR results for x0, y0, x1, y1 boxes of a working image, in box order
+
+        One recognize call reads every box. EasyOCR batches the crops
+        (``ocr_batch_size`` at a time) on GPU readers only, reads them one
+        by one on CPU, and returns them top to bottom either way, each with
+        its box clipped to the image; results are matched back to the box
+        they overlap most.
+        """
+        gray = cv2.cvtColor(working, cv2.COLOR_BGR2GRAY)
+        with self.reader_pool.borrow() as reader:
+            results = reader.recognize(gray,
+                                       horizontal_list=[[x0, x1, y0, y1] for x0, y0, x1, y1 in boxes.tolist()],
+                                       free_list=[],
+                                       batch_size=self.ocr_batch_size,
+                                       detail=1,
+                                       paragraph=False,
+                                       reformat=False)
+        read = {}
+        for item in results:
+            index = self.matching_box(boxes, item[0])
+            if index is not None:
+                read.setdefault(index, item)
+        return [read[index] for index in sorted(read)]
+
+    def matching_box(self, boxes, polygon):
+        """Index of the x0, y0, x1, y1 box with the highest IoU with ``polygon``'s bounds, or None"""
+        points = np.asarray(polygon, dtype=np.float64).reshape(-1, 2)
+        (x0, y0), (x1, y1) = points.min(axis=0), points.max(axis=0)
+        boxes = boxes.astype(np.float64)
+        inter = (np.clip(np.minimum(boxes[:, 2], x1) - np.maximum(boxes[:, 0], x0), 0, None) *
+                 np.clip(np.minimum(boxes[:, 3], y1) - np.maximum(boxes[:, 1], y0), 0, None))
+        union = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]) + (x1 - x0) * (y1 - y0) - inter
+        iou = inter / np.maximum(union, 1e-9)
+        best = int(np.argmax(iou))
+        return best if iou[best] > 0 else None
+
+    def text_blocks_from_results(self, results, scale=1.0):
+        """Turn raw EasyOCR output into cleaned TextBlocks (original coordinates)"""
+        texts, polygons, confidences = [], [], []
+        for item in results:
+            if len(item) < 3:
+                continue
                 
-                # Calculate precise bounding box
-                x_min = min(p[0] for p in bbox)
-                x_max = max(p[0] for p in bbox)
-                y_min = min(p[1] for p in bbox)
-                y_max = max(p[1] for p in bbox)
-                
-                text_blocks.append({
-                    'text': cleaned_text,
-                    'bbox': bbox,
-                    'x': x_min,
-                    'y': y_min,
-                    'width': x_max - x_min,
-                    'height': y_max - y_min,
-                    'confidence': conf
-                })
+            bbox, text, conf = item[:3]
+            if conf < self.min_confidence:
+                continue
             
-            return text_blocks
+            # Clean and validate text
+            cleaned_text = self.clean_text(text)
+            if not cleaned_text:
+                continue
             
+            texts.append(cleaned_text)
+            polygons.append(quad(bbox))
+            confidences.append(conf)
+        
+        # Map polygons back from the OCR working resolution; boxes follow
+        polygons = np.array(polygons, dtype=np.float64).reshape(-1, 4, 2)
+        if scale != 1.0:
+            polygons /= scale
+        return TextBlocks.from_polygons(texts, polygons, confidences)
+
+    def read_text(self, image):
+        """Plain OCR dump of an image (path or array) using the shared readers"""
+        try:
+            with self.reader_pool.borrow() as reader:
+                results = reader.readtext(image, detail=0)
+            return "\n".join(results)
         except Exception as e:
-            logger.error(f"Text extraction failed: {str(e)}")
+            logger.error(f"Text reading failed: {str(e)}")
             raise
 
     def clean_text(self, text):
@@ -129,399 +628,589 @@ class ImageProcessor:
         
         return text if len(text) > 1 else ""
 
-    def detect_ui_components(self, image):
-        """Advanced UI component detection with ML-inspired heuristics"""
+    def working_copy(self, image, max_side, width_only=False):
+        """Downscale so the longest side (or the width) is at most max_side; returns (image, scale)"""
+        scale = self.working_scale(image.shape, max_side, width_only)
+        if scale == 1.0:
+            return image, 1.0
+        height, width = image.shape[:2]
+        size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+    def working_scale(self, shape, max_side, width_only=False):
+        """Scale working_copy would apply to an image of this shape"""
+        longest = shape[1] if width_only else max(shape[:2])
+        return 1.0 if not max_side or longest <= max_side else max_side / float(longest)
+
+    def detect_working_copy(self, image):
+        """Working copy for component detection, bounded by width
+
+        Full-page captures grow in height only; bounding their longest
+        side would shrink a 1440x15000 page to 154 px wide.
+        """
+        return self.working_copy(image, self.detect_max_width, width_only=True)
+
+    def scaled_copy(self, image, scale):
+        if scale == 1.0:
+            return image
+        height, width = image.shape[:2]
+        size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    def detect_components_stage(self, image, timings=None):
+        """Preprocessing (if enabled) followed by component detection"""
+        # Edges and contours gain nothing from retina/4K resolution
+        working, scale = self.detect_working_copy(image)
+        return self.detect_components_working(working, scale, timings)
+
+    def detect_components_working(self, working, scale, timings=None, offset=(0, 0)):
+        """detect_components_stage for an image already at working scale
+
+        ``working`` may be a crop of the working page whose top-left corner
+        sits at ``offset`` (working pixels).
+        """
+        with stage_timer(timings, 'preprocess'):
+            processed = self.preprocess_image(working)
+        with stage_timer(timings, 'detect_components'):
+            return self.detect_ui_components(working, processed, scale, offset)
+
+    def detect_ui_components(self, image, processed=None, scale=1.0, offset=(0, 0)):
+        """Advanced UI component detection with ML-inspired heuristics
+
+        ``scale`` is working size / original size when ``image`` has been
+        downscaled; returned boxes are always in original coordinates.
+        Returns a COMPONENT_DTYPE structured array, one row per component.
+        """
         try:
-            # Edge detection with Canny
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            blurred = cv2.GaussianBlur(gray, (5,5), 0)
-            edges = cv2.Canny(blurred, 50, 150)
+            if processed is None:
+                # Edge detection with Canny
+                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+                blurred = cv2.GaussianBlur(gray, (5,5), 0)
+                edges = cv2.Canny(blurred, 50, 150)
+            elif self.preprocess_mode == 'fast':
+                edges = cv2.Canny(processed, 50, 150)
+            else:
+                # The full pipeline already yields a cleaned binary map
+                edges = processed
             
             # Find contours
-            contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            components = []
-            for cnt in contours:
-                area = cv2.contourArea(cnt)
-                if area < self.min_component_area:
-                    continue
-                    
-                x, y, w, h = cv2.boundingRect(cnt)
-                aspect_ratio = w / float(h)
-                
-                # Skip components with extreme aspect ratios
-                if aspect_ratio > self.max_aspect_ratio or aspect_ratio < 1/self.max_aspect_ratio:
-                    continue
-                
-                # Calculate solidity (area/convex hull area)
-                hull = cv2.convexHull(cnt)
-                hull_area = cv2.contourArea(hull)
-                solidity = float(area)/hull_area if hull_area > 0 else 0
-                
-                # Classify component type based on features
-                component = self.classify_component(x, y, w, h, aspect_ratio, solidity)
-                if component:
-                    components.append(component)
-            
-            return components
+            contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE,
+                                           offset=tuple(int(v) for v in offset))
+            CONTOURS.observe(len(contours))
+            return self.components_from_contours(contours, scale)
             
         except Exception as e:
             logger.error(f"Component detection failed: {str(e)}")
             raise
 
-    def classify_component(self, x, y, w, h, aspect_ratio, solidity):
-        """Classify UI components using heuristic rules"""
-        # Button detection
-        if 0.8 < aspect_ratio < 3.5 and 1000 < w*h < 50000 and solidity > 0.85:
-            return {
-                'type': 'button',
-                'x': x,
-                'y': y,
-                'width': w,
-                'height': h,
-                'text': ''
-            }
-            
-        # Input field detection
-        elif aspect_ratio > 3 and w*h > 2000 and solidity > 0.7:
-            return {
-                'type': 'input',
-                'x': x,
-                'y': y,
-                'width': w,
-                'height': h,
-                'text': ''
-            }
-            
-        # Card/container detection
-        elif w*h > 10000 and solidity > 0.6:
-            return {
-                'type': 'container',
-                'x': x,
-                'y': y,
-                'width': w,
-                'height': h
-            }
-            
-        return None
+    def components_from_contours(self, contours, scale=1.0):
+        """Batched feature extraction, filtering and classification of contours"""
+        if len(contours) == 0:
+            return np.zeros(0, dtype=COMPONENT_DTYPE)
+        
+        # Features for every contour at once: polygon area and bounding box
+        areas, boxes = polygon_features(contours)
+        
+        # Area thresholds are in original pixels
+        keep = np.flatnonzero(areas >= self.min_component_area * scale * scale)
+        fill_ratio = areas[keep] / (boxes[keep, 2] * boxes[keep, 3])
+        boxes = boxes[keep].astype(np.float64)
+        if scale != 1.0:
+            boxes = np.rint(boxes / scale)
+            boxes[:, 2:] = np.maximum(boxes[:, 2:], 1)
+        boxes = boxes.astype(np.int32)
+        
+        # Skip components with extreme aspect ratios
+        aspect_ratio = boxes[:, 2] / boxes[:, 3].astype(np.float64)
+        ok = (aspect_ratio <= self.max_aspect_ratio) & (aspect_ratio >= 1 / self.max_aspect_ratio)
+        keep, boxes, aspect_ratio, fill_ratio = keep[ok], boxes[ok], aspect_ratio[ok], fill_ratio[ok]
+        
+        # Solidity (area/convex hull area). The hull never exceeds the bounding
+        # box, so area/box area is a lower bound; above the strictest rule
+        # threshold (0.85) it classifies identically and the hull is skipped.
+        solidity = fill_ratio.copy()
+        needs_hull = np.flatnonzero(fill_ratio <= 0.85)
+        if len(needs_hull):
+            hull_areas, _ = polygon_features([cv2.convexHull(contours[keep[i]]) for i in needs_hull])
+            solidity[needs_hull] = np.divide(areas[keep[needs_hull]], hull_areas,
+                                             out=np.zeros(len(needs_hull)), where=hull_areas > 0)
+        
+        # Classify component type based on features
+        types = self.classify_components(boxes[:, 2], boxes[:, 3], aspect_ratio, solidity)
+        found = types >= 0
+        
+        components = np.zeros(int(found.sum()), dtype=COMPONENT_DTYPE)
+        components['type'] = types[found]
+        components['x'] = boxes[found, 0]
+        components['y'] = boxes[found, 1]
+        components['width'] = boxes[found, 2]
+        components['height'] = boxes[found, 3]
+        return components
 
-    def match_text_to_components(self, components, text_blocks):
-        """Match text blocks to their parent components"""
-        try:
-            # Create a spatial index for faster lookup
-            from rtree import index
-            idx = index.Index()
-            
-            for i, comp in enumerate(components):
-                idx.insert(i, (comp['x'], comp['y'], 
-                          comp['x'] + comp['width'], 
-                          comp['y'] + comp['height']))
-            
-            # Match text to components
-            for text in text_blocks:
-                if not isinstance(text, dict) or 'x' not in text:
-                    continue
-                    
-                # Find all components that contain this text
-                matches = list(idx.intersection((text['x'], text['y'], 
-                                               text['x'] + text['width'], 
-                                               text['y'] + text['height'])))
-                
-                # Assign to the smallest matching component
-                if matches:
-                    smallest_area = float('inf')
-                    best_match = None
-                    
-                    for match_idx in matches:
-                        comp = components[match_idx]
-                        area = comp['width'] * comp['height']
-                        if area < smallest_area:
-                            smallest_area = area
-                            best_match = comp
-                    
-                    if best_match and 'text' in best_match:
-                        best_match['text'] = text['text']
-            
-            return components
-            
-        except ImportError:
-            # Fallback without R-tree
-            for comp in components:
-                if 'text' not in comp:
-                    continue
-                    
-                for text in text_blocks:
-                    if not isinstance(text, dict) or 'x' not in text:
-                        continue
-                        
-                    if (comp['x'] <= text['x'] <= comp['x'] + comp['width'] and
-                        comp['y'] <= text['y'] <= comp['y'] + comp['height']):
-                        comp['text'] = text['text']
-                        break
-                        
-            return components
-
-    def generate_html_css(self, components, text_blocks, framework='vanilla', css_type='external'):
+    def classify_components(self, w, h, aspect_ratio, solidity):
+        """Classify UI components using heuristic rules (vectorized)
+
+        Returns an index into COMPONENT_TYPES per row, or -1 for no match.
+        Rules are checked in order: button, input, card/container.
+        """
+        area = w.astype(np.int64) * h
+        is_button = (0.8 < aspect_ratio) & (aspect_ratio < 3.5) & (1000 < area) & (area < 50000) & (solidity > 0.85)
+        is_input = (aspect_ratio > 3) & (area > 2000) & (solidity > 0.7)
+        is_container = (area > 10000) & (solidity > 0.6)
+        return np.select([is_button, is_input, is_container], [0, 1, 2], default=-1).astype(np.int8)
+
+    def match_text_to_components(self, layout, index=None):
+        """Match text blocks to their parent components
+
+        Each text block goes to the smallest component its box overlaps; if
+        that component takes a label (buttons, inputs) it gets the text, and
+        a later text block wins over an earlier one. Sets ``layout.labels``.
+        """
+        layout.labels = np.full(len(layout.components), -1, dtype=np.int32)
+        if not len(layout.components) or not len(layout.text):
+            return layout
+        if index is None:
+            index = layout.component_index()
+        
+        q, b = self.smallest_components(index, layout.text.boxes)
+        if len(q) == 0:
+            return layout
+        
+        # The latest text per labelled component wins
+        labelled = np.isin(layout.components['type'][b], LABELLED_TYPES)
+        np.maximum.at(layout.labels, b[labelled], q[labelled].astype(np.int32))
+        
+        return layout
+
+    def smallest_components(self, index, boxes):
+        """(text, component) index pairs: the smallest component each text box overlaps"""
+        # All (text, component) overlaps in one bulk query
+        q, b = index.intersecting_boxes(boxes['x'], boxes['y'], boxes['width'], boxes['height'])
+        if len(q) == 0:
+            return q, b
+        
+        # Smallest component per text (ties go to the earlier component)
+        order = np.lexsort((b, index.area[b], q))
+        q, b = q[order], b[order]
+        first = np.ones(len(q), dtype=bool)
+        first[1:] = q[1:] != q[:-1]
+        return q[first], b[first]
+
+    def standalone_text_mask(self, layout, index):
+        """True for text blocks whose top-left corner lies in no component"""
+        boxes = layout.text.boxes
+        return ~index.covered_points(boxes['x'], boxes['y'])
+
+    def code_emitter(self, layout, css_type='external'):
+        """Match text to components and return a streaming CodeEmitter"""
+        # One spatial index per image, shared by matching and the standalone check
+        index = layout.component_index()
+        
+        # Match text to components first
+        self.match_text_to_components(layout, index)
+        standalone = self.standalone_text_mask(layout, index)
+        
+        return CodeEmitter(layout, standalone, css_type)
+
+    def generate_html_css(self, layout, framework='vanilla', css_type='external'):
         """Generate semantic HTML/CSS based on detected components"""
         try:
-            # Match text to components first
-            components = self.match_text_to_components(components, text_blocks)
-            
-            # Initialize code containers
-            html = []
-            css = []
-            
-            # HTML boilerplate
-            html.append('<!DOCTYPE html>')
-            html.append('<html lang="en">')
-            html.append('<head>')
-            html.append('  <meta charset="UTF-8">')
-            html.append('  <meta name="viewport" content="width=device-width, initial-scale=1.0">')
-            html.append('  <title>Generated UI</title>')
+            emitter = self.code_emitter(layout, css_type)
+            return emitter.html(), emitter.css()
             
-            if css_type == 'external':
-                html.append('  <link rel="stylesheet" href="styles.css">')
-            else:
-                html.append('  <style>')
-            
-            # Base CSS
-            css_base = """/* Generated by Bifrost */
-:root {
-  --primary-color: #0078d4;
-  --hover-color: #106ebe;
-  --text-color: #323130;
-  --border-color: #d1d1d1;
-  --bg-color: #f5f5f5;
-  --white: #ffffff;
-  --shadow: 0 2px 4px rgba(0,0,0,0.1);
-}
+        except Exception as e:
+            logger.error(f"Code generation failed: {str(e)}")
+            raise
 
-* {
-  box-sizing: border-box;
-  margin: 0;
-  padding: 0;
-  font-family: 'Segoe UI', system-ui, -apple-system, sans-serif;
-}
+    def analysis_params(self):
+        """Parameters that influence text/component extraction (cache key input)"""
+        return {
+            'min_confidence': self.min_confidence,
+            'min_component_area': self.min_component_area,
+            'max_aspect_ratio': self.max_aspect_ratio,
+            'preprocess_mode': self.preprocess_mode,
+            'preprocess_scale': self.preprocess_scale,
+            'detect_max_width': self.detect_max_width,
+            'ocr_max_side': self.ocr_max_side,
+            'ocr_tile': (self.ocr_tile_height, self.ocr_tile_overlap),
+            'block_size': self.incremental_block,
+            'ocr': self.ocr_options,
+            'ocr_mode': self.ocr_mode,
+            'ocr_min_box': (self.ocr_min_box_height, self.ocr_min_box_aspect),
+            'result_format': 'layout',  # bump when the cached Layout changes shape
+        }
 
-body {
-  background-color: var(--bg-color);
-  color: var(--text-color);
-  line-height: 1.5;
-  padding: 24px;
-}
+    def analyze_image(self, image, timings=None):
+        """Extract text blocks and UI components from a decoded image as a Layout"""
+        height, width = image.shape[:2]
+        if self.ocr_mode == 'two_phase':
+            # Text detection runs beside component detection; recognition
+            # then skips the boxes the components make useless
+            results = self.stage_executor.run({
+                'detect_text': lambda: self.detect_text_candidates(image),
+                'components': lambda: self.detect_components_stage(image, timings),
+            }, timings)
+            with stage_timer(timings, 'recognize_text'):
+                text = self.recognize_text_candidates(image, results['detect_text'], results['components'])
+            return Layout(width, height, results['components'], text, blocks=self.page_blocks(image, timings))
 
-.container {
-  max-width: 1200px;
-  margin: 0 auto;
-  position: relative;
-  min-height: 100vh;
-}
-"""
-            if css_type == 'inline':
-                html.append(css_base)
-            
-            # Generate component code
-            for i, comp in enumerate(components):
-                if comp['type'] == 'button':
-                    html.append(f'    <button class="btn btn-{i}">{comp.get("text", "Button")}</button>')
-                    css.append(f"""
-.btn-{i} {{
-  position: absolute;
-  left: {comp['x']}px;
-  top: {comp['y']}px;
-  width: {comp['width']}px;
-  height: {comp['height']}px;
-  background-color: var(--primary-color);
-  color: var(--white);
-  border: none;
-  border-radius: 4px;
-  font-size: 14px;
-  cursor: pointer;
-  padding: 8px 16px;
-  display: flex;
-  align-items: center;
-  justify-content: center;
-  transition: background-color 0.2s;
-}}
-
-.btn-{i}:hover {{
-  background-color: var(--hover-color);
-}}
-""")
-                elif comp['type'] == 'input':
-                    html.append(f'    <div class="input-group input-{i}">')
-                    if comp.get('text'):
-                        html.append(f'      <label>{comp["text"]}</label>')
-                    html.append(f'      <input type="text" placeholder="{comp.get("text", "")}">')
-                    html.append('    </div>')
-                    css.append(f"""
-.input-{i} {{
-  position: absolute;
-  left: {comp['x']}px;
-  top: {comp['y']}px;
-  width: {comp['width']}px;
-}}
-
-.input-{i} label {{
-  display: block;
-  margin-bottom: 8px;
-  font-weight: 600;
-  color: var(--text-color);
-}}
-
-.input-{i} input {{
-  width: 100%;
-  padding: 8px 12px;
-  border: 1px solid var(--border-color);
-  border-radius: 4px;
-  font-size: 14px;
-  transition: border-color 0.2s;
-}}
-
-.input-{i} input:focus {{
-  outline: none;
-  border-color: var(--primary-color);
-  box-shadow: 0 0 0 2px rgba(0, 120, 212, 0.1);
-}}
-""")
-                elif comp['type'] == 'container':
-                    html.append(f'    <div class="card card-{i}">')
-                    html.append('      <!-- Card content would go here -->')
-                    html.append('    </div>')
-                    css.append(f"""
-.card-{i} {{
-  position: absolute;
-  left: {comp['x']}px;
-  top: {comp['y']}px;
-  width: {comp['width']}px;
-  height: {comp['height']}px;
-  background-color: var(--white);
-  border-radius: 8px;
-  box-shadow: var(--shadow);
-  padding: 16px;
-}}
-""")
-            
-            # Add standalone text blocks
-            for i, text in enumerate(text_blocks):
-                if not any(comp['x'] <= text['x'] <= comp['x'] + comp['width'] and 
-                          comp['y'] <= text['y'] <= comp['y'] + comp['height'] 
-                          for comp in components):
-                    html.append(f'    <div class="text-block text-{i}">{text["text"]}</div>')
-                    css.append(f"""
-.text-{i} {{
-  position: absolute;
-  left: {text['x']}px;
-  top: {text['y']}px;
-  font-size: {max(12, int(text['height'] * 0.7))}px;
-  color: var(--text-color);
-}}
-""")
-            
-            # Close HTML tags
-            if css_type == 'inline':
-                html.append('  </style>')
-            html.append('</head>')
-            html.append('<body>')
-            html.append('  <div class="container">')
-            html.append('  </div>')
-            html.append('</body>')
-            html.append('</html>')
-            
-            # Prepare final output
-            if css_type == 'external':
-                full_css = css_base + "\n".join(css)
-            else:
-                full_css = ""
-                
-            return "\n".join(html), full_css
+        # Both stages only read the image, so they run side by side
+        results = self.stage_executor.run({
+            'extract_text': lambda: self.extract_text_regions(image),
+            'components': lambda: self.detect_components_stage(image, timings),
+        }, timings)
+        return Layout(width, height, results['components'], results['extract_text'],
+                      blocks=self.page_blocks(image, timings))
+
+    def page_blocks(self, image, timings=None):
+        """Encoded block hashes of a page, kept for incremental re-conversion"""
+        if not self.incremental_block:
+            return None
+        with stage_timer(timings, 'block_hash'):
+            return encode_hashes(block_hashes(image, self.incremental_block), self.incremental_block)
+
+    def incremental_analysis(self, image, previous, timings=None):
+        """Re-analyse only the parts of ``image`` that differ from ``previous``
+
+        ``previous`` is the stored layout dict of an earlier upload. Blocks
+        whose hashes changed are grouped into regions, grown to cover every
+        earlier detection they touch, and only those regions go through OCR
+        and contour detection; everything else is carried over. Returns None
+        when there is nothing to compare with or too much has changed.
+        """
+        height, width = image.shape[:2]
+        if (not self.incremental_block or not previous or not previous.get('blocks')
+                or (previous.get('width'), previous.get('height')) != (width, height)):
+            return None
+        old_hashes, block_size = decode_hashes(previous['blocks'])
+        if block_size != self.incremental_block:
+            return None
+
+        blocks = self.page_blocks(image, timings)
+        hashes, _ = decode_hashes(blocks)
+        if hashes.shape != old_hashes.shape:
+            return None
+        changed = hashes != old_hashes
+        if changed.mean() > self.incremental_max_changed:
+            return None
+
+        old = Layout.from_dict(previous)
+        old.blocks = blocks
+        if not changed.any():
+            return old
+
+        comps, text = old.components, old.text.boxes
+        boxes = np.concatenate([
+            np.stack([comps['x'], comps['y'], comps['x'] + comps['width'], comps['y'] + comps['height']], axis=1),
+            np.stack([text['x'], text['y'], text['x'] + text['width'], text['y'] + text['height']], axis=1),
+        ]).reshape(-1, 4)
+        regions = grow_regions(changed_regions(changed, block_size, image.shape), boxes, image.shape)
+        area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in regions)
+        if area > self.incremental_max_changed * width * height:
+            return None
+
+        # Earlier detections outside every region stay as they are
+        keep_comps = outside_regions(comps['x'], comps['y'], comps['x'] + comps['width'],
+                                     comps['y'] + comps['height'], regions)
+        keep_text = outside_regions(text['x'], text['y'], text['x'] + text['width'],
+                                    text['y'] + text['height'], regions)
+        component_parts = [comps[keep_comps]]
+        text_parts = [old.text.take(keep_text)]
+
+        # Regions are cut from the page at its working scales, so boxes round
+        # exactly as in a full run
+        working, detect_scale = self.detect_working_copy(image)
+        ocr_scale = self.working_scale(image.shape, self.ocr_max_side)
+        two_phase = self.ocr_mode == 'two_phase'
+        detected = []
+        for region in regions:
+            x0, y0, x1, y1 = region
+            wx0, wy0 = int(x0 * detect_scale), int(y0 * detect_scale)
+            wx1, wy1 = int(np.ceil(x1 * detect_scale)), int(np.ceil(y1 * detect_scale))
+            crop = image[y0:y1, x0:x1]
+            working_crop = working[wy0:wy1, wx0:wx1]
+            # Two-phase OCR only detects here: recognition waits for the
+            # merged components, as a full run filters on the page's
+            results = self.stage_executor.run({
+                'extract_text': ((lambda: self.detect_text_candidates(crop, ocr_scale)) if two_phase
+                                 else (lambda: self.extract_text_regions(crop, ocr_scale))),
+                'components': lambda: self.detect_components_working(working_crop, detect_scale,
+                                                                     offset=(wx0, wy0)),
+            })
+            found = results['components']
+
+            # Boxes cut by a region edge are partial; a full run would not see them
+            inside = self._away_from_edges(found['x'], found['y'], found['width'], found['height'],
+                                           region, (width, height))
+            component_parts.append(found[inside])
+            detected.append((region, crop, results['extract_text']))
+
+        components = np.concatenate(component_parts)
+        for region, crop, found_text in detected:
+            x0, y0 = region[:2]
+            if two_phase:
+                # Components in the crop's coordinates, like its candidates
+                local = components.copy()
+                local['x'] -= x0
+                local['y'] -= y0
+                found_text = self.recognize_text_candidates(crop, found_text, local)
+            found_text.shift(x0, y0)
+            b = found_text.boxes
+            inside = self._away_from_edges(b['x'], b['y'], b['width'], b['height'], region, (width, height))
+            text_parts.append(found_text.take(inside))
+
+        text_blocks = TextBlocks.concat(text_parts)
+        # Keep reading order (top to bottom, left to right)
+        order = np.lexsort((text_blocks.boxes['x'], text_blocks.boxes['y']))
+        logger.info(f"Incremental analysis: {int(changed.sum())}/{changed.size} blocks changed, "
+                    f"{len(regions)} region(s) re-read")
+        return Layout(width, height, components, text_blocks.take(order), blocks=blocks)
+
+    def _away_from_edges(self, x, y, w, h, region, page_size, margin=2):
+        """Mask of boxes that do not touch an edge of the region inside the page"""
+        x0, y0, x1, y1 = region
+        keep = np.ones(len(x), dtype=bool)
+        if x0 > 0:
+            keep &= x > x0 + margin
+        if y0 > 0:
+            keep &= y > y0 + margin
+        if x1 < page_size[0]:
+            keep &= x + w < x1 - margin
+        if y1 < page_size[1]:
+            keep &= y + h < y1 - margin
+        return keep
+
+    def cached_analysis(self, image_bytes, timings=None, previous=None):
+        """Analysis for an image, reusing a cached result for identical bytes
+
+        On a cache miss, ``previous`` (the stored layout of an earlier
+        revision of the same screen) allows an incremental analysis.
+        """
+        cache = get_result_cache()
+        key = analysis_key(image_bytes, self.analysis_params())
+        analysis = cache.get(key) if cache is not None else None
+
+        if analysis is None:
+            with stage_timer(timings, 'decode'):
+                image = self.load_image_bytes(image_bytes)
+
+            if previous:
+                with stage_timer(timings, 'incremental'):
+                    analysis = self.incremental_analysis(image, previous, timings)
+            if analysis is None:
+                analysis = self.analyze_image(image, timings)
+            if cache is not None:
+                cache.set(key, analysis)
+        return analysis
+
+    def build_result(self, layout, framework, css_type, timings=None):
+        """Generate code for an analysed image"""
+        # Generate code
+        with stage_timer(timings, 'generate_code'):
+            html_code, css_code = self.generate_html_css(layout, framework, css_type)
+            js_code = self.generate_javascript(layout, framework)
+        
+        # Dict view for callers and the stored JSON; annotated previews are
+        # rendered on demand from 'layout'
+        layout_dict = layout.to_dict()
+        return {
+            'html_code': html_code,
+            'css_code': css_code,
+            'js_code': js_code,
+            'success': True,
+            'components': layout_dict['components'],
+            'text_blocks': layout_dict['text_blocks'],
+            'layout': layout_dict,
+            'timings': timings if timings is not None else {}
+        }
+
+    def error_result(self, error):
+        return {
+            'html_code': f'<!-- Processing error: {str(error)} -->',
+            'css_code': f'/* Processing error: {str(error)} */',
+            'js_code': f'// Processing error: {str(error)}',
+            'success': False,
+            'error': str(error),
+            # Anything else (a busy reader pool, a full disk) may pass
+            'invalid_image': isinstance(error, InvalidImageError),
+        }
+
+    def process_image_bytes(self, image_bytes, framework='vanilla', css_type='external', timings=None,
+                            previous=None):
+        """Complete image processing pipeline for an in-memory upload"""
+        timings = {} if timings is None else timings
+        try:
+            # The result dict shares ``timings``, so 'total' lands in it too
+            with stage_timer(timings, 'total'):
+                # Detect components and text (cached on image content + parameters);
+                # only code generation depends on framework and css_type
+                analysis = self.cached_analysis(image_bytes, timings, previous)
+
+                result = self.build_result(analysis, framework, css_type, timings)
             
         except Exception as e:
-            logger.error(f"Code generation failed: {str(e)}")
-            raise
+            logger.error(f"Processing failed: {str(e)}", exc_info=True)
+            result = self.error_result(e)
+        record_pipeline(result, timings)
+        return result
 
     def process_uploaded_image(self, image_path, framework='vanilla', css_type='external'):
-        """Complete image processing pipeline"""
+        """Complete image processing pipeline for a file on disk"""
+        timings = {}
         try:
-            # Load and validate image
-            image = self.load_image(image_path)
-            if image is None:
-                raise ValueError("Failed to load image")
-            
-            # Preprocess image
-            processed = self.preprocess_image(image)
-            
-            # Detect components and text
-            text_blocks = self.extract_text_regions(image)
-            components = self.detect_ui_components(image)
-            
-            # Generate code
-            html_code, css_code = self.generate_html_css(components, text_blocks, framework, css_type)
-            
-            # Create annotated preview
-            annotated = self.create_annotated_preview(image, components, text_blocks)
-            base64_img = self.image_to_base64(annotated)
-            
-            return {
-                'html_code': html_code,
-                'css_code': css_code,
-                'js_code': self.generate_javascript(components, framework),
-                'annotated_image': base64_img,
-                'success': True,
-                'components': components,
-                'text_blocks': text_blocks
-            }
-            
+            with stage_timer(timings, 'read'):
+                with open(image_path, 'rb') as f:
+                    image_bytes = f.read()
         except Exception as e:
             logger.error(f"Processing failed: {str(e)}", exc_info=True)
-            return {
-                'html_code': f'<!-- Processing error: {str(e)} -->',
-                'css_code': f'/* Processing error: {str(e)} */',
-                'js_code': f'// Processing error: {str(e)}',
-                'annotated_image': '',
-                'success': False,
-                'error': str(e)
-            }
-
-    def create_annotated_preview(self, image, components, text_blocks):
-        """Create visualization of detected elements"""
-        annotated = image.copy()
+            return self.error_result(e)
+        return self.process_image_bytes(image_bytes, framework, css_type, timings)
+
+    def _load_for_batch(self, source, params):
+        """Read, hash and (on a cache miss) decode one batch member
+
+        ``source`` is either a path or the encoded image itself.
+        """
+        label = source if isinstance(source, str) else 'in-memory image'
+        item = {'path': label, 'analysis': None, 'image': None, 'error': None}
+        try:
+            if isinstance(source, str):
+                with open(source, 'rb') as f:
+                    source = f.read()
+            item['key'] = analysis_key(source, params)
+            cache = get_result_cache()
+            if cache is not None:
+                item['analysis'] = cache.get(item['key'])
+            if item['analysis'] is None:
+                item['image'] = self.load_image_bytes(source)
+        except Exception as e:
+            logger.error(f"Could not load {label}: {str(e)}")
+            item['error'] = e
+        return item
+
+    def process_batch(self, sources, framework='vanilla', css_type='external'):
+        """Convert several screenshots in one call; returns one result per source
+
+        Sources are file paths or encoded image bytes, and may be mixed.
+        """
+        sources = list(sources)
+        if not sources:
+            return []
+
+        params = self.analysis_params()
+        workers = max(1, min(len(sources), self.decode_workers))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Decoding releases the GIL, so images are read and decoded in parallel
+            items = list(pool.map(lambda source: self._load_for_batch(source, params), sources))
+
+            pending = [item for item in items if item['error'] is None and item['analysis'] is None]
+            if pending:
+                try:
+                    images = [item['image'] for item in pending]
+                    component_lists = list(pool.map(self.detect_components_stage, images))
+                    text_lists = self.extract_text_regions_batch(images, component_lists)
+                except Exception as e:
+                    logger.error(f"Batch processing failed: {str(e)}", exc_info=True)
+                    for item in pending:
+                        item['error'] = e
+                else:
+                    cache = get_result_cache()
+                    for item, text_blocks, components in zip(pending, text_lists, component_lists):
+                        height, width = item['image'].shape[:2]
+                        item['analysis'] = Layout(width, height, components, text_blocks,
+                                                  blocks=self.page_blocks(item['image']))
+                        item['image'] = None
+                        if cache is not None:
+                            cache.set(item['key'], item['analysis'])
+
+        results = []
+        for item in items:
+            if item['error'] is not None:
+                result = self.error_result(item['error'])
+            else:
+                try:
+                    result = self.build_result(item['analysis'], framework, css_type, {})
+                except Exception as e:
+                    logger.error(f"Processing failed for {item['path']}: {str(e)}", exc_info=True)
+                    result = self.error_result(e)
+            # Batch stages run across images, so only per-image stages are timed
+            record_pipeline(result)
+            results.append(result)
+        return results
+
+    def create_annotated_preview(self, image, layout, scale=1.0, in_place=False):
+        """Create visualization of detected elements
+
+        ``scale`` maps layout coordinates onto ``image`` when it is a
+        downscaled copy; with ``in_place`` the boxes are drawn on ``image``
+        itself instead of a copy.
+        """
+        annotated = image if in_place else image.copy()
+        
+        def pt(x, y):
+            return int(round(x * scale)), int(round(y * scale))
+        
+        color_map = {
+            'button': (0, 255, 0),    # Green
+            'input': (255, 0, 0),     # Red
+            'container': (0, 0, 255)  # Blue
+        }
         
         # Draw components
-        for comp in components:
-            color_map = {
-                'button': (0, 255, 0),    # Green
-                'input': (255, 0, 0),     # Red
-                'container': (0, 0, 255)  # Blue
-            }
-            color = color_map.get(comp.get('type', ''), (128, 128, 128))
+        for kind, x, y, width, height in layout.components.tolist():
+            comp_type = COMPONENT_TYPES[kind]
+            color = color_map.get(comp_type, (128, 128, 128))
             cv2.rectangle(annotated, 
-                         (comp['x'], comp['y']), 
-                         (comp['x'] + comp['width'], comp['y'] + comp['height']), 
+                         pt(x, y), 
+                         pt(x + width, y + height), 
                          color, 2)
             cv2.putText(annotated, 
-                       comp.get('type', 'unknown'), 
-                       (comp['x'], comp['y'] - 10), 
+                       comp_type, 
+                       pt(x, y - 10 / max(scale, 1e-6)), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
         
-        # Draw text blocks
-        for text in text_blocks:
-            if isinstance(text, dict) and 'bbox' in text:
-                points = np.array(text['bbox'], dtype=np.int32)
-                cv2.polylines(annotated, [points], True, (255, 165, 0), 2)  # Orange
+        # Draw text blocks, all polygons in one call
+        if len(layout.text):
+            polygons = np.rint(layout.text.polygons * scale).astype(np.int32)
+            cv2.polylines(annotated, list(polygons), True, (255, 165, 0), 2)  # Orange
         
         return annotated
 
-    def image_to_base64(self, image):
-        """Convert image to base64 with error handling"""
-        try:
-            _, buffer = cv2.imencode('.png', image)
-            return f"data:image/png;base64,{base64.b64encode(buffer).decode('utf-8')}"
-        except Exception as e:
-            logger.error(f"Failed to encode image: {str(e)}")
-            return ""
+    def render_preview(self, image_bytes, layout, max_side=1280, fmt='jpeg', quality=80):
+        """Annotated preview from stored layout data, encoded as JPEG or WebP"""
+        if not isinstance(layout, Layout):
+            layout = Layout.from_dict(layout)
+        # Decode at 1/2, 1/4 or 1/8 size when the image is much larger than the
+        # preview (cheap for JPEG); layout coordinates are rescaled to match
+        longest = max(layout.width, layout.height)
+        flags = cv2.IMREAD_COLOR
+        for factor, reduced in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                                (2, cv2.IMREAD_REDUCED_COLOR_2)):
+            if longest and longest / factor >= max_side:
+                flags = reduced
+                break
+        with timed('preview_decode'):
+            image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), flags)
+        if image is None:
+            raise InvalidImageError("Unsupported image format or corrupted file")
+        image, _ = self.working_copy(image, max_side)
+        
+        original_width = layout.width or image.shape[1]
+        scale = image.shape[1] / float(original_width)
+        annotated = self.create_annotated_preview(image, layout, scale=scale, in_place=True)
+        
+        with timed('preview_encode'):
+            if fmt == 'webp':
+                ok, buffer = cv2.imencode('.webp', annotated, [cv2.IMWRITE_WEBP_QUALITY, quality])
+                content_type = 'image/webp'
+            else:
+                ok, buffer = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, quality])
+                content_type = 'image/jpeg'
+        if not ok:
+            raise ValueError("Failed to encode preview")
+        return buffer.tobytes(), content_type
 
-    def generate_javascript(self, components, framework):
+    def generate_javascript(self, layout, framework):
         """Generate framework-specific JavaScript"""
         if framework == 'react':
             return """import React from 'react';
@@ -548,9 +1237,35 @@ export default function GeneratedUI() {
 });
 """
 
-# Global processor instance
+# Global processor instance (cheap: OCR models load lazily)
 processor = ImageProcessor()
 
 def process_uploaded_image(image_path, framework='vanilla', css_type='external'):
     """Wrapper function for the image processor"""
-    return processor.process_uploaded_image(image_path, framework, css_type)
\ No newline at end of file
+    return processor.process_uploaded_image(image_path, framework, css_type)
+
+def process_image_bytes(image_bytes, framework='vanilla', css_type='external', previous=None):
+    """Wrapper for converting an image already held in memory"""
+    return processor.process_image_bytes(image_bytes, framework, css_type, previous=previous)
+
+def analysis_params_key():
+    """Digest of the current analysis parameters, stored with each layout"""
+    return params_key(processor.analysis_params())
+
+def result_from_layout(layout, framework='vanilla', css_type='external'):
+    """Wrapper generating code from a stored layout dict, without re-analysis"""
+    return processor.build_result(Layout.from_dict(layout), framework, css_type)
+
+def process_batch(sources, framework='vanilla', css_type='external'):
+    """Wrapper for batched conversion of several images"""
+    return processor.process_batch(sources, framework, css_type)
+
+def render_preview(image_bytes, layout, fmt='jpeg'):
+    """Wrapper for lazily rendered annotated previews"""
+    return processor.render_preview(image_bytes, layout,
+                                    max_side=getattr(settings, 'BIFROST_PREVIEW_MAX_SIDE', 1280),
+                                    fmt=fmt)
+
+def read_text(image):
+    """Wrapper for plain OCR through the shared reader pool"""
+    return processor.read_text(image)
\ No newline at end of file
@@ -0,0 +1,104 @@
+import base64
+import hashlib
+
+import cv2
+import numpy as np
+
+
+def block_hashes(image, block_size):
+    """64-bit content hash per ``block_size`` square of an image, shape (rows, cols)"""
+    height, width = image.shape[:2]
+    rows, cols = -(-height // block_size), -(-width // block_size)
+    padded = np.zeros((rows * block_size, cols * block_size) + image.shape[2:], dtype=image.dtype)
+    padded[:height, :width] = image
+
+    # One contiguous row of bytes per block
+    blocks = np.ascontiguousarray(
+        padded.reshape(rows, block_size, cols, block_size, -1).swapaxes(1, 2).reshape(rows * cols, -1))
+    digests = b''.join(hashlib.blake2b(block, digest_size=8).digest() for block in blocks)
+    return np.frombuffer(digests, dtype='<u8').reshape(rows, cols)
+
+
+def encode_hashes(hashes, block_size):
+    """JSON-safe form of a block hash grid, stored with the layout"""
+    rows, cols = hashes.shape
+    return {
+        'size': block_size,
+        'rows': rows,
+        'cols': cols,
+        'hashes': base64.b64encode(hashes.astype('<u8').tobytes()).decode('ascii'),
+    }
+
+
+def decode_hashes(data):
+    """Inverse of encode_hashes; returns (hashes, block_size)"""
+    hashes = np.frombuffer(base64.b64decode(data['hashes']), dtype='<u8')
+    return hashes.reshape(data['rows'], data['cols']), data['size']
+
+
+def changed_regions(changed, block_size, shape):
+    """Pixel rectangles (x0, y0, x1, y1) covering the changed blocks
+
+    Each changed block is padded by one block of context before touching
+    blocks are merged into regions.
+    """
+    mask = cv2.dilate(changed.astype(np.uint8), np.ones((3, 3), dtype=np.uint8))
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    height, width = shape[:2]
+    regions = []
+    for x, y, w, h, _ in stats[1:count].tolist():
+        regions.append((x * block_size, y * block_size,
+                        min(width, (x + w) * block_size), min(height, (y + h) * block_size)))
+    return regions
+
+
+def grow_regions(regions, boxes, shape, pad=16):
+    """Grow regions until every box they touch lies inside with ``pad`` px to spare
+
+    ``boxes`` is an (n, 4) array of (x0, y0, x1, y1); regions are clipped to
+    the page ``shape``. Regions that end up overlapping are merged, so the
+    result is disjoint.
+    """
+    height, width = shape[:2]
+    regions = np.array(regions, dtype=np.int64).reshape(-1, 4)
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    while True:
+        grown = regions.copy()
+        for i, (x0, y0, x1, y1) in enumerate(regions.tolist()):
+            hit = ((boxes[:, 0] < x1) & (boxes[:, 2] > x0) & (boxes[:, 1] < y1) & (boxes[:, 3] > y0))
+            if hit.any():
+                touched = boxes[hit]
+                grown[i] = (max(0, min(x0, touched[:, 0].min() - pad)),
+                            max(0, min(y0, touched[:, 1].min() - pad)),
+                            min(width, max(x1, touched[:, 2].max() + pad)),
+                            min(height, max(y1, touched[:, 3].max() + pad)))
+        grown = merge_overlapping(grown)
+        if len(grown) == len(regions) and (grown == regions).all():
+            return [tuple(region) for region in grown.tolist()]
+        regions = grown
+
+
+def merge_overlapping(regions):
+    regions = [list(region) for region in regions.tolist()]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    regions[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return np.array(regions, dtype=np.int64).reshape(-1, 4)
+
+
+def outside_regions(x0, y0, x1, y1, regions):
+    """Mask of boxes (given as coordinate arrays) that touch no region"""
+    keep = np.ones(len(x0), dtype=bool)
+    for rx0, ry0, rx1, ry1 in regions:
+        keep &= ~((x0 < rx1) & (x1 > rx0) & (y0 < ry1) & (y1 > ry0))
+    return keep
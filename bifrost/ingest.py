@@ -0,0 +1,61 @@
+import logging
+import os
+import uuid
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def spill_threshold():
+    """Uploads up to this many bytes never touch the local disk"""
+    return getattr(settings, 'BIFROST_UPLOAD_SPILL_BYTES', 4 * 1024 * 1024)
+
+
+def upload_buffer(uploaded_file):
+    """Bytes of an upload, without copying when Django kept it in memory"""
+    f = uploaded_file.file
+    if hasattr(f, 'getbuffer'):
+        # InMemoryUploadedFile wraps a BytesIO: share its buffer
+        return f.getbuffer()
+    uploaded_file.seek(0)
+    return uploaded_file.read()
+
+
+def spool_dir():
+    path = os.path.join(settings.MEDIA_ROOT, 'jobs')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def spool_upload(uploaded_file):
+    """Copy an uploaded file where a worker can pick it up later"""
+    ext = os.path.splitext(uploaded_file.name)[1]
+    path = os.path.join(spool_dir(), f"{uuid.uuid4().hex}{ext}")
+    with open(path, 'wb') as f:
+        for chunk in uploaded_file.chunks():
+            f.write(chunk)
+    return path
+
+
+def remove_spooled(path):
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.error(f"Could not remove spooled upload {path}: {str(e)}")
+
+
+def stage_upload(uploaded_file):
+    """Job fields holding an upload: in memory (DB row) or spilled to disk"""
+    if uploaded_file.size <= spill_threshold():
+        return {'image_data': upload_buffer(uploaded_file), 'image_path': ''}
+    return {'image_data': None, 'image_path': spool_upload(uploaded_file)}
+
+
+def load_job_image(job):
+    """Image bytes for a job, read once whichever way they were staged"""
+    if job.image_data is not None:
+        return job.image_data
+    with open(job.image_path, 'rb') as f:
+        return f.read()
@@ -0,0 +1,520 @@
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from bifrost.ingest import load_job_image, remove_spooled, stage_upload
+from bifrost.metrics import JOB_SECONDS, QUEUE_WAIT, timed
+from bifrost.models import ProcessingJob, UploadHistory
+from bifrost.phash import image_phash, near_duplicates, phash_fields
+from bifrost.storage import get_image_storage, thumbnail_url
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentJobError(Exception):
+    """A job failure that retrying will not fix (e.g. an unreadable image)"""
+
+
+class TransientJobError(Exception):
+    """A job failure that a later attempt may not hit (e.g. a busy OCR reader pool)"""
+
+
+def enqueue_conversion(user, uploaded_file, framework='vanilla', css_type='external', priority=0):
+    """Queue an image conversion and return the job right away"""
+    job = ProcessingJob.objects.create(
+        user=user,
+        kind=ProcessingJob.KIND_CONVERT,
+        priority=priority,
+        framework_type=framework,
+        css_style=css_type,
+        image_name=uploaded_file.name,
+        max_attempts=getattr(settings, 'BIFROST_JOB_MAX_ATTEMPTS', 3),
+        **stage_upload(uploaded_file)
+    )
+    if getattr(settings, 'BIFROST_JOB_RUN_IN_PROCESS', True):
+        get_job_runner().start()
+    get_job_runner().wake()
+    return job
+
+
+def enqueue_batch(user, uploaded_files, framework='vanilla', css_type='external', priority=-1):
+    """Queue several images as one batch; they are converted together"""
+    batch_key = uuid.uuid4()
+    jobs = [
+        ProcessingJob(
+            user=user,
+            kind=ProcessingJob.KIND_CONVERT,
+            priority=priority,
+            framework_type=framework,
+            css_style=css_type,
+            image_name=uploaded_file.name,
+            max_attempts=getattr(settings, 'BIFROST_JOB_MAX_ATTEMPTS', 3),
+            batch_key=batch_key,
+            **stage_upload(uploaded_file)
+        )
+        for uploaded_file in uploaded_files
+    ]
+    ProcessingJob.objects.bulk_create(jobs)
+    if getattr(settings, 'BIFROST_JOB_RUN_IN_PROCESS', True):
+        get_job_runner().start()
+    get_job_runner().wake()
+    return batch_key
+
+
+def run_conversion(job):
+    """Full conversion pipeline for one job; returns the UploadHistory row"""
+    # Imported here so that loading the job module stays cheap
+    from bifrost.image_processor import process_image_bytes
+
+    with timed('load_upload'):
+        image_bytes = load_job_image(job)
+    with timed('phash'):
+        value, size = image_phash(image_bytes)
+    with timed('reuse_lookup'):
+        result, previous = reuse_conversion(job, image_bytes, value, size)
+    if result is None:
+        result = process_image_bytes(image_bytes, job.framework_type, job.css_style,
+                                     previous=previous or previous_layout(job.user))
+    return store_conversion(job, result, image_bytes, value)
+
+
+def content_digest(image_bytes):
+    """sha256 of an upload's bytes, stored to find re-uploads of the same file"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def reuse_conversion(job, image_bytes, value, size):
+    """Reuse an earlier upload of the same screen; returns (result, previous layout)
+
+    Only an upload of the very same bytes, made with the same analysis
+    parameters, gives a result. The perceptual hash ignores fine text (a
+    relabelled button can hash the same), so an upload within
+    BIFROST_PHASH_RADIUS bits only seeds the incremental analysis.
+    """
+    from bifrost.image_processor import analysis_params_key, result_from_layout
+
+    if getattr(settings, 'BIFROST_PHASH_RADIUS', 0) < 0:
+        return None, None
+    queryset = UploadHistory.objects.filter(params_key=analysis_params_key())
+    if getattr(settings, 'BIFROST_PHASH_SCOPE', 'user') == 'user':
+        queryset = queryset.filter(user=job.user)
+
+    match = (queryset
+             .filter(content_hash=content_digest(image_bytes))
+             .select_related(*UploadHistory.CODE_BLOBS)
+             .only('id', 'framework_type', 'css_style', 'layout', *UploadHistory.CODE_BLOBS)
+             .first())
+    if match is not None:
+        layout = match.layout or {}
+        logger.info(f"Job {job.id} reuses upload {match.id}")
+        if (match.framework_type, match.css_style) == (job.framework_type, job.css_style):
+            return {
+                'html_code': match.html_code,
+                'css_code': match.css_code,
+                'js_code': match.js_code,
+                'success': True,
+                'text_blocks': layout.get('text_blocks', []),
+                'layout': layout,
+            }, None
+        # Same file, other output options: only code generation runs again
+        return result_from_layout(layout, job.framework_type, job.css_style), None
+
+    if value is None:
+        return None, None
+    for distance, pk in near_duplicates(queryset, value):
+        layout = UploadHistory.objects.values_list('layout', flat=True).get(pk=pk) or {}
+        # Layout coordinates only carry over at the same pixel size
+        if (layout.get('width'), layout.get('height')) == tuple(size):
+            logger.info(f"Job {job.id} starts from upload {pk} (hash distance {distance})")
+            return None, layout
+    return None, None
+
+
+def previous_layout(user):
+    """Stored layout of the user's latest conversion, for incremental re-runs
+
+    Only layouts made with the current analysis parameters qualify: their
+    detections are merged into the new analysis.
+    """
+    from bifrost.image_processor import analysis_params_key
+
+    if not getattr(settings, 'BIFROST_INCREMENTAL_BLOCK', 64):
+        return None
+    return (UploadHistory.objects
+            .filter(user=user, params_key=analysis_params_key())
+            .order_by('-created_at')
+            .values_list('layout', flat=True)
+            .first())
+
+
+def store_conversion(job, result, image_bytes, value=None):
+    """Persist a processed image: history row now, image upload in the background"""
+    from bifrost.image_processor import analysis_params_key
+
+    if not result.get('success'):
+        error = result.get('error', 'Image processing failed')
+        if result.get('invalid_image'):
+            raise PermanentJobError(error)
+        raise TransientJobError(error)
+    if value is None:
+        value, _ = image_phash(image_bytes)
+
+    # Save to database; the result is usable before the image reaches storage
+    with timed('db_insert'):
+        upload = UploadHistory.objects.create(
+            user=job.user,
+            image_status=UploadHistory.IMAGE_PENDING,
+            html_code=result['html_code'],
+            css_code=result['css_code'],
+            js_code=result['js_code'],
+            framework_type=job.framework_type,
+            css_style=job.css_style,
+            ocr_text="\n".join([t['text'] for t in result.get('text_blocks', [])]),
+            layout=result.get('layout', {}),
+            params_key=analysis_params_key(),
+            content_hash=content_digest(image_bytes),
+            **phash_fields(value)
+        )
+    enqueue_image_upload(job, upload, image_bytes)
+    return upload
+
+
+def enqueue_image_upload(job, upload, image_bytes):
+    """Hand a converted job's image over to the storage workers"""
+    store_job = ProcessingJob.objects.create(
+        user=job.user,
+        kind=ProcessingJob.KIND_STORE_IMAGE,
+        image_name=job.image_name,
+        # Large uploads are spooled; the storage job takes the file over
+        image_data=None if job.image_path else image_bytes,
+        image_path=job.image_path,
+        upload=upload,
+        max_attempts=getattr(settings, 'BIFROST_STORAGE_MAX_ATTEMPTS', 6),
+    )
+    job.image_path = ''
+    if getattr(settings, 'BIFROST_JOB_RUN_IN_PROCESS', True):
+        get_storage_runner().start()
+    get_storage_runner().wake()
+    return store_job
+
+
+def store_image(job):
+    """Push an uploaded image to storage and record its URL"""
+    storage = get_image_storage()
+    with timed('storage_save'):
+        name = storage.save(f"user_uploads/{job.user.username}_{job.image_name}",
+                            ContentFile(bytes(load_job_image(job))))
+        url = storage.url(name)
+    (UploadHistory.objects
+     .filter(pk=job.upload_id)
+     .update(cloud_image_url=url, thumbnail_url=thumbnail_url(url), image_storage_name=name,
+             image_status=UploadHistory.IMAGE_STORED))
+    return job.upload
+
+
+def stored_image_bytes(upload):
+    """Bytes of an image in the image storage, or None for uploads stored by URL only"""
+    if not upload.image_storage_name:
+        return None
+    with get_image_storage().open(upload.image_storage_name, 'rb') as f:
+        return f.read()
+
+
+def store_image_failed(job):
+    UploadHistory.objects.filter(pk=job.upload_id).update(image_status=UploadHistory.IMAGE_FAILED)
+
+
+def pending_image_bytes(upload):
+    """Bytes of an image still waiting for storage, or None"""
+    job = (ProcessingJob.objects
+           .filter(kind=ProcessingJob.KIND_STORE_IMAGE, upload=upload)
+           .exclude(status=ProcessingJob.STATUS_DONE)
+           .order_by('-created_at')
+           .first())
+    if job is None or (job.image_data is None and not job.image_path):
+        return None
+    try:
+        return load_job_image(job)
+    except OSError:
+        return None
+
+
+JOB_HANDLERS = {
+    ProcessingJob.KIND_CONVERT: run_conversion,
+    ProcessingJob.KIND_STORE_IMAGE: store_image,
+}
+
+# Called once a job has failed for good
+JOB_FAILURE_HANDLERS = {
+    ProcessingJob.KIND_STORE_IMAGE: store_image_failed,
+}
+
+# Jobs whose staged upload is the only copy once they fail for good; it is
+# kept until a retry (see retry_jobs) stores it
+KEEP_UPLOAD_ON_FAILURE = {ProcessingJob.KIND_STORE_IMAGE}
+
+
+def claim_next_job(kinds=None):
+    """Atomically move the most urgent runnable job to 'running'"""
+    now = timezone.now()
+    candidates = ProcessingJob.objects.filter(status=ProcessingJob.STATUS_QUEUED, run_after__lte=now)
+    if kinds:
+        candidates = candidates.filter(kind__in=kinds)
+    candidates = candidates.order_by('-priority', 'created_at').values_list('pk', flat=True)[:10]
+
+    for pk in candidates:
+        # Conditional UPDATE works the same on SQLite and MySQL: only one
+        # worker can flip a given row from queued to running.
+        claimed = (ProcessingJob.objects
+                   .filter(pk=pk, status=ProcessingJob.STATUS_QUEUED)
+                   .update(status=ProcessingJob.STATUS_RUNNING,
+                           started_at=now,
+                           attempts=F('attempts') + 1))
+        if claimed:
+            return ProcessingJob.objects.select_related('user').get(pk=pk)
+    return None
+
+
+def claim_batch_siblings(job):
+    """Claim the other runnable jobs uploaded in the same batch as ``job``"""
+    now = timezone.now()
+    candidates = (ProcessingJob.objects
+                  .filter(batch_key=job.batch_key, status=ProcessingJob.STATUS_QUEUED, run_after__lte=now)
+                  .values_list('pk', flat=True))
+    claimed = []
+    for pk in candidates:
+        if (ProcessingJob.objects
+                .filter(pk=pk, status=ProcessingJob.STATUS_QUEUED)
+                .update(status=ProcessingJob.STATUS_RUNNING,
+                        started_at=now,
+                        attempts=F('attempts') + 1)):
+            claimed.append(pk)
+    return list(ProcessingJob.objects.select_related('user').filter(pk__in=claimed))
+
+
+def retry_delay(attempts):
+    base = getattr(settings, 'BIFROST_JOB_RETRY_BACKOFF', 5)
+    return timedelta(seconds=base * (2 ** max(0, attempts - 1)))
+
+
+def execute_job(job, handler=None):
+    """Run a claimed job and record its outcome"""
+    handler = handler or JOB_HANDLERS[job.kind]
+    if job.started_at is not None:
+        QUEUE_WAIT.observe(max(0.0, (job.started_at - max(job.created_at, job.run_after)).total_seconds()),
+                           kind=job.kind)
+    started = time.perf_counter()
+    try:
+        job.upload = handler(job)
+    except Exception as e:
+        JOB_SECONDS.observe(time.perf_counter() - started, kind=job.kind, outcome='error')
+        permanent = isinstance(e, PermanentJobError) or job.attempts >= job.max_attempts
+        logger.error(f"Job {job.id} attempt {job.attempts} failed: {str(e)}", exc_info=not permanent)
+        job.error = str(e)
+        if permanent:
+            job.status = ProcessingJob.STATUS_FAILED
+            job.finished_at = timezone.now()
+            if job.kind not in KEEP_UPLOAD_ON_FAILURE:
+                job.image_data = None
+                remove_spooled(job.image_path)
+            if job.kind in JOB_FAILURE_HANDLERS:
+                JOB_FAILURE_HANDLERS[job.kind](job)
+        else:
+            job.status = ProcessingJob.STATUS_QUEUED
+            job.run_after = timezone.now() + retry_delay(job.attempts)
+        job.save(update_fields=['status', 'error', 'finished_at', 'run_after', 'image_data'])
+        return job
+
+    JOB_SECONDS.observe(time.perf_counter() - started, kind=job.kind, outcome='success')
+    # The upload lives on in storage; drop the staged copy
+    job.status = ProcessingJob.STATUS_DONE
+    job.error = ''
+    job.finished_at = timezone.now()
+    job.image_data = None
+    remove_spooled(job.image_path)
+    job.image_path = ''
+    job.save(update_fields=['status', 'error', 'finished_at', 'upload', 'image_data', 'image_path'])
+    return job
+
+
+def execute_batch(jobs):
+    """Convert a batch of claimed jobs with one batched pipeline call"""
+    from bifrost.image_processor import process_batch
+
+    # A job whose upload cannot be read fails on its own; the rest go on
+    ready, sources = [], []
+    for job in jobs:
+        try:
+            sources.append(load_job_image(job))
+        except Exception as e:
+            execute_job(job, handler=fail_with(e))
+        else:
+            ready.append(job)
+    if not ready:
+        return jobs
+
+    # Every job in a batch shares the same options
+    try:
+        results = process_batch(sources, ready[0].framework_type, ready[0].css_style)
+    except Exception as e:
+        # Record the failure (and retry) per job rather than leaving them running
+        for job in ready:
+            execute_job(job, handler=fail_with(e))
+        return jobs
+    for job, result, image_bytes in zip(ready, results, sources):
+        execute_job(job, handler=lambda j, r=result, b=image_bytes: store_conversion(j, r, b))
+    return jobs
+
+
+def fail_with(error):
+    """Job handler that raises ``error``, so execute_job records it like any failure"""
+    def handler(job):
+        raise error
+    return handler
+
+
+def retry_jobs(queryset):
+    """Queue failed jobs again with a fresh attempt budget; returns how many"""
+    jobs = list(queryset.filter(status=ProcessingJob.STATUS_FAILED))
+    for job in jobs:
+        if job.image_data is None and not job.image_path:
+            continue
+        job.status = ProcessingJob.STATUS_QUEUED
+        job.attempts = 0
+        job.error = ''
+        job.run_after = timezone.now()
+        job.finished_at = None
+        job.save(update_fields=['status', 'attempts', 'error', 'run_after', 'finished_at'])
+        if job.kind == ProcessingJob.KIND_STORE_IMAGE:
+            UploadHistory.objects.filter(pk=job.upload_id).update(image_status=UploadHistory.IMAGE_PENDING)
+    retried = [job for job in jobs if job.status == ProcessingJob.STATUS_QUEUED]
+    if retried and getattr(settings, 'BIFROST_JOB_RUN_IN_PROCESS', True):
+        get_job_runner().start()
+        get_storage_runner().start()
+    get_job_runner().wake()
+    get_storage_runner().wake()
+    return len(retried)
+
+
+def requeue_stale_jobs():
+    """Put back jobs left 'running' by a worker that died mid-job"""
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'BIFROST_JOB_STALE_SECONDS', 900))
+    count = (ProcessingJob.objects
+             .filter(status=ProcessingJob.STATUS_RUNNING, started_at__lt=cutoff)
+             .update(status=ProcessingJob.STATUS_QUEUED, run_after=timezone.now()))
+    if count:
+        logger.info(f"Requeued {count} stale job(s)")
+    return count
+
+
+class JobRunner:
+    """Pool of worker threads draining the database-backed job queue"""
+
+    def __init__(self, concurrency=1, poll_interval=2.0, kinds=None, name='job'):
+        self.concurrency = max(1, int(concurrency))
+        self.poll_interval = poll_interval
+        self.kinds = kinds  # None runs every kind of job
+        self.name = name
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the worker threads once per process"""
+        with self._lock:
+            if self._threads:
+                return
+            try:
+                requeue_stale_jobs()
+            except Exception as e:
+                logger.error(f"Could not requeue stale jobs: {str(e)}")
+            for i in range(self.concurrency):
+                thread = threading.Thread(target=self.work_forever, name=f'bifrost-{self.name}-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def wake(self):
+        self._wakeup.set()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def run_once(self):
+        """Claim and run a single job; returns False when the queue is empty"""
+        close_old_connections()
+        try:
+            job = claim_next_job(self.kinds)
+            if job is None:
+                return False
+            if job.batch_key and job.kind == ProcessingJob.KIND_CONVERT:
+                execute_batch([job] + claim_batch_siblings(job))
+            else:
+                execute_job(job)
+            return True
+        finally:
+            close_old_connections()
+
+    def work_forever(self):
+        while not self._stop.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                logger.error(f"Job worker error: {str(e)}", exc_info=True)
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner():
+    """Return this process's job runner"""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = JobRunner(
+                    concurrency=getattr(settings, 'BIFROST_JOB_CONCURRENCY', 1),
+                    poll_interval=getattr(settings, 'BIFROST_JOB_POLL_INTERVAL', 2.0),
+                    kinds=[ProcessingJob.KIND_CONVERT],
+                )
+    return _runner
+
+
+_storage_runner = None
+
+
+def get_storage_runner():
+    """Return this process's image upload runner
+
+    Uploads wait on the network, not the CPU, so they get their own threads
+    instead of queueing behind conversions.
+    """
+    global _storage_runner
+    if _storage_runner is None:
+        with _runner_lock:
+            if _storage_runner is None:
+                _storage_runner = JobRunner(
+                    concurrency=getattr(settings, 'BIFROST_STORAGE_CONCURRENCY', 2),
+                    poll_interval=getattr(settings, 'BIFROST_JOB_POLL_INTERVAL', 2.0),
+                    kinds=[ProcessingJob.KIND_STORE_IMAGE],
+                    name='storage',
+                )
+    return _storage_runner
@@ -0,0 +1,193 @@
+import numpy as np
+
+from bifrost.spatial import BoxIndex
+
+COMPONENT_TYPES = ('button', 'input', 'container')
+
+# Component types that take a text label (buttons, inputs)
+LABELLED_TYPES = (0, 1)
+
+COMPONENT_DTYPE = np.dtype([
+    ('type', np.int8),  # index into COMPONENT_TYPES
+    ('x', np.int32),
+    ('y', np.int32),
+    ('width', np.int32),
+    ('height', np.int32),
+])
+
+TEXT_DTYPE = np.dtype([
+    ('x', np.int32),
+    ('y', np.int32),
+    ('width', np.int32),
+    ('height', np.int32),
+    ('confidence', np.float32),
+])
+
+
+class TextBlocks:
+    """Columnar OCR output: one string, box and 4-point polygon per block"""
+
+    __slots__ = ('texts', 'boxes', 'polygons')
+
+    def __init__(self, texts=(), boxes=None, polygons=None):
+        self.texts = list(texts)
+        n = len(self.texts)
+        self.boxes = np.zeros(n, dtype=TEXT_DTYPE) if boxes is None else boxes
+        self.polygons = np.zeros((n, 4, 2), dtype=np.int32) if polygons is None else polygons
+
+    @classmethod
+    def from_polygons(cls, texts, polygons, confidences):
+        """Build from polygons (n, 4, 2); boxes are their bounding rectangles"""
+        polygons = np.rint(np.asarray(polygons, dtype=np.float64)).astype(np.int32).reshape(-1, 4, 2)
+        boxes = np.zeros(len(polygons), dtype=TEXT_DTYPE)
+        if len(polygons):
+            lo = polygons.min(axis=1)
+            hi = polygons.max(axis=1)
+            boxes['x'], boxes['y'] = lo[:, 0], lo[:, 1]
+            boxes['width'], boxes['height'] = hi[:, 0] - lo[:, 0], hi[:, 1] - lo[:, 1]
+            boxes['confidence'] = confidences
+        return cls(texts, boxes, polygons)
+
+    @classmethod
+    def from_dicts(cls, items):
+        """Inverse of to_dicts (e.g. for layouts stored as JSON)"""
+        items = [t for t in items if 'bbox' in t]
+        polygons = np.zeros((len(items), 4, 2))
+        for i, t in enumerate(items):
+            polygons[i] = quad(t['bbox'])
+        return cls.from_polygons([t['text'] for t in items], polygons,
+                                 [t.get('confidence', 0.0) for t in items])
+
+    @classmethod
+    def concat(cls, parts):
+        parts = list(parts)
+        if not parts:
+            return cls()
+        return cls([text for part in parts for text in part.texts],
+                   np.concatenate([part.boxes for part in parts]),
+                   np.concatenate([part.polygons for part in parts]))
+
+    def __len__(self):
+        return len(self.texts)
+
+    def take(self, mask):
+        """Subset selected by a boolean mask or index array"""
+        keep = np.flatnonzero(mask) if np.asarray(mask).dtype == bool else np.asarray(mask, dtype=np.intp)
+        return TextBlocks([self.texts[i] for i in keep.tolist()], self.boxes[keep], self.polygons[keep])
+
+    def shift(self, dx=0, dy=0):
+        """Translate every block in place (e.g. from tile to page space)"""
+        self.boxes['x'] += dx
+        self.boxes['y'] += dy
+        self.polygons += np.array([dx, dy], dtype=np.int32)
+        return self
+
+    def to_dicts(self):
+        return [
+            {
+                'text': text,
+                'bbox': polygon,
+                'x': x,
+                'y': y,
+                'width': width,
+                'height': height,
+                'confidence': confidence,
+            }
+            for text, polygon, (x, y, width, height, confidence)
+            in zip(self.texts, self.polygons.tolist(), self.boxes.tolist())
+        ]
+
+
+def quad(points):
+    """Four corners for an OCR polygon; other shapes become their bounding box"""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(points) == 4:
+        return points
+    (x0, y0), (x1, y1) = points.min(axis=0), points.max(axis=0)
+    return np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1]])
+
+
+class Layout:
+    """Everything detected on one image, stored as NumPy columns.
+
+    ``components`` is a COMPONENT_DTYPE array and ``text`` a TextBlocks;
+    ``labels`` holds, per component, the index of the text block labelling
+    it (-1 for none). ``blocks`` optionally holds the page's block hashes
+    (see bifrost/incremental.py). ``layout['components']`` /
+    ``layout['text_blocks']`` give the dict view used by templates and the
+    stored JSON.
+    """
+
+    __slots__ = ('width', 'height', 'components', 'text', 'labels', 'blocks')
+
+    def __init__(self, width, height, components=None, text=None, labels=None, blocks=None):
+        self.width = int(width)
+        self.height = int(height)
+        self.components = np.zeros(0, dtype=COMPONENT_DTYPE) if components is None else components
+        self.text = TextBlocks() if text is None else text
+        self.labels = np.full(len(self.components), -1, dtype=np.int32) if labels is None else labels
+        self.blocks = blocks
+
+    @classmethod
+    def from_dict(cls, data):
+        """Layout from its JSON form; component labels are not restored"""
+        items = data.get('components', [])
+        components = np.zeros(len(items), dtype=COMPONENT_DTYPE)
+        for i, comp in enumerate(items):
+            components[i] = (COMPONENT_TYPES.index(comp['type']), comp['x'], comp['y'],
+                             comp['width'], comp['height'])
+        return cls(data.get('width', 0), data.get('height', 0), components,
+                   TextBlocks.from_dicts(data.get('text_blocks', [])), blocks=data.get('blocks'))
+
+    def component_index(self):
+        c = self.components
+        return BoxIndex(c['x'], c['y'], c['width'], c['height'])
+
+    def component_labels(self):
+        """Label text per component: '' when unmatched, None for containers"""
+        texts = self.text.texts
+        return [
+            (texts[label] if label >= 0 else '') if kind in LABELLED_TYPES else None
+            for kind, label in zip(self.components['type'].tolist(), self.labels.tolist())
+        ]
+
+    def component_dicts(self):
+        result = []
+        rows = self.components.tolist()
+        for (kind, x, y, width, height), label in zip(rows, self.component_labels()):
+            comp = {'type': COMPONENT_TYPES[kind], 'x': x, 'y': y, 'width': width, 'height': height}
+            # Containers never take a label
+            if label is not None:
+                comp['text'] = label
+            result.append(comp)
+        return result
+
+    def to_dict(self):
+        """JSON-safe dict view"""
+        data = {
+            'width': self.width,
+            'height': self.height,
+            'components': self.component_dicts(),
+            'text_blocks': self.text.to_dicts(),
+        }
+        if self.blocks is not None:
+            data['blocks'] = self.blocks
+        return data
+
+    def __getitem__(self, key):
+        if key == 'components':
+            return self.component_dicts()
+        if key == 'text_blocks':
+            return self.text.to_dicts()
+        if key in ('width', 'height', 'blocks'):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return ('width', 'height', 'components', 'text_blocks')
@@ -0,0 +1,218 @@
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from bifrost.bench import (DEFAULT_FIXTURE_DIR, STAGES, Benchmark, compare_reports, component_agreement,
+                           directory_fixtures, environment, load_report, synthetic_fixtures,
+                           text_agreement, thread_split_throughput)
+from bifrost.image_processor import ImageProcessor
+from bifrost.ocr_accel import parse_techniques
+from bifrost.ocr_pool import ReaderPool
+
+# Settings of the benchmark's own OCR reader pool rather than the processor
+READER_SETTINGS = ('ocr_acceleration', 'ocr_quantize')
+
+
+def parse_size(value):
+    try:
+        width, height = value.lower().split('x')
+        return int(width), int(height)
+    except ValueError:
+        raise CommandError(f"Bad size {value!r}, expected WIDTHxHEIGHT")
+
+
+def parse_config(value):
+    """'name:attr=value,attr=value' -> (name, {attr: value})"""
+    name, _, assignments = value.partition(':')
+    overrides = {}
+    for assignment in filter(None, assignments.split(',')):
+        key, sep, raw = assignment.partition('=')
+        if not sep:
+            raise CommandError(f"Bad setting {assignment!r} in config {name!r}, expected attr=value")
+        overrides[key.strip()] = raw.strip()
+    return name, overrides
+
+
+def configured_processor(overrides):
+    """ImageProcessor with attributes overridden, cast to each attribute's type
+
+    ``ocr_acceleration`` (e.g. jit) and ``ocr_quantize`` give the processor
+    its own reader pool, to compare OCR models against the stock one.
+    """
+    processor = ImageProcessor()
+    if any(key in overrides for key in READER_SETTINGS):
+        try:
+            acceleration = parse_techniques(overrides.get('ocr_acceleration', ''))
+        except ValueError as e:
+            raise CommandError(str(e))
+        quantize = overrides.get('ocr_quantize', 'true').lower() in ('1', 'true', 'yes', 'on')
+        processor = ImageProcessor(reader_pool=ReaderPool(size=1, quantize=quantize, acceleration=acceleration))
+    for key, raw in overrides.items():
+        if key in READER_SETTINGS:
+            continue
+        if key.startswith('_') or not hasattr(processor, key):
+            raise CommandError(f"ImageProcessor has no setting {key!r}")
+        current = getattr(processor, key)
+        if isinstance(current, bool):
+            value = raw.lower() in ('1', 'true', 'yes', 'on')
+        elif isinstance(current, int) and '.' not in raw:
+            value = int(raw)
+        elif isinstance(current, (int, float)):
+            value = float(raw)
+        else:
+            value = raw
+        setattr(processor, key, value)
+    return processor
+
+
+class Command(BaseCommand):
+    help = "Benchmark each image processing stage on synthetic and real screenshots"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1280x800,1920x1080,1440x4000',
+                            help="Synthetic screenshot sizes, comma separated WIDTHxHEIGHT")
+        parser.add_argument('--densities', default='0.5,1.0',
+                            help="Fraction of the card grid filled, comma separated")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--no-synthetic', action='store_true',
+                            help="Only use --fixtures images")
+        parser.add_argument('--fixtures', action='append', default=[],
+                            help="Directory of real screenshots to include (repeatable; "
+                                 "bifrost/fixtures/bench is used when present)")
+        parser.add_argument('--repeat', type=int, default=5,
+                            help="Timed runs of each stage per image")
+        parser.add_argument('--warmup', type=int, default=1,
+                            help="Untimed runs of each stage per image first")
+        parser.add_argument('--cold-runs', type=int, default=1,
+                            help="Cold end-to-end runs, each loading a new OCR model")
+        parser.add_argument('--stages', default=','.join(STAGES),
+                            help="Stages to run, comma separated")
+        parser.add_argument('--config', action='append', dest='configs', default=[],
+                            help="Processor configuration to benchmark, as "
+                                 "name:attr=value,attr=value (repeatable; e.g. "
+                                 "fast:preprocess_mode=fast,detect_max_width=1200)")
+        parser.add_argument('--thread-splits',
+                            help="Also measure end-to-end throughput of concurrent worker processes "
+                                 "for each WORKERSxTHREADS split, comma separated (e.g. 1x8,2x4,4x2,8x1)")
+        parser.add_argument('--split-runs', type=int, default=4,
+                            help="Images each worker converts in a thread-split run")
+        parser.add_argument('--affinity', action='store_true',
+                            help="Pin each thread-split worker to its own CPUs")
+        parser.add_argument('--output', help="Write the JSON report to this file")
+        parser.add_argument('--baseline', help="Earlier JSON report to compare against")
+        parser.add_argument('--threshold', type=float, default=0.15,
+                            help="With --baseline, fail if any stage's p50 is this much slower")
+
+    def handle(self, *args, **options):
+        fixtures = []
+        if not options['no_synthetic']:
+            sizes = [parse_size(size) for size in options['sizes'].split(',') if size]
+            densities = [float(d) for d in options['densities'].split(',') if d]
+            fixtures.extend(synthetic_fixtures(sizes, densities, options['seed']))
+        directories = options['fixtures']
+        if not directories and os.path.isdir(DEFAULT_FIXTURE_DIR):
+            directories = [DEFAULT_FIXTURE_DIR]
+        for directory in directories:
+            fixtures.extend(directory_fixtures(directory))
+        if not fixtures:
+            raise CommandError("No benchmark images")
+
+        stages = [stage for stage in options['stages'].split(',') if stage]
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            raise CommandError(f"Unknown stage(s): {', '.join(sorted(unknown))}")
+
+        configs = [parse_config(value) for value in options['configs']] or [('default', {})]
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'environment': environment(),
+            'fixtures': [name for name, _ in fixtures],
+            'repeat': options['repeat'],
+            'configs': {},
+            'settings': {name: overrides for name, overrides in configs},
+        }
+
+        texts, components = {}, {}
+        with tempfile.TemporaryDirectory(prefix='bifrost-bench-') as tmpdir:
+            for name, overrides in configs:
+                self.stdout.write(self.style.MIGRATE_HEADING(f"{name} ({len(fixtures)} images)"))
+                benchmark = Benchmark(configured_processor(overrides), fixtures, repeat=options['repeat'],
+                                      warmup=options['warmup'], cold_runs=options['cold_runs'],
+                                      stages=stages)
+                report['configs'][name] = benchmark.run(tmpdir, log=self.log_stage)
+                texts[name] = benchmark.texts
+                components[name] = benchmark.components
+
+        # OCR output and components of every configuration against the first one's
+        reference = configs[0][0]
+        if len(configs) > 1 and (texts[reference] or components[reference]):
+            report['accuracy'] = {'reference': reference}
+            for name, _ in configs[1:]:
+                agreement = text_agreement(texts[reference], texts[name]) or {}
+                if agreement:
+                    self.stdout.write(
+                        f"{name} vs {reference}: text similarity {agreement['text_similarity']:.3f}, "
+                        f"{agreement['identical_images']}/{agreement['images']} images identical")
+                found = component_agreement(components[reference], components[name])
+                if found:
+                    agreement.update(found)
+                    self.stdout.write(
+                        f"{name} vs {reference}: component recall {found['component_recall']:.3f}, "
+                        f"precision {found['component_precision']:.3f}")
+                report['accuracy'][name] = agreement or None
+
+        if options['thread_splits']:
+            self.stdout.write(self.style.MIGRATE_HEADING("Thread splits"))
+            images = self.decoded(fixtures)
+            report['thread_splits'] = []
+            for split in options['thread_splits'].split(','):
+                workers, threads = parse_size(split)
+                result = thread_split_throughput(images, workers, threads, runs=options['split_runs'],
+                                                 affinity=options['affinity'])
+                report['thread_splits'].append(result)
+                self.log_split(result)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+
+        if options['baseline']:
+            regressions = compare_reports(load_report(options['baseline']), report, options['threshold'])
+            for config, stage, before, after in regressions:
+                if after is None:
+                    error = report['configs'][config].get(stage, {}).get('error', 'not run')
+                    self.stdout.write(self.style.ERROR(f"{config}/{stage}: p50 {before:.1f}ms -> {error}"))
+                    continue
+                self.stdout.write(self.style.ERROR(
+                    f"{config}/{stage}: p50 {before:.1f}ms -> {after:.1f}ms (+{100 * (after / before - 1):.0f}%)"))
+            if regressions:
+                raise CommandError(f"{len(regressions)} stage(s) failed or regressed by more than "
+                                   f"{100 * options['threshold']:.0f}%")
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
+
+    def decoded(self, fixtures):
+        processor = ImageProcessor()
+        return [processor.load_image_bytes(data) for _, data in fixtures]
+
+    def log_split(self, result):
+        line = (f"  {result['workers']} worker(s) x {result['threads']} thread(s): "
+                f"{result['images_per_s'] or 0:.2f} images/s")
+        if 'p50_ms' in result:
+            line += f", p50 {result['p50_ms']:.1f}ms, p95 {result['p95_ms']:.1f}ms"
+        self.stdout.write(line)
+        for error in result.get('errors', []):
+            self.stdout.write(self.style.WARNING(f"    {error}"))
+
+    def log_stage(self, stage, summary):
+        if 'error' in summary:
+            self.stdout.write(self.style.WARNING(f"  {stage:<18} failed: {summary['error']}"))
+            return
+        self.stdout.write(
+            f"  {stage:<18} p50 {summary['p50_ms']:>9.2f}ms  p95 {summary['p95_ms']:>9.2f}ms  "
+            f"p99 {summary['p99_ms']:>9.2f}ms  {summary['throughput_per_s'] or 0:>8.2f}/s  "
+            f"peak rss {summary['peak_rss_mb']:.0f}MB"
+        )
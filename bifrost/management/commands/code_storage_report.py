@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from bifrost.blobs import current_dictionary
+from bifrost.models import CodeBlob, UploadHistory
+
+
+def referenced_digests():
+    digests = set()
+    for field in UploadHistory.CODE_BLOBS:
+        digests.update(UploadHistory.objects.exclude(**{f'{field}__isnull': True})
+                       .values_list(f'{field}_id', flat=True).distinct())
+    # Preset dictionaries are needed to decompress the blobs built on them
+    digests.update(CodeBlob.objects.exclude(dictionary='').values_list('dictionary', flat=True).distinct())
+    # The dictionary new blobs are built on, even before any blob uses it
+    digests.add(current_dictionary()[0])
+    return digests
+
+
+class Command(BaseCommand):
+    help = "Report how much space deduplicated, compressed code storage saves"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true',
+                            help="Delete blobs no upload refers to any more")
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help="Only prune blobs last stored longer ago than this (default: 24); "
+                                 "a blob is stored just before the upload that refers to it is saved")
+
+    def handle(self, *args, **options):
+        # What the code would take as plain text columns, one copy per upload
+        referenced = 0
+        for field in UploadHistory.CODE_BLOBS:
+            referenced += UploadHistory.objects.aggregate(total=Sum(f'{field}__size'))['total'] or 0
+
+        blobs = CodeBlob.objects.aggregate(
+            count=Count('digest'),
+            size=Sum('size'),
+            stored=Sum('stored_size'),
+            compressed=Count('digest', filter=~Q(codec='raw')),
+        )
+        unique = blobs['size'] or 0
+        stored = blobs['stored'] or 0
+
+        self.stdout.write(f"Uploads:           {UploadHistory.objects.count()}")
+        self.stdout.write(f"Blobs:             {blobs['count']} ({blobs['compressed']} compressed)")
+        self.stdout.write(f"Referenced code:   {referenced} bytes")
+        self.stdout.write(f"Unique code:       {unique} bytes")
+        self.stdout.write(f"Stored:            {stored} bytes")
+        if referenced:
+            saved = referenced - stored
+            self.stdout.write(self.style.SUCCESS(
+                f"Saved {saved} bytes ({100.0 * saved / referenced:.1f}%), "
+                f"{referenced / max(stored, 1):.1f}x smaller"))
+
+        if options['prune']:
+            cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+            orphans = CodeBlob.objects.filter(created_at__lt=cutoff).exclude(digest__in=referenced_digests())
+            deleted, _ = orphans.delete()
+            self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} unreferenced blob(s)"))
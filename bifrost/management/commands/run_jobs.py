@@ -0,0 +1,51 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from bifrost.jobs import JobRunner, requeue_stale_jobs
+from bifrost.metrics import serve_metrics
+from bifrost.runtime import apply_thread_policy
+from bifrost.models import ProcessingJob
+
+
+class Command(BaseCommand):
+    help = "Run a dedicated worker for queued conversion and image upload jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help="Number of jobs processed at the same time")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to wait between polls of an empty queue")
+        parser.add_argument('--kind', action='append', dest='kinds',
+                            choices=[kind for kind, _ in ProcessingJob.KIND_CHOICES],
+                            help="Only run jobs of this kind (repeatable; default: all)")
+        parser.add_argument('--once', action='store_true',
+                            help="Drain the queue and exit instead of polling forever")
+        parser.add_argument('--metrics-port', type=int, default=0,
+                            help="Serve Prometheus metrics for this worker on this port")
+        parser.add_argument('--metrics-address', default='127.0.0.1',
+                            help="Address the metrics server listens on (default: 127.0.0.1; "
+                                 "set BIFROST_METRICS_TOKEN before exposing it)")
+
+    def handle(self, *args, **options):
+        runner = JobRunner(concurrency=options['concurrency'], poll_interval=options['poll_interval'],
+                           kinds=options['kinds'])
+        if options['metrics_port']:
+            serve_metrics(options['metrics_port'], options['metrics_address'])
+        apply_thread_policy()
+
+        if options['once']:
+            requeue_stale_jobs()
+            processed = 0
+            while runner.run_once():
+                processed += 1
+            self.stdout.write(self.style.SUCCESS(f"Processed {processed} job(s)"))
+            return
+
+        signal.signal(signal.SIGTERM, lambda *_: runner.stop())
+        self.stdout.write(f"Processing jobs with {runner.concurrency} worker(s)...")
+        runner.start()
+        try:
+            runner.join()
+        except KeyboardInterrupt:
+            runner.stop()
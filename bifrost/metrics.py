@@ -0,0 +1,273 @@
+import bisect
+import hmac
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.http import HttpResponse
+
+# Seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+WAIT_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 900.0)
+LOAD_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+# Detections per image
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+MEGAPIXEL_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0)
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._lines(key, value) for key, value in items)
+        return '\n'.join(line for line in lines if line)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _lines(self, key, value):
+        return f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}"
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, (None, 0.0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def _lines(self, key, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            labels = format_labels(self.labelnames, key, [('le', format_value(bound))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return '\n'.join(lines)
+
+
+class Registry:
+    """Metrics of this process, rendered in the Prometheus text format
+
+    Each gunicorn worker and each run_jobs process keeps its own registry,
+    so scrape every process (or run jobs in-process) to see everything.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+# Image size and detection counts are histograms rather than labels: as
+# labels they would create a new series for almost every image
+STAGE_SECONDS = REGISTRY.histogram(
+    'bifrost_stage_seconds', "Latency of one pipeline stage", ('stage', 'size'))
+PIPELINE_RUNS = REGISTRY.counter(
+    'bifrost_pipeline_runs_total', "Images run through the pipeline", ('outcome', 'size'))
+IMAGE_MEGAPIXELS = REGISTRY.histogram(
+    'bifrost_image_megapixels', "Size of processed images", buckets=MEGAPIXEL_BUCKETS)
+CONTOURS = REGISTRY.histogram(
+    'bifrost_contours', "Contours examined per component detection pass", buckets=COUNT_BUCKETS)
+COMPONENTS = REGISTRY.histogram(
+    'bifrost_components', "UI components detected per image", ('size',), buckets=COUNT_BUCKETS)
+TEXT_BLOCKS = REGISTRY.histogram(
+    'bifrost_text_blocks', "Text blocks read per image", ('size',), buckets=COUNT_BUCKETS)
+QUEUE_WAIT = REGISTRY.histogram(
+    'bifrost_job_queue_wait_seconds', "Time a job spent queued before a worker claimed it", ('kind',),
+    buckets=WAIT_BUCKETS)
+JOB_SECONDS = REGISTRY.histogram(
+    'bifrost_job_seconds', "Time to run one job attempt", ('kind', 'outcome'))
+MODEL_LOAD_SECONDS = REGISTRY.histogram(
+    'bifrost_model_load_seconds', "Time to load one OCR reader", buckets=LOAD_BUCKETS)
+REQUEST_SECONDS = REGISTRY.histogram(
+    'bifrost_request_seconds', "Time to answer a request", ('view',))
+
+
+def size_class(width, height):
+    """Coarse image size label: small (< 1MP), medium (< 4MP), large (< 16MP) or huge"""
+    pixels = (width or 0) * (height or 0)
+    if pixels < 1_000_000:
+        return 'small'
+    if pixels < 4_000_000:
+        return 'medium'
+    if pixels < 16_000_000:
+        return 'large'
+    return 'huge'
+
+
+@contextmanager
+def timed(stage, size=''):
+    """Observe the duration of a block as ``stage`` in bifrost_stage_seconds"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage, size=size)
+
+
+def record_pipeline(result, timings=None):
+    """Feed one pipeline result (see ImageProcessor.build_result) into the metrics"""
+    layout = result.get('layout') or {}
+    width, height = layout.get('width', 0), layout.get('height', 0)
+    size = size_class(width, height) if width else ''
+    PIPELINE_RUNS.inc(outcome='success' if result.get('success') else 'error', size=size)
+    for stage, ms in (timings if timings is not None else result.get('timings') or {}).items():
+        STAGE_SECONDS.observe(ms / 1000.0, stage=stage, size=size)
+    if result.get('success') and width:
+        IMAGE_MEGAPIXELS.observe(width * height / 1_000_000)
+        COMPONENTS.observe(len(layout.get('components', [])), size=size)
+        TEXT_BLOCKS.observe(len(layout.get('text_blocks', [])), size=size)
+
+
+@contextmanager
+def server_timing(request, name, description=''):
+    """Time a block of a view and report it in the response's Server-Timing header"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        entries = getattr(request, 'server_timings', None)
+        if entries is not None:
+            entries.append((name, (time.perf_counter() - started) * 1000, description))
+
+
+def server_timing_header(entries):
+    parts = []
+    for name, ms, description in entries:
+        part = f"{name};dur={ms:.1f}"
+        if description:
+            part += f';desc="{description}"'
+        parts.append(part)
+    return ', '.join(parts)
+
+
+class ServerTimingMiddleware:
+    """Adds a Server-Timing header (view stages plus total) and request latency metrics"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.server_timings = []
+        started = time.perf_counter()
+        response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match is not None and match.url_name else 'unresolved'
+        REQUEST_SECONDS.observe(elapsed, view=view)
+        if getattr(settings, 'BIFROST_SERVER_TIMING', True):
+            response['Server-Timing'] = server_timing_header(
+                request.server_timings + [('total', elapsed * 1000, '')])
+        return response
+
+
+def metrics_response():
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def metrics_token_matches(authorization):
+    """Whether an Authorization header carries BIFROST_METRICS_TOKEN (never true without a token)"""
+    token = getattr(settings, 'BIFROST_METRICS_TOKEN', '')
+    if not token:
+        return False
+    return hmac.compare_digest((authorization or '').encode('utf-8'), f'Bearer {token}'.encode('utf-8'))
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if getattr(settings, 'BIFROST_METRICS_TOKEN', '') and \
+                not metrics_token_matches(self.headers.get('Authorization')):
+            self.send_error(401)
+            return
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, address='127.0.0.1'):
+    """Serve this process's metrics over HTTP from a daemon thread (for run_jobs)
+
+    Only local scrapers can connect by default; when BIFROST_METRICS_TOKEN
+    is set, requests must also send it as a bearer token.
+    """
+    server = ThreadingHTTPServer((address, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='bifrost-metrics', daemon=True)
+    thread.start()
+    return server
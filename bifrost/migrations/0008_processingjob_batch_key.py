@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bifrost', '0007_processingjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='batch_key',
+            field=models.UUIDField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bifrost', '0008_processingjob_batch_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadhistory',
+            name='layout',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bifrost', '0009_uploadhistory_layout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='image_data',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='processingjob',
+            name='image_path',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+    ]
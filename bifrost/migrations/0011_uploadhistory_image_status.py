@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bifrost', '0010_processingjob_image_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadhistory',
+            name='image_status',
+            field=models.CharField(choices=[('pending', 'Uploading'), ('stored', 'Stored'), ('failed', 'Upload failed')], default='stored', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='uploadhistory',
+            name='cloud_image_url',
+            field=models.URLField(blank=True, default='', max_length=500),
+        ),
+        migrations.AlterField(
+            model_name='processingjob',
+            name='kind',
+            field=models.CharField(choices=[('convert', 'Convert image'), ('store_image', 'Store image')], default='convert', max_length=20),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bifrost', '0011_uploadhistory_image_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadhistory',
+            name='phash',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='uploadhistory',
+            name='phash_0',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='uploadhistory',
+            name='phash_1',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='uploadhistory',
+            name='phash_2',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='uploadhistory',
+            name='phash_3',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations, models
+
+
+def thumbnail_url(url):
+    # Frozen copy of bifrost.storage.thumbnail_url
+    if "/upload/" in url:
+        return url.replace("/upload/", "/upload/w_300,h_200,c_fit/", 1)
+    return url
+
+
+def fill_thumbnail_urls(apps, schema_editor):
+    UploadHistory = apps.get_model('bifrost', 'UploadHistory')
+    rows = UploadHistory.objects.exclude(cloud_image_url='').only('id', 'cloud_image_url')
+    batch = []
+    for upload in rows.iterator(chunk_size=1000):
+        upload.thumbnail_url = thumbnail_url(upload.cloud_image_url)
+        batch.append(upload)
+        if len(batch) >= 1000:
+            UploadHistory.objects.bulk_update(batch, ['thumbnail_url'])
+            batch = []
+    if batch:
+        UploadHistory.objects.bulk_update(batch, ['thumbnail_url'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bifrost', '0012_uploadhistory_phash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadhistory',
+            name='thumbnail_url',
+            field=models.URLField(blank=True, default='', max_length=500),
+        ),
+        migrations.AddIndex(
+            model_name='uploadhistory',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='history_user_created_idx'),
+        ),
+        migrations.RunPython(fill_thumbnail_urls, migrations.RunPython.noop),
+    ]
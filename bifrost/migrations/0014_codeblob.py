@@ -0,0 +1,117 @@
+import hashlib
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def store(CodeBlob, text, pending):
+    # Frozen, dictionary-free variant of bifrost.blobs.store_text
+    data = (text or '').encode('utf-8')
+    digest = hashlib.sha256(data).hexdigest()
+    if digest not in pending:
+        payload = zlib.compress(data, 9)
+        codec = 'zlib'
+        if len(payload) >= len(data):
+            payload, codec = data, 'raw'
+        pending[digest] = CodeBlob(digest=digest, codec=codec, data=payload,
+                                   size=len(data), stored_size=len(payload))
+    return digest
+
+
+def move_code_to_blobs(apps, schema_editor):
+    UploadHistory = apps.get_model('bifrost', 'UploadHistory')
+    CodeBlob = apps.get_model('bifrost', 'CodeBlob')
+
+    rows = UploadHistory.objects.only('id', 'html_code', 'css_code', 'js_code').order_by('id')
+    batch, pending = [], {}
+    for upload in rows.iterator(chunk_size=500):
+        upload.html_blob_id = store(CodeBlob, upload.html_code, pending)
+        upload.css_blob_id = store(CodeBlob, upload.css_code, pending)
+        upload.js_blob_id = store(CodeBlob, upload.js_code, pending)
+        batch.append(upload)
+        if len(batch) >= 500:
+            CodeBlob.objects.bulk_create(pending.values(), ignore_conflicts=True)
+            UploadHistory.objects.bulk_update(batch, ['html_blob', 'css_blob', 'js_blob'])
+            batch, pending = [], {}
+    if batch:
+        CodeBlob.objects.bulk_create(pending.values(), ignore_conflicts=True)
+        UploadHistory.objects.bulk_update(batch, ['html_blob', 'css_blob', 'js_blob'])
+
+
+def restore_code_from_blobs(apps, schema_editor):
+    UploadHistory = apps.get_model('bifrost', 'UploadHistory')
+    CodeBlob = apps.get_model('bifrost', 'CodeBlob')
+
+    cache = {}
+
+    def text(digest):
+        if digest is None:
+            return ''
+        if digest not in cache:
+            blob = CodeBlob.objects.get(digest=digest)
+            data = bytes(blob.data)
+            if blob.codec == 'zlib':
+                data = zlib.decompress(data)
+            elif blob.codec == 'zlib-dict':
+                d = zlib.decompressobj(zdict=text(blob.dictionary).encode('utf-8'))
+                data = d.decompress(data) + d.flush()
+            cache[digest] = data.decode('utf-8')
+        return cache[digest]
+
+    rows = UploadHistory.objects.only('id', 'html_blob', 'css_blob', 'js_blob').order_by('id')
+    for upload in rows.iterator(chunk_size=500):
+        upload.html_code = text(upload.html_blob_id)
+        upload.css_code = text(upload.css_blob_id)
+        upload.js_code = text(upload.js_blob_id)
+        upload.save(update_fields=['html_code', 'css_code', 'js_code'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bifrost', '0013_uploadhistory_thumbnail_url'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeBlob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('codec', models.CharField(max_length=20)),
+                ('dictionary', models.CharField(blank=True, default='', max_length=64)),
+                ('data', models.BinaryField()),
+                ('size', models.PositiveIntegerField()),
+                ('stored_size', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='uploadhistory',
+            name='html_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='bifrost.codeblob'),
+        ),
+        migrations.AddField(
+            model_name='uploadhistory',
+            name='css_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='bifrost.codeblob'),
+        ),
+        migrations.AddField(
+            model_name='uploadhistory',
+            name='js_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='bifrost.codeblob'),
+        ),
+        migrations.RunPython(move_code_to_blobs, restore_code_from_blobs),
+        migrations.RemoveField(
+            model_name='uploadhistory',
+            name='html_code',
+        ),
+        migrations.RemoveField(
+            model_name='uploadhistory',
+            name='css_code',
+        ),
+        migrations.RemoveField(
+            model_name='uploadhistory',
+            name='js_code',
+        ),
+    ]
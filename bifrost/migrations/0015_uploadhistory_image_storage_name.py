@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bifrost', '0014_codeblob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadhistory',
+            name='image_storage_name',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+    ]
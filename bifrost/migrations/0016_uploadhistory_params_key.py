@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bifrost', '0015_uploadhistory_image_storage_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadhistory',
+            name='params_key',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+    ]
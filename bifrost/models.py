@@ -1,6 +1,5 @@
 from django.db import models
 from django.utils import timezone
-from django.conf import settings
 from django.contrib.auth.models import User
 import uuid
 from django.utils.html import format_html
@@ -39,6 +38,43 @@ class LoginSession(models.Model):
     
 
 
+class CodeBlob(models.Model):
+    """Generated code stored once per distinct content, compressed (see bifrost/blobs.py)"""
+    digest = models.CharField(max_length=64, primary_key=True)  # sha256 of the raw text
+    codec = models.CharField(max_length=20)
+    dictionary = models.CharField(max_length=64, blank=True, default='')  # preset dictionary blob
+    data = models.BinaryField()
+    size = models.PositiveIntegerField()  # raw bytes
+    stored_size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)  # refreshed whenever the text is stored again
+
+    @property
+    def text(self):
+        if not hasattr(self, '_text'):
+            from bifrost.blobs import decode
+            self._text = decode(self).decode('utf-8')
+        return self._text
+
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.codec}, {self.size} -> {self.stored_size} bytes)"
+
+
+def code_property(name):
+    """Read/write a code column that lives in a CodeBlob"""
+    def getter(self):
+        pending = self.__dict__.get(f'_pending_{name}')
+        if pending is not None:
+            return pending
+        if getattr(self, f'{name}_blob_id') is None:
+            return ''
+        return getattr(self, f'{name}_blob').text
+
+    def setter(self, value):
+        self.__dict__[f'_pending_{name}'] = value or ''
+
+    return property(getter, setter)
+
+
 class UploadHistory(models.Model):
     FRAMEWORK_CHOICES = [
         ('plain', 'Plain HTML/CSS/JS'),
@@ -52,17 +88,75 @@ class UploadHistory(models.Model):
         ('css_modules', 'CSS Modules'),
     ]
 
+    IMAGE_PENDING = 'pending'
+    IMAGE_STORED = 'stored'
+    IMAGE_FAILED = 'failed'
+
+    IMAGE_STATUS_CHOICES = [
+        (IMAGE_PENDING, 'Uploading'),
+        (IMAGE_STORED, 'Stored'),
+        (IMAGE_FAILED, 'Upload failed'),
+    ]
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    cloud_image_url = models.URLField(max_length=500)
+    cloud_image_url = models.URLField(max_length=500, blank=True, default='')  # set once the image is stored
+    image_status = models.CharField(max_length=20, choices=IMAGE_STATUS_CHOICES, default=IMAGE_STORED)
+    thumbnail_url = models.URLField(max_length=500, blank=True, default='')  # history card image, set with cloud_image_url
+    image_storage_name = models.CharField(max_length=500, blank=True, default='')  # name in the image storage
     framework_type = models.CharField(max_length=50, choices=FRAMEWORK_CHOICES, default='plain')
     css_style = models.CharField(max_length=50, choices=CSS_STYLE_CHOICES, default='external')
     created_at = models.DateTimeField(auto_now_add=True)
-    html_code = models.TextField(default='', blank=True) 
-    css_code = models.TextField(default='', blank=True)  
-    js_code = models.TextField(default='', blank=True)   
+    # Generated code, deduplicated and compressed; read and set through
+    # html_code / css_code / js_code below
+    html_blob = models.ForeignKey(CodeBlob, null=True, blank=True, on_delete=models.PROTECT, related_name='+')
+    css_blob = models.ForeignKey(CodeBlob, null=True, blank=True, on_delete=models.PROTECT, related_name='+')
+    js_blob = models.ForeignKey(CodeBlob, null=True, blank=True, on_delete=models.PROTECT, related_name='+')
     ocr_text = models.TextField(default='', blank=True)  
+    layout = models.JSONField(default=dict, blank=True)  # detected components/text, for previews
+    # Perceptual hash of the image plus its 16-bit chunks, each indexed, for
+    # near-duplicate lookups (see bifrost/phash.py)
+    phash = models.BigIntegerField(null=True, blank=True)
+    phash_0 = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    phash_1 = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    phash_2 = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    phash_3 = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    # Digest of the analysis parameters the layout was made with; only
+    # layouts made with the current ones are reused
+    params_key = models.CharField(max_length=16, blank=True, default='')
+    # sha256 of the uploaded file; only a re-upload of the same bytes reuses
+    # the stored code
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
     
 
+    CODE_BLOBS = ('html_blob', 'css_blob', 'js_blob')
+
+    html_code = code_property('html')
+    css_code = code_property('css')
+    js_code = code_property('js')
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of a user's history, newest first
+            models.Index(fields=['user', '-created_at', '-id'], name='history_user_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        from bifrost.blobs import store_text
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+        for name in ('html', 'css', 'js'):
+            pending = self.__dict__.pop(f'_pending_{name}', None)
+            if pending is not None:
+                setattr(self, f'{name}_blob_id', store_text(pending))
+            # html_code and friends are properties; the column is the blob reference
+            if update_fields is not None and (pending is not None or f'{name}_code' in update_fields):
+                update_fields = (update_fields - {f'{name}_code'}) | {f'{name}_blob'}
+        if update_fields is not None:
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.user.username}'s upload on {self.created_at.strftime('%Y-%m-%d')}"
 
@@ -76,3 +170,53 @@ class UploadHistory(models.Model):
         return format_html('<img src="{}" width="100" style="border:1px solid #ddd; border-radius:6px"/>', thumb_url)
 
     uploaded_image_display.short_description = 'Uploaded Image'
+
+
+class ProcessingJob(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    KIND_CONVERT = 'convert'
+    KIND_STORE_IMAGE = 'store_image'
+
+    KIND_CHOICES = [
+        (KIND_CONVERT, 'Convert image'),
+        (KIND_STORE_IMAGE, 'Store image'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=KIND_CONVERT)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    priority = models.IntegerField(default=0)
+    framework_type = models.CharField(max_length=50, default='vanilla')
+    css_style = models.CharField(max_length=50, default='external')
+    image_name = models.CharField(max_length=255)
+    image_data = models.BinaryField(null=True, blank=True)  # small uploads stay in the row
+    image_path = models.CharField(max_length=500, blank=True, default='')  # large uploads are spooled
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(default='', blank=True)
+    upload = models.ForeignKey(UploadHistory, null=True, blank=True, on_delete=models.SET_NULL)
+    batch_key = models.UUIDField(null=True, blank=True, db_index=True)  # shared by a multi-image upload
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_after'], name='job_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} job {self.id} ({self.status})"
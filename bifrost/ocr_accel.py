@@ -0,0 +1,181 @@
+import hashlib
+import io
+import logging
+import os
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# 'jit': TorchScript trace, frozen and optimised for inference (conv + batch
+# norm folding, oneDNN kernels), cached on disk. 'compile': torch.compile,
+# which keeps its own cache of generated kernels; ignored together with 'jit'.
+TECHNIQUES = ('jit', 'compile')
+
+# (example inputs, differently sized inputs the traced model is checked on)
+# per model; the recognizer reads 64 px high grayscale crops
+EXAMPLE_SHAPES = {
+    'detector': (((1, 3, 256, 256),), ((1, 3, 384, 512),)),
+    'recognizer': (((1, 1, 64, 256), (1, 26)), ((2, 1, 64, 400), (2, 41))),
+}
+
+
+def parse_techniques(value):
+    """'jit,compile' -> ('jit', 'compile'); unknown names raise ValueError"""
+    if isinstance(value, str):
+        value = value.split(',')
+    techniques = tuple(t.strip() for t in value or () if t and t.strip())
+    unknown = set(techniques) - set(TECHNIQUES)
+    if unknown:
+        raise ValueError(f"Unknown OCR acceleration: {', '.join(sorted(unknown))}")
+    return tuple(t for t in TECHNIQUES if t in techniques)
+
+
+def cache_dir():
+    # Not under MEDIA_ROOT: loading a TorchScript artifact runs its code
+    return getattr(settings, 'BIFROST_OCR_MODEL_CACHE', '') or os.path.join(cache_home(), 'ocr-models')
+
+
+def cache_home():
+    return getattr(settings, 'BIFROST_CACHE_HOME', '') or os.path.join(
+        os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'bifrost')
+
+
+def example_inputs(part, shapes):
+    import torch
+
+    if part == 'recognizer':
+        (image, text) = shapes
+        return (torch.rand(*image), torch.zeros(*text, dtype=torch.long))
+    return tuple(torch.rand(*shape) for shape in shapes)
+
+
+def model_fingerprint(model):
+    """Hash of the eager model's weights, so a new model file gets a new artifact"""
+    import torch
+
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return hashlib.blake2b(buffer.getvalue(), digest_size=16).hexdigest()
+
+
+def artifact_path(part, model, techniques):
+    import torch
+
+    try:
+        import easyocr
+        easyocr_version = easyocr.__version__
+    except (ImportError, AttributeError):
+        easyocr_version = 'unknown'
+    key = hashlib.blake2b('|'.join([
+        part, model_fingerprint(model), torch.__version__, easyocr_version, ','.join(techniques),
+    ]).encode('utf-8'), digest_size=16).hexdigest()
+    return os.path.join(cache_dir(), f'{part}-{key}.pt')
+
+
+def outputs(result):
+    return result if isinstance(result, tuple) else (result,)
+
+
+def check_traced(part, eager, traced):
+    """Compare traced and eager outputs on inputs of another size than the trace's"""
+    import torch
+
+    inputs = example_inputs(part, EXAMPLE_SHAPES[part][1])
+    with torch.no_grad():
+        expected, actual = outputs(eager(*inputs)), outputs(traced(*inputs))
+    for a, b in zip(expected, actual):
+        if a.shape != b.shape or not torch.allclose(a, b, atol=1e-3, rtol=1e-3):
+            raise ValueError(f"Traced {part} output differs from the eager model")
+
+
+def trace(part, model):
+    import torch
+
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example_inputs(part, EXAMPLE_SHAPES[part][0]), check_trace=False)
+    check_traced(part, model, traced)
+    return traced
+
+
+def optimize(part, traced):
+    """Freeze and optimise a traced model; the plain trace if that fails"""
+    import torch
+
+    try:
+        optimized = torch.jit.optimize_for_inference(torch.jit.freeze(traced.eval()))
+        with torch.no_grad():
+            optimized(*example_inputs(part, EXAMPLE_SHAPES[part][1]))
+        return optimized
+    except Exception as e:
+        logger.info(f"OCR {part} not frozen ({str(e)}); using the plain trace")
+        return traced
+
+
+def load_or_trace(part, model):
+    """Traced ``model``, from the disk cache when an earlier worker built it"""
+    import torch
+
+    path = artifact_path(part, model, ('jit',))
+    if os.path.exists(path):
+        try:
+            cached = torch.jit.load(path, map_location='cpu')
+            # Held to the same check as a fresh trace
+            check_traced(part, model, cached)
+            return optimize(part, cached)
+        except Exception as e:
+            logger.error(f"Cached OCR {part} at {path} is unusable, rebuilding: {str(e)}")
+
+    started = time.perf_counter()
+    traced = trace(part, model)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Workers may build the same artifact at once; the rename is atomic
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        torch.jit.save(traced, tmp_path)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.error(f"Could not cache OCR {part} at {path}: {str(e)}")
+    logger.info(f"Traced OCR {part} in {time.perf_counter() - started:.2f}s")
+    return optimize(part, traced)
+
+
+def accelerate_reader(reader, techniques):
+    """Swap an EasyOCR reader's detector and recognizer for faster CPU versions
+
+    Each model falls back to the stock one on any failure, so a reader is
+    always usable. EasyOCR already applies dynamic int8 quantization to
+    the recognizer's LSTM and linear layers on CPU (``quantize=True``);
+    tracing keeps it.
+    """
+    if not techniques:
+        return reader
+    if getattr(reader, 'device', 'cpu') != 'cpu':
+        logger.info("OCR acceleration only applies to CPU readers")
+        return reader
+
+    try:
+        import torch
+    except ImportError:
+        logger.error("OCR acceleration needs torch; using the stock models")
+        return reader
+
+    for part in ('detector', 'recognizer'):
+        model = getattr(reader, part, None)
+        if model is None:
+            continue
+        try:
+            model.eval()
+            fast = model
+            if 'jit' in techniques:
+                fast = load_or_trace(part, model)
+            if 'compile' in techniques and fast is model:
+                fast = torch.compile(model, dynamic=True)
+                # Compilation is lazy: fail here, not in the first request
+                with torch.no_grad():
+                    fast(*example_inputs(part, EXAMPLE_SHAPES[part][0]))
+            setattr(reader, part, fast)
+        except Exception as e:
+            logger.error(f"OCR {part} acceleration failed, using the stock model: {str(e)}")
+    return reader
@@ -0,0 +1,235 @@
+import gc
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from bifrost.metrics import MODEL_LOAD_SECONDS
+from bifrost.ocr_accel import accelerate_reader, parse_techniques
+from bifrost.runtime import apply_thread_policy
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+class ReaderPoolTimeout(Exception):
+    """Raised when no OCR reader becomes free within the wait limit"""
+
+
+def current_rss_mb():
+    """Resident memory of the current process in MB"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        if resource is None:
+            return 0.0
+        # Peak RSS (KB on Linux), used when /proc is not available
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class ReaderPool:
+    """Process-wide pool of EasyOCR readers, loaded lazily on first borrow.
+
+    A reader is never shared between threads: each borrower gets its own
+    instance, so at most ``size`` OCR calls run at once in this process.
+    Readers left idle for longer than ``idle_timeout`` seconds are dropped
+    to give their weights back; the next borrow reloads them.
+    """
+
+    def __init__(self, size=1, languages=('en',), gpu=False, wait_timeout=30.0, idle_timeout=None,
+                 quantize=True, acceleration=()):
+        self.size = max(1, int(size))
+        self.languages = list(languages)
+        self.gpu = gpu
+        # EasyOCR's dynamic int8 quantization, and see bifrost/ocr_accel.py
+        self.quantize = quantize
+        self.acceleration = tuple(acceleration)
+        self.wait_timeout = wait_timeout
+        self.idle_timeout = idle_timeout
+        self._idle = []  # (reader, returned_at), most recently returned last
+        self._cond = threading.Condition()
+        self._created = 0
+        self._evicted = 0
+        self._reaper = None
+        self._load_seconds = []
+        self._rss_before_load = None
+
+    def _create_reader(self):
+        """Load one EasyOCR reader and record how long it took"""
+        # Thread limits must be in place before torch is imported
+        apply_thread_policy()
+        # Deferred import: easyocr pulls in torch, which is heavy
+        import easyocr
+
+        rss_before = current_rss_mb()
+        if self._rss_before_load is None:
+            self._rss_before_load = rss_before
+        started = time.perf_counter()
+        reader = easyocr.Reader(self.languages, gpu=self.gpu, quantize=self.quantize)
+        reader = accelerate_reader(reader, self.acceleration)
+        elapsed = time.perf_counter() - started
+        self._load_seconds.append(elapsed)
+        MODEL_LOAD_SECONDS.observe(elapsed)
+
+        logger.info(
+            f"OCR reader loaded in {elapsed:.2f}s "
+            f"(pid={os.getpid()}, rss {rss_before:.0f}MB -> {current_rss_mb():.0f}MB)"
+        )
+        self._start_reaper()
+        return reader
+
+    def _reserve_slot(self):
+        """Claim room for one more reader; caller must hold the condition"""
+        if self._created < self.size:
+            self._created += 1
+            return True
+        return False
+
+    def _release_slot(self):
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    def _acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    reader, _ = self._idle.pop()
+                    return reader
+                if self._reserve_slot():
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ReaderPoolTimeout(f"No OCR reader available after {timeout}s")
+                self._cond.wait(remaining)
+
+        # Load outside the lock so other borrowers can keep returning readers
+        try:
+            return self._create_reader()
+        except Exception:
+            self._release_slot()
+            raise
+
+    def _release(self, reader):
+        with self._cond:
+            self._idle.append((reader, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def borrow(self, timeout=None):
+        """Borrow a reader for the duration of the block"""
+        reader = self._acquire(self.wait_timeout if timeout is None else timeout)
+        try:
+            yield reader
+        finally:
+            self._release(reader)
+
+    def warm_up(self):
+        """Load every reader in the pool up front"""
+        started = time.perf_counter()
+        while True:
+            with self._cond:
+                if not self._reserve_slot():
+                    break
+            try:
+                reader = self._create_reader()
+            except Exception:
+                self._release_slot()
+                raise
+            self._release(reader)
+
+        logger.info(f"OCR pool warm-up finished in {time.perf_counter() - started:.2f}s: {self.report()}")
+
+    def evict_idle(self, now=None):
+        """Drop readers that have been idle longer than idle_timeout"""
+        if not self.idle_timeout:
+            return 0
+        now = time.monotonic() if now is None else now
+        with self._cond:
+            keep = [(r, t) for r, t in self._idle if now - t < self.idle_timeout]
+            evicted = len(self._idle) - len(keep)
+            self._idle = keep
+            self._created -= evicted
+            self._evicted += evicted
+            if evicted:
+                self._cond.notify_all()
+
+        if evicted:
+            gc.collect()
+            logger.info(f"Evicted {evicted} idle OCR reader(s), rss now {current_rss_mb():.0f}MB")
+        return evicted
+
+    def _start_reaper(self):
+        if not self.idle_timeout or self._reaper is not None:
+            return
+        with self._cond:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap_forever, name='ocr-pool-reaper', daemon=True)
+            self._reaper.start()
+
+    def _reap_forever(self):
+        interval = max(1.0, self.idle_timeout / 4)
+        while True:
+            time.sleep(interval)
+            try:
+                self.evict_idle()
+            except Exception as e:
+                logger.error(f"OCR pool eviction failed: {str(e)}")
+
+    def report(self):
+        """Startup cost and memory footprint, for sizing gunicorn workers"""
+        rss = current_rss_mb()
+        with self._cond:
+            loaded, idle, evicted = self._created, len(self._idle), self._evicted
+        return {
+            'pid': os.getpid(),
+            'size': self.size,
+            'loaded': loaded,
+            'idle': idle,
+            'evicted': evicted,
+            'load_seconds_total': round(sum(self._load_seconds), 3),
+            'rss_mb': round(rss, 1),
+            'model_rss_mb': round(rss - self._rss_before_load, 1) if self._rss_before_load is not None else 0.0,
+        }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_reader_pool():
+    """Return the process-wide reader pool, creating it on first call"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ReaderPool(
+                    size=getattr(settings, 'BIFROST_OCR_POOL_SIZE', 1),
+                    wait_timeout=getattr(settings, 'BIFROST_OCR_POOL_TIMEOUT', 30.0),
+                    idle_timeout=getattr(settings, 'BIFROST_OCR_IDLE_TIMEOUT', None),
+                    quantize=getattr(settings, 'BIFROST_OCR_QUANTIZE', True),
+                    acceleration=parse_techniques(getattr(settings, 'BIFROST_OCR_ACCELERATION', '')),
+                )
+    return _pool
+
+
+def warm_up_if_enabled():
+    """Worker start hook: preload OCR readers when BIFROST_OCR_WARMUP is on"""
+    if not getattr(settings, 'BIFROST_OCR_WARMUP', False):
+        return
+    try:
+        get_reader_pool().warm_up()
+    except Exception as e:
+        # A failed warm-up should not stop the worker; readers load on first use
+        logger.error(f"OCR warm-up failed: {str(e)}")
@@ -0,0 +1,111 @@
+import io
+import itertools
+import logging
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# The 64-bit hash is split into CHUNKS chunks of CHUNK_BITS bits, each stored
+# in its own indexed column (multi-index hashing): two hashes within Hamming
+# distance r agree exactly on at least one chunk when r < CHUNKS, and within
+# r // CHUNKS bits on at least one chunk in general
+CHUNKS = 4
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+def phash(gray):
+    """64-bit DCT perceptual hash of a grayscale image"""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    # The DC term only carries overall brightness
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def image_phash(image_bytes):
+    """(hash, (width, height)) of an encoded image, or (None, None) if unreadable
+
+    Only the header is parsed for the size and the pixels are decoded at a
+    reduced scale: the hash looks at a 32x32 thumbnail anyway.
+    """
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            size = img.size
+        flags = cv2.IMREAD_GRAYSCALE
+        for factor, reduced in ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                                (2, cv2.IMREAD_REDUCED_GRAYSCALE_2)):
+            if min(size) / factor >= 64:
+                flags = reduced
+                break
+        gray = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), flags)
+        if gray is None:
+            return None, None
+        return phash(gray), size
+    except Exception as e:
+        logger.error(f"Perceptual hash failed: {str(e)}")
+        return None, None
+
+
+def chunks(value):
+    return [(value >> (CHUNK_BITS * (CHUNKS - 1 - i))) & CHUNK_MASK for i in range(CHUNKS)]
+
+
+def to_signed(value):
+    """Unsigned 64-bit hash as stored in a signed BIGINT column"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def hamming(a, b):
+    return bin(to_unsigned(a) ^ to_unsigned(b)).count('1')
+
+
+def phash_fields(value):
+    """Model field values for a hash (all None when there is no hash)"""
+    if value is None:
+        return {'phash': None, **{f'phash_{i}': None for i in range(CHUNKS)}}
+    return {'phash': to_signed(value), **{f'phash_{i}': c for i, c in enumerate(chunks(value))}}
+
+
+def chunk_neighbours(chunk, radius):
+    """Every chunk value within ``radius`` bits of ``chunk``"""
+    values = [chunk]
+    for r in range(1, radius + 1):
+        for bits in itertools.combinations(range(CHUNK_BITS), r):
+            flipped = chunk
+            for bit in bits:
+                flipped ^= 1 << bit
+            values.append(flipped)
+    return values
+
+
+def near_duplicates(queryset, value, radius=None):
+    """Rows of ``queryset`` whose hash is within ``radius`` bits, closest first
+
+    Returns ``[(distance, pk)]``. Each chunk column is probed with an
+    indexed equality (or small IN) lookup, so the candidate set is about
+    rows / 2**16 per probed value rather than a table scan.
+    """
+    if radius is None:
+        radius = getattr(settings, 'BIFROST_PHASH_RADIUS', 0)
+    sub_radius = radius // CHUNKS
+    condition = Q()
+    for i, chunk in enumerate(chunks(value)):
+        condition |= Q(**{f'phash_{i}__in': chunk_neighbours(chunk, sub_radius)})
+
+    matches = []
+    for pk, stored in queryset.filter(condition).values_list('pk', 'phash')[:1000]:
+        distance = hamming(stored, value)
+        if distance <= radius:
+            matches.append((distance, pk))
+    matches.sort()
+    return matches
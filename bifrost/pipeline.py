@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def stage_timer(timings, name):
+    """Record the wall-clock time of a block in ``timings[name]`` (ms)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = round((time.perf_counter() - started) * 1000, 2)
+
+
+class StageExecutor:
+    """Runs independent pipeline stages in parallel on a bounded thread pool.
+
+    OpenCV and torch release the GIL for most of their work, so stages that
+    only read the same image overlap well. Keep ``max_threads`` small: torch
+    already uses several intra-op threads per inference.
+    """
+
+    def __init__(self, max_threads=2):
+        self.max_threads = max(1, int(max_threads))
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_threads,
+                                                    thread_name_prefix='bifrost-stage')
+        return self._pool
+
+    def _run_timed(self, name, func, timings):
+        with stage_timer(timings, name):
+            return func()
+
+    def run(self, stages, timings=None):
+        """Run ``{name: callable}`` stages, join them and return ``{name: result}``"""
+        if self.max_threads == 1 or len(stages) == 1:
+            return {name: self._run_timed(name, func, timings) for name, func in stages.items()}
+
+        # The calling thread runs the first stage itself so a single join
+        # needs only len(stages) - 1 pool threads
+        names = list(stages)
+        futures = {name: self.pool.submit(self._run_timed, name, stages[name], timings)
+                   for name in names[1:]}
+        results = {names[0]: self._run_timed(names[0], stages[names[0]], timings)}
+        for name, future in futures.items():
+            results[name] = future.result()
+        return results
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_stage_executor():
+    """Return the process-wide stage executor"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = StageExecutor(getattr(settings, 'BIFROST_PIPELINE_THREADS', 2))
+    return _executor
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def params_key(params):
+    """Short digest of processor parameters"""
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def analysis_key(image_bytes, params):
+    """Cache key for an image's analysis: content hash + processor parameters"""
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    return f"bifrost:analysis:{digest}:{params_key(params)}"
+
+
+class BaseResultCache:
+    """Byte-size bounded cache of pickled pipeline results"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, key):
+        payload = self._get(key)
+        with self._stats_lock:
+            if payload is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if payload is None:
+            return None
+        try:
+            # Unpickling hands every caller its own copy to mutate
+            return pickle.loads(payload)
+        except Exception as e:
+            logger.error(f"Discarding unreadable cache entry {key}: {str(e)}")
+            return None
+
+    def set(self, key, value):
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.max_bytes and len(payload) > self.max_bytes:
+            return
+        self._set(key, payload)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'backend': type(self).__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'bytes': self.current_bytes(),
+                'max_bytes': self.max_bytes,
+            }
+
+    def current_bytes(self):
+        return None
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, payload):
+        raise NotImplementedError
+
+
+class MemoryResultCache(BaseResultCache):
+    """Per-process LRU cache"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        super().__init__(max_bytes)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+            return payload
+
+    def _set(self, key, payload):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = payload
+            self._bytes += len(payload)
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def current_bytes(self):
+        return self._bytes
+
+
+class FileSystemResultCache(BaseResultCache):
+    """Cache shared by all workers on a host, one file per entry"""
+
+    def __init__(self, location, max_bytes=512 * 1024 * 1024):
+        super().__init__(max_bytes)
+        self.location = location
+        os.makedirs(location, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.location, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.pkl')
+
+    def _get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                payload = f.read()
+            os.utime(path)  # mtime doubles as last-use time for eviction
+            return payload
+        except OSError:
+            return None
+
+    def _set(self, key, payload):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.location):
+            if entry.name.endswith('.pkl'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    self.evictions += 1
+                except OSError:
+                    pass
+
+    def current_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+
+class DjangoResultCache(BaseResultCache):
+    """Delegates storage and eviction to a configured Django cache alias"""
+
+    def __init__(self, alias='default', max_bytes=8 * 1024 * 1024, timeout=None):
+        super().__init__(max_bytes)  # max_bytes caps a single entry here
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def _get(self, key):
+        return self.cache.get(key)
+
+    def _set(self, key, payload):
+        self.cache.set(key, payload, self.timeout)
+
+
+RESULT_CACHE_BACKENDS = {
+    'memory': MemoryResultCache,
+    'filesystem': FileSystemResultCache,
+    'django': DjangoResultCache,
+}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def build_result_cache(config):
+    """Instantiate a backend from a BIFROST_RESULT_CACHE style dict"""
+    options = dict(config or {})
+    backend = options.pop('BACKEND', 'memory')
+    if not backend:
+        return None
+    kwargs = {k.lower(): v for k, v in options.items()}
+    return RESULT_CACHE_BACKENDS[backend](**kwargs)
+
+
+def get_result_cache():
+    """Return the configured process-wide result cache, or None if disabled"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = build_result_cache(getattr(settings, 'BIFROST_RESULT_CACHE', {'BACKEND': 'memory'}))
+    return _cache
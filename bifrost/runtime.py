@@ -0,0 +1,148 @@
+import logging
+import os
+import tempfile
+import threading
+
+import cv2
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_applied = None  # (pid, policy)
+_slot = None  # (pid, slot, open lock file)
+_lock = threading.Lock()
+
+
+class ThreadPolicy:
+    """Threads torch and OpenCV may use in one worker process, and its CPUs
+
+    ``cpus`` is None to leave the scheduler's affinity alone.
+    """
+
+    def __init__(self, torch_threads, interop_threads, opencv_threads, cpus=None, slot=None):
+        self.torch_threads = torch_threads
+        self.interop_threads = interop_threads
+        self.opencv_threads = opencv_threads
+        self.cpus = cpus
+        self.slot = slot
+
+    def as_dict(self):
+        return {
+            'torch_threads': self.torch_threads,
+            'interop_threads': self.interop_threads,
+            'opencv_threads': self.opencv_threads,
+            'cpus': sorted(self.cpus) if self.cpus is not None else None,
+            'slot': self.slot,
+        }
+
+    def __repr__(self):
+        return f"ThreadPolicy({self.as_dict()})"
+
+
+def available_cpus():
+    """CPUs this process may run on (respects cgroup/taskset restrictions)"""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def worker_count():
+    """Processes sharing the machine: BIFROST_WORKERS, else gunicorn's WEB_CONCURRENCY"""
+    workers = getattr(settings, 'BIFROST_WORKERS', 0) or int(os.environ.get('WEB_CONCURRENCY', 1) or 1)
+    return max(1, int(workers))
+
+
+def claim_worker_slot(workers):
+    """Index in [0, workers) no other live process holds, or None
+
+    Slots are advisory locks on files in the temp directory; the lock dies
+    with the process, so a respawned worker takes over the slot it frees.
+    """
+    global _slot
+    if fcntl is None:
+        return None
+    if _slot is not None and _slot[0] == os.getpid():
+        return _slot[1]
+    for slot in range(workers):
+        path = os.path.join(tempfile.gettempdir(), f'bifrost-cpu-slot-{slot}.lock')
+        f = open(path, 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            continue
+        _slot = (os.getpid(), slot, f)
+        return slot
+    return None
+
+
+def plan_thread_policy(cpus=None, workers=None, ocr_concurrency=None, affinity=None, slot=None):
+    """Split the CPUs between workers, and each worker's share between its OCR calls
+
+    Explicit BIFROST_TORCH_THREADS / BIFROST_OPENCV_THREADS win over the
+    computed split.
+    """
+    cpus = available_cpus() if cpus is None else list(cpus)
+    workers = worker_count() if workers is None else max(1, workers)
+    if ocr_concurrency is None:
+        ocr_concurrency = getattr(settings, 'BIFROST_OCR_POOL_SIZE', 1)
+    if affinity is None:
+        affinity = getattr(settings, 'BIFROST_CPU_AFFINITY', False)
+
+    share = max(1, len(cpus) // workers)
+    torch_threads = getattr(settings, 'BIFROST_TORCH_THREADS', 0) or max(1, share // max(1, ocr_concurrency))
+    opencv_threads = getattr(settings, 'BIFROST_OPENCV_THREADS', 0) or share
+
+    pinned = None
+    if affinity and workers > 1:
+        if slot is None:
+            slot = claim_worker_slot(workers)
+        if slot is not None:
+            # Contiguous blocks keep a worker's threads on neighbouring cores
+            pinned = set(cpus[(slot * share) % len(cpus):][:share]) or None
+    return ThreadPolicy(torch_threads, getattr(settings, 'BIFROST_TORCH_INTEROP_THREADS', 1),
+                        opencv_threads, pinned, slot)
+
+
+def apply_thread_policy(policy=None):
+    """Apply a thread policy to this process, once per process
+
+    Call it before torch is first imported: the OpenMP pool reads
+    OMP_NUM_THREADS at import. Returns the policy in effect.
+    """
+    global _applied
+    with _lock:
+        if policy is None and _applied is not None and _applied[0] == os.getpid():
+            return _applied[1]
+        policy = policy or plan_thread_policy()
+
+        if policy.cpus is not None and hasattr(os, 'sched_setaffinity'):
+            try:
+                os.sched_setaffinity(0, policy.cpus)
+            except OSError as e:
+                logger.error(f"Could not set CPU affinity: {str(e)}")
+
+        os.environ['OMP_NUM_THREADS'] = str(policy.torch_threads)
+        os.environ['MKL_NUM_THREADS'] = str(policy.torch_threads)
+        cv2.setNumThreads(policy.opencv_threads)
+        try:
+            import torch
+        except ImportError:
+            torch = None
+        if torch is not None:
+            torch.set_num_threads(policy.torch_threads)
+            try:
+                torch.set_num_interop_threads(policy.interop_threads)
+            except RuntimeError:
+                # Only allowed before torch first runs parallel work
+                pass
+
+        _applied = (os.getpid(), policy)
+        logger.info(f"Thread policy for pid {os.getpid()}: {policy.as_dict()}")
+        return policy
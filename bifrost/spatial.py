@@ -0,0 +1,128 @@
+import numpy as np
+
+
+class BoxIndex:
+    """Static uniform-grid index over axis-aligned boxes, built with NumPy.
+
+    Boxes are bucketed into square grid cells (CSR layout: cell -> box ids).
+    Queries take whole arrays of points or boxes and return matching
+    ``(query_index, box_index)`` pairs, so callers never loop in Python.
+    Box edges are inclusive, i.e. a box covers ``x <= px <= x + w``.
+    """
+
+    def __init__(self, x, y, w, h, cell_size=None):
+        self.x0 = np.asarray(x, dtype=np.float64)
+        self.y0 = np.asarray(y, dtype=np.float64)
+        self.x1 = self.x0 + np.asarray(w, dtype=np.float64)
+        self.y1 = self.y0 + np.asarray(h, dtype=np.float64)
+        self.area = (self.x1 - self.x0) * (self.y1 - self.y0)
+        self.size = len(self.x0)
+
+        if cell_size is None:
+            # About one average box per cell keeps both candidate lists and
+            # the number of cells a box is copied into small
+            mean_side = np.sqrt(self.area.mean()) if self.size else 1.0
+            cell_size = max(16.0, float(mean_side))
+        self.cell_size = cell_size
+
+        if self.size == 0:
+            self.grid_w = self.grid_h = 1
+            self.origin_x = self.origin_y = 0.0
+            self._offsets = np.zeros(2, dtype=np.intp)
+            self._boxes = np.zeros(0, dtype=np.intp)
+            return
+
+        self.origin_x = float(self.x0.min())
+        self.origin_y = float(self.y0.min())
+        cx0, cy0 = self._cells(self.x0, self.y0)
+        cx1, cy1 = self._cells(self.x1, self.y1)
+        self.grid_w = int(cx1.max()) + 1
+        self.grid_h = int(cy1.max()) + 1
+
+        box_ids, cells = self._expand(cx0, cy0, cx1, cy1)
+        order = np.argsort(cells, kind='stable')
+        self._boxes = box_ids[order]
+        counts = np.bincount(cells, minlength=self.grid_w * self.grid_h)
+        self._offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    def _cells(self, x, y):
+        cx = np.floor((x - self.origin_x) / self.cell_size).astype(np.intp)
+        cy = np.floor((y - self.origin_y) / self.cell_size).astype(np.intp)
+        return cx, cy
+
+    def _expand(self, cx0, cy0, cx1, cy1):
+        """Every (item, cell) pair for items spanning [cx0..cx1] x [cy0..cy1]"""
+        nx = cx1 - cx0 + 1
+        ny = cy1 - cy0 + 1
+        counts = nx * ny
+        item_ids = np.repeat(np.arange(len(cx0)), counts)
+        offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cell_x = cx0[item_ids] + offset % nx[item_ids]
+        cell_y = cy0[item_ids] + offset // nx[item_ids]
+        return item_ids, cell_y * self.grid_w + cell_x
+
+    def _candidates(self, query_ids, cells):
+        """Join (query, cell) pairs with the boxes stored in each cell"""
+        starts = self._offsets[cells]
+        counts = self._offsets[cells + 1] - starts
+        q = np.repeat(query_ids, counts)
+        offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        b = self._boxes[np.repeat(starts, counts) + offset]
+        return q, b
+
+    def _clip(self, cx, cy):
+        """Mask of cells inside the grid (queries may fall outside it)"""
+        return (cx >= 0) & (cy >= 0) & (cx < self.grid_w) & (cy < self.grid_h)
+
+    def containing_points(self, px, py):
+        """Pairs (point_index, box_index) where the box contains the point"""
+        px = np.asarray(px, dtype=np.float64)
+        py = np.asarray(py, dtype=np.float64)
+        empty = (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp))
+        if self.size == 0 or len(px) == 0:
+            return empty
+
+        cx, cy = self._cells(px, py)
+        inside = np.flatnonzero(self._clip(cx, cy))
+        q, b = self._candidates(inside, cy[inside] * self.grid_w + cx[inside])
+        hit = ((self.x0[b] <= px[q]) & (px[q] <= self.x1[b]) &
+               (self.y0[b] <= py[q]) & (py[q] <= self.y1[b]))
+        return q[hit], b[hit]
+
+    def intersecting_boxes(self, x, y, w, h):
+        """Pairs (query_index, box_index) for query boxes that overlap a box"""
+        qx0 = np.asarray(x, dtype=np.float64)
+        qy0 = np.asarray(y, dtype=np.float64)
+        qx1 = qx0 + np.asarray(w, dtype=np.float64)
+        qy1 = qy0 + np.asarray(h, dtype=np.float64)
+        empty = (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp))
+        if self.size == 0 or len(qx0) == 0:
+            return empty
+
+        # Clamp query extents to the grid so huge queries stay cheap
+        cx0, cy0 = self._cells(qx0, qy0)
+        cx1, cy1 = self._cells(qx1, qy1)
+        cx0, cy0 = np.maximum(cx0, 0), np.maximum(cy0, 0)
+        cx1, cy1 = np.minimum(cx1, self.grid_w - 1), np.minimum(cy1, self.grid_h - 1)
+        valid = np.flatnonzero((cx0 <= cx1) & (cy0 <= cy1))
+        if len(valid) == 0:
+            return empty
+
+        query_ids, cells = self._expand(cx0[valid], cy0[valid], cx1[valid], cy1[valid])
+        q, b = self._candidates(valid[query_ids], cells)
+
+        # A pair spanning several shared cells shows up once per cell
+        if len(q):
+            pair = np.unique(q.astype(np.int64) * self.size + b)
+            q, b = (pair // self.size).astype(np.intp), (pair % self.size).astype(np.intp)
+
+        hit = ((self.x0[b] <= qx1[q]) & (qx0[q] <= self.x1[b]) &
+               (self.y0[b] <= qy1[q]) & (qy0[q] <= self.y1[b]))
+        return q[hit], b[hit]
+
+    def covered_points(self, px, py):
+        """Boolean mask: does any box contain each point"""
+        mask = np.zeros(len(px), dtype=bool)
+        q, _ = self.containing_points(px, py)
+        mask[q] = True
+        return mask
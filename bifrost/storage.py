@@ -0,0 +1,42 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def build_image_storage(config):
+    """Instantiate a storage backend from a BIFROST_IMAGE_STORAGE style dict
+
+    Any Django storage class works, e.g. FileSystemStorage as a local
+    stand-in for Cloudinary in development and tests.
+    """
+    config = dict(config or {})
+    backend = config.get('BACKEND', 'cloudinary_storage.storage.MediaCloudinaryStorage')
+    return import_string(backend)(**config.get('OPTIONS', {}))
+
+
+def get_image_storage():
+    """Return the process-wide storage client used for uploaded images
+
+    Built once and reused, so its HTTP connection pool outlives single uploads.
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = build_image_storage(getattr(settings, 'BIFROST_IMAGE_STORAGE', {}))
+                logger.info(f"Image storage: {type(_storage).__name__}")
+    return _storage
+
+
+def thumbnail_url(url, transformation='w_300,h_200,c_fit'):
+    """History thumbnail for a stored image (Cloudinary resizes on the fly)"""
+    if "/upload/" in url:
+        return url.replace("/upload/", f"/upload/{transformation}/", 1)
+    return url  # other backends serve the original
@@ -1,3 +1,428 @@
-from django.test import TestCase
+import urllib.error
+import urllib.request
+import uuid
+import zlib
+from contextlib import contextmanager
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from bifrost import blobs, image_processor
+from bifrost.bench import compare_reports
+from bifrost.jobs import (claim_batch_siblings, claim_next_job, content_digest, execute_batch,
+                          execute_job, previous_layout, retry_jobs, reuse_conversion)
+from bifrost.metrics import serve_metrics
+from bifrost.models import CodeBlob, ProcessingJob, UploadHistory
+from bifrost.ocr_pool import ReaderPoolTimeout
+from bifrost.phash import hamming, image_phash, near_duplicates, phash_fields
+
+
+def screenshot_bytes(width=320, height=240, label='Sign in'):
+    """PNG of a small synthetic screen: a card with a button"""
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    cv2.rectangle(image, (20, 20), (width - 20, height - 20), (60, 60, 60), 2)
+    cv2.rectangle(image, (40, 40), (160, 90), (200, 120, 40), -1)
+    cv2.putText(image, label, (50, 72), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+    ok, buffer = cv2.imencode('.png', image)
+    return buffer.tobytes()
+
+
+@override_settings(BIFROST_JOB_RUN_IN_PROCESS=False)
+class JobRetryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'secret')
+
+    def run_job(self, image_bytes):
+        ProcessingJob.objects.create(user=self.user, image_name='screen.png', image_data=image_bytes)
+        job = execute_job(claim_next_job([ProcessingJob.KIND_CONVERT]))
+        job.refresh_from_db()
+        return job
+
+    def test_busy_reader_pool_is_retried_later(self):
+        timeout = ReaderPoolTimeout("No OCR reader became free within 30s")
+        with mock.patch.object(image_processor.processor, 'cached_analysis', side_effect=timeout):
+            job = self.run_job(screenshot_bytes())
+
+        self.assertEqual(job.status, ProcessingJob.STATUS_QUEUED)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIn('No OCR reader', job.error)
+        # The upload is kept for the next attempt
+        self.assertIsNotNone(job.image_data)
+
+    def test_invalid_image_fails_for_good(self):
+        job = self.run_job(b'not an image')
+
+        self.assertEqual(job.status, ProcessingJob.STATUS_FAILED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failed_batch_call_requeues_every_job(self):
+        batch_key = uuid.uuid4()
+        for name in ('a.png', 'b.png'):
+            ProcessingJob.objects.create(user=self.user, image_name=name, image_data=screenshot_bytes(),
+                                         batch_key=batch_key)
+        job = claim_next_job([ProcessingJob.KIND_CONVERT])
+        with mock.patch('bifrost.image_processor.process_batch', side_effect=RuntimeError("pipeline crashed")):
+            execute_batch([job] + claim_batch_siblings(job))
+
+        jobs = ProcessingJob.objects.filter(batch_key=batch_key)
+        self.assertEqual({job.status for job in jobs}, {ProcessingJob.STATUS_QUEUED})
+        self.assertTrue(all('pipeline crashed' in job.error for job in jobs))
+
+
+@override_settings(BIFROST_JOB_RUN_IN_PROCESS=False)
+class ImageStorageTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'secret')
+        self.upload = UploadHistory.objects.create(
+            user=self.user, image_status=UploadHistory.IMAGE_PENDING,
+            layout={'width': 320, 'height': 240, 'components': [], 'text_blocks': []})
+        self.image = screenshot_bytes()
+        ProcessingJob.objects.create(user=self.user, kind=ProcessingJob.KIND_STORE_IMAGE, image_name='screen.png',
+                                     image_data=self.image, upload=self.upload, max_attempts=1)
+
+    def run_store_job(self):
+        job = execute_job(claim_next_job([ProcessingJob.KIND_STORE_IMAGE]))
+        job.refresh_from_db()
+        self.upload.refresh_from_db()
+        return job
+
+    def test_failed_upload_keeps_the_image_for_a_retry(self):
+        with mock.patch('bifrost.jobs.get_image_storage', side_effect=OSError("storage unreachable")):
+            job = self.run_store_job()
+        self.assertEqual(job.status, ProcessingJob.STATUS_FAILED)
+        self.assertEqual(bytes(job.image_data), self.image)
+        self.assertEqual(self.upload.image_status, UploadHistory.IMAGE_FAILED)
+
+        self.assertEqual(retry_jobs(ProcessingJob.objects.filter(pk=job.pk)), 1)
+        job = self.run_store_job()
+        self.assertEqual(job.status, ProcessingJob.STATUS_DONE)
+        self.assertIsNone(job.image_data)
+        self.assertEqual(self.upload.image_status, UploadHistory.IMAGE_STORED)
+        self.assertTrue(self.upload.image_storage_name)
+
+    def test_preview_reads_the_stored_image(self):
+        self.run_store_job()
+        self.client.force_login(self.user)
+        with mock.patch('bifrost.views.render_preview', return_value=(b'preview', 'image/jpeg')) as render:
+            response = self.client.get(reverse('result_preview', args=[self.upload.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(bytes(render.call_args[0][0]), self.image)
+
+
+class StubReaderPool:
+    """Reader pool whose reader reports each dark run of rows as one line of text"""
+    size = 1
+
+    def __init__(self):
+        self.reads = []
+
+    @contextmanager
+    def borrow(self, timeout=None):
+        yield self
+
+    def readtext(self, image, **kwargs):
+        self.reads.append(image.shape[0])
+        return [([[20, y0], [200, y0], [200, y1], [20, y1]], 'Welcome back', 0.9)
+                for y0, y1 in self.lines(image)]
+
+    def detect(self, image, **kwargs):
+        return [[[20, 200, y0, y1] for y0, y1 in self.lines(image)]], [[]]
+
+    def recognize(self, gray, horizontal_list, free_list, **kwargs):
+        # Like EasyOCR: boxes clipped to the image, results top to bottom
+        height, width = gray.shape
+        results = []
+        for x0, x1, y0, y1 in horizontal_list:
+            x0, x1, y0, y1 = max(0, x0), min(x1, width), max(0, y0), min(y1, height)
+            results.append(([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], f'line at {y0}', 0.9))
+        return sorted(results, key=lambda item: item[0][0][1])
+
+    def lines(self, image):
+        rows = np.flatnonzero(image.min(axis=(1, 2)) < 128)
+        return [(int(rows[0]), int(rows[-1]) + 1)] if len(rows) else []
+
+
+class TextBandTests(TestCase):
+    def setUp(self):
+        self.processor = image_processor.ImageProcessor(reader_pool=StubReaderPool())
+        self.processor.ocr_mode = 'full'
+        self.processor.ocr_max_side = 0
+        self.processor.ocr_tile_height, self.processor.ocr_tile_overlap = 200, 20
+
+    def page(self, top, bottom):
+        image = np.full((400, 240, 3), 255, dtype=np.uint8)
+        image[top:bottom, 20:200] = 0
+        return image
+
+    def test_text_taller_than_the_overlap_is_read_once(self):
+        # Bands are rows 0-200 and 180-380; the text crosses both edges of the overlap
+        blocks = self.processor.extract_text_regions(self.page(150, 260))
+
+        self.assertEqual(blocks.texts, ['Welcome back'])
+        self.assertEqual((int(blocks.boxes['y'][0]), int(blocks.boxes['height'][0])), (150, 110))
+
+    def test_detector_rereads_text_taller_than_the_overlap(self):
+        candidates = self.processor.detect_text_candidates(self.page(150, 260))
+
+        boxes = [(int(entry['blocks'].boxes['y'][i]), int(entry['blocks'].boxes['height'][i]))
+                 for entry in candidates for i in range(len(entry['boxes']))]
+        self.assertEqual(boxes, [(150, 110)])
+
+    def test_recognized_boxes_map_back_to_their_input_box(self):
+        working = np.full((100, 200, 3), 255, dtype=np.uint8)
+        # Out of reading order, and the second spills over the image edges
+        boxes = np.array([[10, 60, 120, 80], [150, -4, 230, 30], [10, 10, 90, 30]])
+
+        results = self.processor.recognize_boxes(working, boxes)
+
+        self.assertEqual([text for _, text, _ in results], ['line at 60', 'line at 0', 'line at 10'])
+
+    def test_incremental_two_phase_filters_on_the_merged_components(self):
+        self.processor.ocr_mode = 'two_phase'
+        self.processor.incremental_block, self.processor.incremental_max_changed = 64, 1.0
+        page = cv2.imdecode(np.frombuffer(screenshot_bytes(640, 480), dtype=np.uint8), cv2.IMREAD_COLOR)
+        previous = self.processor.analyze_image(page).to_dict()
+        edited = page.copy()
+        cv2.rectangle(edited, (300, 300), (420, 340), (30, 30, 30), -1)
+
+        with mock.patch.object(self.processor, 'recognize_text_candidates',
+                               wraps=self.processor.recognize_text_candidates) as recognize:
+            layout = self.processor.incremental_analysis(edited, previous)
+
+        self.assertTrue(recognize.called)
+        for call in recognize.call_args_list:
+            self.assertEqual(len(call.args[2]), len(layout.components))
+
+    def test_text_inside_one_band_needs_no_reread(self):
+        blocks = self.processor.extract_text_regions(self.page(40, 80))
+
+        self.assertEqual(blocks.texts, ['Welcome back'])
+        self.assertEqual(len(self.processor.reader_pool.reads), len(self.processor.text_bands(400)))
+
+
+class PhashTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'secret')
+        self.image = screenshot_bytes()
+        self.value, self.size = image_phash(self.image)
+
+    def upload(self, value, **fields):
+        fields.setdefault('layout', {'width': 320, 'height': 240, 'components': [], 'text_blocks': []})
+        return UploadHistory.objects.create(user=self.user, framework_type='vanilla', css_style='external',
+                                            html_code='<main></main>', css_code='', js_code='',
+                                            **phash_fields(value), **fields)
+
+    def test_recompressed_screenshot_hashes_close(self):
+        image = cv2.imdecode(np.frombuffer(screenshot_bytes(), dtype=np.uint8), cv2.IMREAD_COLOR)
+        ok, jpeg = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 70])
+        value, size = image_phash(jpeg.tobytes())
+
+        self.assertEqual(size, (320, 240))
+        self.assertLessEqual(hamming(value, self.value), 3)
+        self.assertEqual(image_phash(b'not an image'), (None, None))
+
+    def test_near_duplicates_are_found_closest_first(self):
+        exact = self.upload(self.value)
+        near = self.upload(self.value ^ 0b101)
+        self.upload(self.value ^ 0xFFFF)
+
+        queryset = UploadHistory.objects.all()
+        self.assertEqual(near_duplicates(queryset, self.value, radius=3), [(0, exact.pk), (2, near.pk)])
+        self.assertEqual(near_duplicates(queryset, self.value, radius=0), [(0, exact.pk)])
+
+    def test_same_file_reuses_the_result(self):
+        self.upload(self.value, params_key=image_processor.analysis_params_key(),
+                    content_hash=content_digest(self.image))
+        job = ProcessingJob(user=self.user, framework_type='vanilla', css_style='external')
+
+        result, previous = reuse_conversion(job, self.image, self.value, self.size)
+        self.assertEqual(result['html_code'], '<main></main>')
+        self.assertIsNone(previous)
+
+    def test_same_hash_with_other_text_only_seeds_the_incremental_analysis(self):
+        # A relabelled button: the perceptual hash stays the same
+        match = self.upload(self.value, params_key=image_processor.analysis_params_key(),
+                            content_hash=content_digest(screenshot_bytes(label='Delete')))
+        job = ProcessingJob(user=self.user, framework_type='vanilla', css_style='external')
+
+        result, previous = reuse_conversion(job, self.image, self.value, self.size)
+        self.assertIsNone(result)
+        self.assertEqual(previous, match.layout)
+
+    @override_settings(BIFROST_PHASH_RADIUS=3)
+    def test_near_hash_only_seeds_the_incremental_analysis(self):
+        match = self.upload(self.value ^ 0b11, params_key=image_processor.analysis_params_key())
+        job = ProcessingJob(user=self.user, framework_type='vanilla', css_style='external')
+
+        result, previous = reuse_conversion(job, self.image, self.value, self.size)
+        self.assertIsNone(result)
+        self.assertEqual(previous, match.layout)
+
+    def test_incremental_seed_needs_the_current_analysis_parameters(self):
+        current = self.upload(self.value, params_key=image_processor.analysis_params_key())
+        self.upload(self.value, params_key='0123456789abcdef', layout={'width': 1, 'height': 1})
+
+        self.assertEqual(previous_layout(self.user), current.layout)
+
+    def test_other_analysis_parameters_are_not_reused(self):
+        self.upload(self.value, params_key='0123456789abcdef', content_hash=content_digest(self.image))
+        job = ProcessingJob(user=self.user, framework_type='vanilla', css_style='external')
+
+        self.assertEqual(reuse_conversion(job, self.image, self.value, self.size), (None, None))
+
+
+class CodeBlobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'secret')
+        # The preset dictionary row lives in the test database
+        patcher = mock.patch.object(blobs, '_dictionary', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_every_codec_round_trips(self):
+        page = '<!DOCTYPE html>\n<html lang="en">\n<head><meta charset="UTF-8"></head>\n<body></body>\n</html>\n'
+        dict_digest, dict_data = blobs.current_dictionary()
+        compressor = zlib.compressobj(9, zdict=dict_data)
+        for data, codec, payload, dictionary in (
+                (b'x', blobs.CODEC_RAW, b'x', ''),
+                (page.encode() * 20, blobs.CODEC_ZLIB, zlib.compress(page.encode() * 20, 9), ''),
+                (page.encode(), blobs.CODEC_ZLIB_DICT, compressor.compress(page.encode()) + compressor.flush(),
+                 dict_digest)):
+            digest = blobs._save(data, codec, payload, dictionary)
+            blob = CodeBlob.objects.get(digest=digest)
+            self.assertEqual(blob.codec, codec)
+            self.assertEqual(blobs.decode(blob), data)
+
+        # store_text picks the codec itself
+        self.assertEqual(CodeBlob.objects.get(digest=blobs.store_text(page)).text, page)
+
+    def test_code_properties_save_with_update_fields(self):
+        upload = UploadHistory.objects.create(user=self.user, html_code='<p>old</p>', css_code='p {}')
+        upload.html_code = '<p>new</p>'
+        upload.save(update_fields=['html_code'])
+
+        upload = UploadHistory.objects.get(pk=upload.pk)
+        self.assertEqual(upload.html_code, '<p>new</p>')
+        self.assertEqual(upload.css_code, 'p {}')
+
+    def test_prune_keeps_the_dictionary_and_recent_blobs(self):
+        upload = UploadHistory.objects.create(user=self.user, html_code='<p>kept</p>')
+        dict_digest = blobs.current_dictionary()[0]
+        recent = blobs.store_text('<p>being saved</p>')
+        old = blobs.store_text('<p>orphan</p>')
+        CodeBlob.objects.filter(digest__in=[dict_digest, old]).update(
+            created_at=timezone.now() - timedelta(days=2))
+
+        call_command('code_storage_report', '--prune', stdout=StringIO())
+
+        remaining = set(CodeBlob.objects.values_list('digest', flat=True))
+        self.assertIn(upload.html_blob_id, remaining)
+        self.assertIn(dict_digest, remaining)
+        self.assertIn(recent, remaining)
+        self.assertNotIn(old, remaining)
+
+    def test_blob_inserts_are_supported_on_mysql(self):
+        from django.db.backends.mysql.features import DatabaseFeatures
+
+        with mock.patch.object(CodeBlob.objects, 'bulk_create') as bulk_create:
+            blobs.store_text('<p>stored</p>')
+        options = {'ignore_conflicts': False, 'update_conflicts': False, 'update_fields': None,
+                   'unique_fields': None}
+        options.update(bulk_create.call_args.kwargs)
+        queryset = CodeBlob.objects.all()
+        if options['update_fields']:
+            options['update_fields'] = [CodeBlob._meta.get_field(name) for name in options['update_fields']]
+        if options['unique_fields']:
+            options['unique_fields'] = [CodeBlob._meta.get_field(name) for name in options['unique_fields']]
+        # The production database is MySQL; the tests run on SQLite
+        with mock.patch.object(connection, 'features', DatabaseFeatures(connection)):
+            queryset._check_bulk_create_options(**options)
+
+    def test_storing_a_blob_again_refreshes_it(self):
+        digest = blobs.store_text('<p>orphan</p>')
+        CodeBlob.objects.filter(digest=digest).update(created_at=timezone.now() - timedelta(days=2))
+
+        blobs.store_text('<p>orphan</p>')
+        self.assertGreater(CodeBlob.objects.get(digest=digest).created_at, timezone.now() - timedelta(hours=1))
+
+
+class CodeBlobMigrationTests(TransactionTestCase):
+    before = [('bifrost', '0013_uploadhistory_thumbnail_url')]
+    after = [('bifrost', '0014_codeblob')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_code_moves_to_blobs_and_back(self):
+        apps = self.migrate(self.before)
+        user = apps.get_model('auth', 'User').objects.create(username='alice')
+        Upload = apps.get_model('bifrost', 'UploadHistory')
+        first = Upload.objects.create(user=user, html_code='<main>same</main>', css_code='main {}', js_code='')
+        second = Upload.objects.create(user=user, html_code='<main>same</main>', css_code='', js_code='x();')
+
+        apps = self.migrate(self.after)
+        Upload = apps.get_model('bifrost', 'UploadHistory')
+        rows = {row.pk: row for row in Upload.objects.all()}
+        self.assertEqual(rows[first.pk].html_blob_id, rows[second.pk].html_blob_id)
+        self.assertEqual(apps.get_model('bifrost', 'CodeBlob').objects.count(), 4)
+
+        apps = self.migrate(self.before)
+        Upload = apps.get_model('bifrost', 'UploadHistory')
+        self.assertEqual(
+            sorted(Upload.objects.values_list('html_code', 'css_code', 'js_code')),
+            [('<main>same</main>', '', 'x();'), ('<main>same</main>', 'main {}', '')])
+
+
+@override_settings(BIFROST_METRICS_TOKEN='s3cret')
+class MetricsAccessTests(TestCase):
+    def test_view_needs_the_token(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer guess').status_code, 404)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_worker_server_is_local_and_needs_the_token(self):
+        server = serve_metrics(0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        address, port = server.server_address
+        self.assertEqual(address, '127.0.0.1')
+
+        url = f'http://127.0.0.1:{port}/'
+        with self.assertRaises(urllib.error.HTTPError) as denied:
+            urllib.request.urlopen(url, timeout=5)
+        self.assertEqual(denied.exception.code, 401)
+        request = urllib.request.Request(url, headers={'Authorization': 'Bearer s3cret'})
+        with urllib.request.urlopen(request, timeout=5) as response:
+            self.assertEqual(response.status, 200)
+
+
+class BenchCompareTests(TestCase):
+    baseline = {'configs': {'default': {'decode': {'p50_ms': 10.0}, 'extract_text': {'p50_ms': 200.0}}}}
+
+    def test_slower_stage_regresses(self):
+        current = {'configs': {'default': {'decode': {'p50_ms': 13.0}, 'extract_text': {'p50_ms': 190.0}}}}
+        self.assertEqual(compare_reports(self.baseline, current, 0.15), [('default', 'decode', 10.0, 13.0)])
+
+    def test_failed_or_missing_stage_regresses(self):
+        current = {'configs': {'default': {'decode': {'error': 'RuntimeError: boom'}}}}
+        self.assertEqual(compare_reports(self.baseline, current, 0.15),
+                         [('default', 'decode', 10.0, None), ('default', 'extract_text', 200.0, None)])
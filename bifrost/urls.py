@@ -10,10 +10,19 @@ urlpatterns = [
     path('profile/', views.profile, name='profile'),
     path('help/', views.help, name='help'),
     path('result/<int:upload_id>/', views.result_page, name='result_page'),
+    path('result/<int:upload_id>/preview/', views.result_preview, name='result_preview'),
+    path('result/<int:upload_id>/image/', views.upload_image, name='upload_image'),
     path('templates/', views.templates, name='templates'),
     path('history/', views.history, name='history'),
+    path('history/page/', views.history_page_json, name='history_page'),
     path('upload/', views.handle_upload, name='handle_upload'),
+    path('upload/batch/', views.handle_batch_upload, name='handle_batch_upload'),
+    path('jobs/<uuid:job_id>/', views.job_page, name='job_page'),
+    path('jobs/<uuid:job_id>/status/', views.job_status, name='job_status'),
+    path('jobs/batch/<uuid:batch_key>/', views.batch_page, name='batch_page'),
+    path('jobs/batch/<uuid:batch_key>/status/', views.batch_status, name='batch_status'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('metrics/', views.metrics, name='metrics'),
     #path('generate/', views.generate_code, name='generate_code'),
     path('logout/', views.user_logout, name='logout'),
 ]+ static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -1,26 +1,26 @@
-import easyocr
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, HttpResponse, JsonResponse
+from django.core.cache import cache
+from django.urls import reverse
+from django.template.defaultfilters import date as date_filter
 from django.contrib.auth.models import User
 from django.contrib.auth import logout, authenticate, login as auth_login
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.cache import never_cache
-from bifrost.models import ConversionRequest
-from cloudinary_storage.storage import MediaCloudinaryStorage
+from bifrost.models import ConversionRequest, ProcessingJob
+from bifrost.history import history_page
+from bifrost.jobs import enqueue_batch, enqueue_conversion, pending_image_bytes, stored_image_bytes
+from bifrost.metrics import metrics_response, metrics_token_matches, server_timing
+from bifrost.ocr_pool import ReaderPoolTimeout
 from .models import UploadHistory
-import uuid
-from django.core.files.storage import default_storage
-import os
-import tempfile
-import cv2
-import numpy as np
+import mimetypes
 from bifrost.image_processor import (
-    process_uploaded_image
+    read_text,
+    render_preview
 )
 import traceback
 from django.conf import settings
-import tempfile
-import requests
 
 # Home page
 def index(request):
@@ -109,9 +109,13 @@ def dashboard(request):
             css_type=css_type
         )
 
-        reader = easyocr.Reader(['en'])
-        result = reader.readtext(entry.image.path)
-        text_output = "\n".join([r[1] for r in result])
+        # Shared, pooled OCR engine: no model reload per request
+        try:
+            text_output = read_text(entry.image.path)
+        except ReaderPoolTimeout:
+            entry.delete()
+            messages.error(request, "The text reader is busy right now, please try again in a moment.")
+            return redirect('dashboard')
 
         entry.extracted_code = text_output
         entry.save()
@@ -125,24 +129,43 @@ def templates(request):
     return render(request, 'frontend/templates.html')
 
 def history(request):
-    uploads = UploadHistory.objects.filter(user=request.user).order_by('-created_at')
-
+    page_size = getattr(settings, 'BIFROST_HISTORY_PAGE_SIZE', 24)
+    uploads, next_cursor = history_page(request.user, limit=page_size)
     for upload in uploads:
-        # Inject a new field 'thumbnail_url' using Cloudinary transformations
-        original_url = upload.cloud_image_url
-        if "/upload/" in original_url:
-            # 300x200, auto crop/fit
-            thumbnail_url = original_url.replace("/upload/", "/upload/w_300,h_200,c_fit/")
-        else:
-            thumbnail_url = original_url  # fallback in case Cloudinary format changes
-        upload.thumbnail_url = thumbnail_url  # dynamically attach
+        # Images still uploading are served by the app until storage has them
+        upload.thumbnail_url = upload.thumbnail_url or reverse('upload_image', args=[upload.id])
 
+    total = len(uploads) if next_cursor is None else UploadHistory.objects.filter(user=request.user).count()
     context = {
         'uploads': uploads,
-        'has_uploads': uploads.exists()
+        'has_uploads': bool(uploads),
+        'total': total,
+        'next_page_url': f"{reverse('history_page')}?cursor={next_cursor}" if next_cursor else '',
     }
     return render(request, 'frontend/history.html', context)
 
+@login_required
+def history_page_json(request):
+    """Further history cards for infinite scrolling, one keyset page at a time"""
+    page_size = getattr(settings, 'BIFROST_HISTORY_PAGE_SIZE', 24)
+    try:
+        uploads, next_cursor = history_page(request.user, request.GET.get('cursor'), limit=page_size)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    items = [{
+        'id': upload.id,
+        'result_url': reverse('result_page', args=[upload.id]),
+        'thumbnail_url': upload.thumbnail_url or reverse('upload_image', args=[upload.id]),
+        'framework': upload.get_framework_type_display(),
+        'css_style': upload.get_css_style_display(),
+        'created_at': date_filter(upload.created_at, "M d, Y"),
+    } for upload in uploads]
+    return JsonResponse({
+        'items': items,
+        'next_page_url': f"{reverse('history_page')}?cursor={next_cursor}" if next_cursor else None,
+    })
+
 def help(request):
     return render(request, 'frontend/help.html')
 
@@ -173,81 +196,201 @@ def handle_upload(request):
             if css_type not in ['external', 'inline']:
                 css_type = 'external'
             
-            # Create temp directory if not exists
-            temp_dir = os.path.join(settings.MEDIA_ROOT, 'temp')
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            # Save to temp file
-            temp_path = None
-            with tempfile.NamedTemporaryFile(
-                delete=False, 
-                dir=temp_dir, 
-                suffix=os.path.splitext(uploaded_file.name)[1]
-            ) as temp_file:
-                for chunk in uploaded_file.chunks():
-                    temp_file.write(chunk)
-                temp_path = temp_file.name
-            
-            # Process image
-            result = process_uploaded_image(temp_path, framework, css_type)
-            if not result.get('success'):
-                raise Exception(result.get('error', 'Image processing failed'))
-            
-            # Upload to cloud storage
-            cloud_storage = MediaCloudinaryStorage()
-            cloud_filename = f"user_uploads/{request.user.username}_{uploaded_file.name}"
-            
-            with open(temp_path, 'rb') as f:
-                cloudinary_file = cloud_storage.save(cloud_filename, f)
-                cloud_url = cloud_storage.url(cloudinary_file)
-            
-            # Save to database
-            upload = UploadHistory.objects.create(
-                user=request.user,
-                cloud_image_url=cloud_url,
-                html_code=result['html_code'],
-                css_code=result['css_code'],
-                js_code=result['js_code'],
-                framework_type=framework,
-                css_style=css_type,
-                ocr_text="\n".join([t['text'] for t in result.get('text_blocks', [])])
-            )
-            
-            return redirect('result_page', upload_id=upload.id)
+            # Hand the pipeline to a background worker and return immediately
+            with server_timing(request, 'enqueue', 'Stage upload and queue job'):
+                job = enqueue_conversion(request.user, uploaded_file, framework, css_type)
+            return redirect('job_page', job_id=job.id)
             
         except Exception as e:
             traceback.print_exc()
             messages.error(request, f"Processing error: {str(e)}")
             return redirect('dashboard')
-            
-        finally:
-            # Clean up temp file
-            if temp_path and os.path.exists(temp_path):
-                try:
-                    os.remove(temp_path)
-                except:
-                    pass
 
     messages.error(request, "No image uploaded")
     return redirect('dashboard')
 
+@login_required
+def handle_batch_upload(request):
+    uploaded_files = request.FILES.getlist('images')
+    if request.method == 'POST' and uploaded_files:
+        try:
+            framework = request.POST.get('framework', 'vanilla')
+            css_type = request.POST.get('css_type', 'external')
+            if framework not in ['vanilla', 'react']:
+                framework = 'vanilla'
+            if css_type not in ['external', 'inline']:
+                css_type = 'external'
+
+            max_files = getattr(settings, 'BIFROST_BATCH_MAX_FILES', 20)
+            if len(uploaded_files) > max_files:
+                messages.error(request, f"Upload at most {max_files} images at a time")
+                return redirect('dashboard')
+
+            with server_timing(request, 'enqueue', 'Stage uploads and queue jobs'):
+                batch_key = enqueue_batch(request.user, uploaded_files, framework, css_type)
+            return redirect('batch_page', batch_key=batch_key)
+
+        except Exception as e:
+            traceback.print_exc()
+            messages.error(request, f"Processing error: {str(e)}")
+            return redirect('dashboard')
+
+    messages.error(request, "No images uploaded")
+    return redirect('dashboard')
+
+@login_required
+def batch_page(request, batch_key):
+    jobs = ProcessingJob.objects.filter(batch_key=batch_key, user=request.user)
+    if not jobs.exists():
+        messages.error(request, "Batch not found")
+        return redirect('dashboard')
+    context = {
+        'job': jobs.first(),
+        'image_name': f"{jobs.count()} screenshots",
+        'status_url': reverse('batch_status', args=[batch_key]),
+    }
+    return render(request, 'frontend/processing.html', context)
+
+@login_required
+def batch_status(request, batch_key):
+    jobs = list(ProcessingJob.objects.filter(batch_key=batch_key, user=request.user)
+                .values('status', 'error', 'upload_id'))
+    if not jobs:
+        return JsonResponse({'error': 'Batch not found'}, status=404)
+
+    statuses = {job['status'] for job in jobs}
+    finished = statuses <= {ProcessingJob.STATUS_DONE, ProcessingJob.STATUS_FAILED}
+    if not finished:
+        status = ProcessingJob.STATUS_RUNNING if ProcessingJob.STATUS_RUNNING in statuses else ProcessingJob.STATUS_QUEUED
+    elif ProcessingJob.STATUS_DONE in statuses:
+        status = ProcessingJob.STATUS_DONE
+    else:
+        status = ProcessingJob.STATUS_FAILED
+
+    return JsonResponse({
+        'status': status,
+        'done': sum(job['status'] == ProcessingJob.STATUS_DONE for job in jobs),
+        'failed': sum(job['status'] == ProcessingJob.STATUS_FAILED for job in jobs),
+        'total': len(jobs),
+        'error': next((job['error'] for job in jobs if job['error']), ''),
+        'result_url': reverse('history') if status == ProcessingJob.STATUS_DONE else None,
+    })
+
+@login_required
+def job_page(request, job_id):
+    job = get_object_or_404(ProcessingJob, id=job_id, user=request.user)
+    if job.status == ProcessingJob.STATUS_DONE and job.upload_id:
+        return redirect('result_page', upload_id=job.upload_id)
+    context = {
+        'job': job,
+        'image_name': job.image_name,
+        'status_url': reverse('job_status', args=[job.id]),
+    }
+    return render(request, 'frontend/processing.html', context)
+
+@login_required
+def job_status(request, job_id):
+    job = get_object_or_404(ProcessingJob, id=job_id, user=request.user)
+    data = {
+        'id': str(job.id),
+        'status': job.status,
+        'attempts': job.attempts,
+        'error': job.error,
+        'result_url': None,
+    }
+    if job.status == ProcessingJob.STATUS_DONE and job.upload_id:
+        data['result_url'] = reverse('result_page', args=[job.upload_id])
+    return JsonResponse(data)
+
 @login_required
 def result_page(request, upload_id):
     try:
-        upload = UploadHistory.objects.get(id=upload_id, user=request.user)
+        with server_timing(request, 'db'):
+            upload = (UploadHistory.objects
+                      .select_related(*UploadHistory.CODE_BLOBS)
+                      .get(id=upload_id, user=request.user))
         
+        with server_timing(request, 'decompress', 'Generated code'):
+            code = (upload.html_code, upload.css_code, upload.js_code)
+
         # Prepare context with proper code formatting
         context = {
-            'html_code': upload.html_code,
-            'css_code': upload.css_code,
-            'js_code': upload.js_code,
-            'image_url': upload.cloud_image_url,
+            'html_code': code[0],
+            'css_code': code[1],
+            'js_code': code[2],
+            'image_url': upload.cloud_image_url or reverse('upload_image', args=[upload.id]),
             'framework': upload.framework_type,
-            'css_type': upload.css_style
+            'css_type': upload.css_style,
+            'preview_url': reverse('result_preview', args=[upload.id]) if upload.layout else ''
         }
         
-        return render(request, 'frontend/result.html', context)
+        with server_timing(request, 'render'):
+            return render(request, 'frontend/result.html', context)
         
     except UploadHistory.DoesNotExist:
         messages.error(request, "Result not found")
         return redirect('dashboard')
+
+@login_required
+def result_preview(request, upload_id):
+    """Annotated detection preview, rendered on first request and then cached"""
+    upload = get_object_or_404(UploadHistory.objects.only('id', 'user', 'image_storage_name', 'layout'),
+                               id=upload_id, user=request.user)
+    if not upload.layout:
+        raise Http404("No layout stored for this upload")
+
+    fmt = 'webp' if 'image/webp' in request.META.get('HTTP_ACCEPT', '') else 'jpeg'
+    cache_key = f"bifrost:preview:{upload.id}:{fmt}"
+    cached = cache.get(cache_key)
+    if cached is None:
+        try:
+            with server_timing(request, 'fetch', 'Original image'):
+                # Read from storage directly, never over HTTP from this site
+                image_bytes = stored_image_bytes(upload)
+                if image_bytes is None:
+                    image_bytes = pending_image_bytes(upload)
+                if image_bytes is None:
+                    raise ValueError("Image is not stored")
+            with server_timing(request, 'preview', 'Annotate and encode'):
+                cached = render_preview(image_bytes, upload.layout, fmt)
+        except Exception as e:
+            traceback.print_exc()
+            raise Http404(f"Preview unavailable: {str(e)}")
+        cache.set(cache_key, cached, getattr(settings, 'BIFROST_PREVIEW_CACHE_SECONDS', 86400))
+
+    data, content_type = cached
+    preview = HttpResponse(data, content_type=content_type)
+    preview['Cache-Control'] = 'private, max-age=86400'
+    preview['Vary'] = 'Accept'
+    return preview
+
+@login_required
+def upload_image(request, upload_id):
+    """Original image: the stored copy, or the local one while it uploads"""
+    upload = get_object_or_404(UploadHistory.objects.only('id', 'user', 'cloud_image_url'),
+                               id=upload_id, user=request.user)
+    if upload.cloud_image_url:
+        return redirect(upload.cloud_image_url)
+
+    image_bytes = pending_image_bytes(upload)
+    if image_bytes is None:
+        raise Http404("Image unavailable")
+    job = ProcessingJob.objects.filter(upload=upload).only('image_name').first()
+    content_type = mimetypes.guess_type(job.image_name)[0] if job else None
+    response = HttpResponse(bytes(image_bytes), content_type=content_type or 'application/octet-stream')
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+@never_cache
+def metrics(request):
+    """Prometheus text metrics for this process
+
+    Open to staff users, or to scrapers sending
+    ``Authorization: Bearer <BIFROST_METRICS_TOKEN>``.
+    """
+    authorized = request.user.is_authenticated and request.user.is_staff
+    if metrics_token_matches(request.META.get('HTTP_AUTHORIZATION')):
+        authorized = True
+    if not authorized:
+        raise Http404()
+    return metrics_response()
@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bifrost_core.settings')
 
 application = get_asgi_application()
+
+# Preload OCR readers in this worker when BIFROST_OCR_WARMUP is enabled
+from bifrost.ocr_pool import warm_up_if_enabled  # noqa: E402
+warm_up_if_enabled()
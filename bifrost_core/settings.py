@@ -59,6 +59,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'bifrost.metrics.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -154,6 +155,11 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Local caches holding files that get loaded as code (traced models, pickled
+# analyses) live here, never under MEDIA_ROOT
+BIFROST_CACHE_HOME = config('BIFROST_CACHE_HOME', default=os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'bifrost'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -166,4 +172,133 @@ SESSION_SAVE_EVERY_REQUEST = True  # optional: reset session timer on every requ
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-LOGIN_URL = '/login/'
\ No newline at end of file
+LOGIN_URL = '/login/'
+
+# OCR model pool (see bifrost/ocr_pool.py); the pool size is also the
+# maximum number of concurrent OCR calls per process
+BIFROST_OCR_POOL_SIZE = config('BIFROST_OCR_POOL_SIZE', default=1, cast=int)
+BIFROST_OCR_POOL_TIMEOUT = config('BIFROST_OCR_POOL_TIMEOUT', default=30.0, cast=float)
+BIFROST_OCR_WARMUP = config('BIFROST_OCR_WARMUP', default=False, cast=bool)
+# Seconds a reader may sit unused before its weights are released (0 disables)
+BIFROST_OCR_IDLE_TIMEOUT = config('BIFROST_OCR_IDLE_TIMEOUT', default=900, cast=int)
+# CPU inference speed-ups (see bifrost/ocr_accel.py): 'jit' and/or 'compile',
+# comma separated. Traced models are cached in MODEL_CACHE so that later
+# workers skip tracing (under BIFROST_CACHE_HOME by default). QUANTIZE is
+# EasyOCR's own dynamic int8 quantization.
+BIFROST_OCR_ACCELERATION = config('BIFROST_OCR_ACCELERATION', default='')
+BIFROST_OCR_QUANTIZE = config('BIFROST_OCR_QUANTIZE', default=True, cast=bool)
+BIFROST_OCR_MODEL_CACHE = config('BIFROST_OCR_MODEL_CACHE', default=os.path.join(BIFROST_CACHE_HOME, 'ocr-models'))
+
+# Thread budget per process (see bifrost/runtime.py), applied when the first
+# OCR model loads. The machine's CPUs are split between WORKERS processes
+# (default: gunicorn's WEB_CONCURRENCY), and each share between the process's
+# concurrent OCR calls; 0 for TORCH/OPENCV threads means that computed split.
+# CPU_AFFINITY pins each worker to its own block of cores.
+BIFROST_WORKERS = config('BIFROST_WORKERS', default=0, cast=int)
+BIFROST_TORCH_THREADS = config('BIFROST_TORCH_THREADS', default=0, cast=int)
+BIFROST_TORCH_INTEROP_THREADS = config('BIFROST_TORCH_INTEROP_THREADS', default=1, cast=int)
+BIFROST_OPENCV_THREADS = config('BIFROST_OPENCV_THREADS', default=0, cast=int)
+BIFROST_CPU_AFFINITY = config('BIFROST_CPU_AFFINITY', default=False, cast=bool)
+
+# Conversion job queue (see bifrost/jobs.py). Jobs live in the database, so no
+# external broker is needed. With BIFROST_JOB_RUN_IN_PROCESS the web process
+# runs them on background threads; otherwise use `manage.py run_jobs`.
+BIFROST_JOB_RUN_IN_PROCESS = config('BIFROST_JOB_RUN_IN_PROCESS', default=True, cast=bool)
+BIFROST_JOB_CONCURRENCY = config('BIFROST_JOB_CONCURRENCY', default=1, cast=int)
+BIFROST_JOB_MAX_ATTEMPTS = config('BIFROST_JOB_MAX_ATTEMPTS', default=3, cast=int)
+BIFROST_JOB_RETRY_BACKOFF = config('BIFROST_JOB_RETRY_BACKOFF', default=5, cast=int)
+BIFROST_JOB_POLL_INTERVAL = config('BIFROST_JOB_POLL_INTERVAL', default=2.0, cast=float)
+BIFROST_JOB_STALE_SECONDS = config('BIFROST_JOB_STALE_SECONDS', default=900, cast=int)
+BIFROST_BATCH_MAX_FILES = config('BIFROST_BATCH_MAX_FILES', default=20, cast=int)
+
+# Uploads up to this size are kept in memory end to end (decode, queue row and
+# cloud upload); larger ones are streamed to a temporary file and spooled
+BIFROST_UPLOAD_SPILL_BYTES = config('BIFROST_UPLOAD_SPILL_BYTES', default=4 * 1024 * 1024, cast=int)
+FILE_UPLOAD_MAX_MEMORY_SIZE = BIFROST_UPLOAD_SPILL_BYTES
+
+# Where uploaded images are pushed, in the background, after conversion (see
+# bifrost/storage.py). Any Django storage class works; set the backend to
+# django.core.files.storage.FileSystemStorage to keep images under MEDIA_ROOT.
+BIFROST_IMAGE_STORAGE = {
+    'BACKEND': config('BIFROST_IMAGE_STORAGE_BACKEND', default='cloudinary_storage.storage.MediaCloudinaryStorage'),
+    'OPTIONS': {},
+}
+if BIFROST_IMAGE_STORAGE['BACKEND'] == 'django.core.files.storage.FileSystemStorage':
+    BIFROST_IMAGE_STORAGE['OPTIONS'] = {
+        'location': os.path.join(MEDIA_ROOT, 'images'),
+        'base_url': MEDIA_URL + 'images/',
+    }
+BIFROST_STORAGE_CONCURRENCY = config('BIFROST_STORAGE_CONCURRENCY', default=2, cast=int)
+BIFROST_STORAGE_MAX_ATTEMPTS = config('BIFROST_STORAGE_MAX_ATTEMPTS', default=6, cast=int)
+
+# Cache of OCR/component analysis keyed on image bytes + processor parameters
+# (see bifrost/result_cache.py). BACKEND: 'memory', 'filesystem' (entries are
+# pickles, kept under BIFROST_CACHE_HOME) or 'django'; set it to None to
+# disable caching.
+BIFROST_RESULT_CACHE = {
+    'BACKEND': config('BIFROST_RESULT_CACHE_BACKEND', default='memory'),
+    'MAX_BYTES': config('BIFROST_RESULT_CACHE_MAX_BYTES', default=64 * 1024 * 1024, cast=int),
+}
+if BIFROST_RESULT_CACHE['BACKEND'] == 'filesystem':
+    BIFROST_RESULT_CACHE['LOCATION'] = os.path.join(BIFROST_CACHE_HOME, 'analysis')
+
+# Threads used to run independent pipeline stages (OCR, contour detection)
+# side by side; keep it low, torch adds its own intra-op threads on top
+BIFROST_PIPELINE_THREADS = config('BIFROST_PIPELINE_THREADS', default=2, cast=int)
+
+# Preprocessing before contour detection: 'off', 'fast' (median + bilateral)
+# or 'full' (CLAHE + NL-means + adaptive threshold); SCALE < 1 runs it on a
+# downscaled copy
+BIFROST_PREPROCESS_MODE = config('BIFROST_PREPROCESS_MODE', default='off')
+BIFROST_PREPROCESS_SCALE = config('BIFROST_PREPROCESS_SCALE', default=1.0, cast=float)
+
+# Working resolution for contour detection (width, px) and OCR (longest side,
+# px). Boxes are mapped back to original coordinates; 0 disables downscaling.
+# Both are off by default: check component recall with
+# `manage.py bench --config full --config w1600:detect_max_width=1600` before
+# enabling detection downscaling, and small text loses recognition accuracy
+# when shrunk.
+BIFROST_DETECT_MAX_WIDTH = config('BIFROST_DETECT_MAX_WIDTH', default=0, cast=int)
+BIFROST_OCR_MAX_SIDE = config('BIFROST_OCR_MAX_SIDE', default=0, cast=int)
+
+# Tall pages (full-page captures) are OCR'd in horizontal bands of this many
+# pixels, overlapping so that text cut at one band edge is whole in the next;
+# 0 reads every page in one pass
+BIFROST_OCR_TILE_HEIGHT = config('BIFROST_OCR_TILE_HEIGHT', default=2048, cast=int)
+BIFROST_OCR_TILE_OVERLAP = config('BIFROST_OCR_TILE_OVERLAP', default=160, cast=int)
+
+# OCR mode: 'full' reads whole pages in one detect + recognise pass; 'two_phase'
+# runs the text detector first and only recognises boxes big enough to hold
+# more than one character whose text the generated code can use (text inside
+# containers but outside buttons/inputs is skipped, so it is also missing
+# from the stored OCR text)
+BIFROST_OCR_MODE = config('BIFROST_OCR_MODE', default='full')
+
+# Incremental re-conversion: pages are hashed in blocks of this many pixels and
+# compared with the user's previous upload of the same size; only changed
+# regions are re-analysed. 0 disables it, as does a changed fraction above MAX
+BIFROST_INCREMENTAL_BLOCK = config('BIFROST_INCREMENTAL_BLOCK', default=64, cast=int)
+BIFROST_INCREMENTAL_MAX_CHANGED = config('BIFROST_INCREMENTAL_MAX_CHANGED', default=0.4, cast=float)
+
+# Re-uploads of the same file reuse the stored result of the earlier upload.
+# An upload within RADIUS bits of perceptual hash (the same screenshot
+# re-saved or recompressed, or an edited screen: the hash ignores fine text)
+# only seeds the incremental re-conversion. SCOPE: 'user' (own history) or
+# 'all'; -1 turns reuse off
+BIFROST_PHASH_RADIUS = config('BIFROST_PHASH_RADIUS', default=0, cast=int)
+BIFROST_PHASH_SCOPE = config('BIFROST_PHASH_SCOPE', default='user')
+
+# Annotated detection previews are rendered on demand at this size and cached
+BIFROST_PREVIEW_MAX_SIDE = config('BIFROST_PREVIEW_MAX_SIDE', default=1280, cast=int)
+BIFROST_PREVIEW_CACHE_SECONDS = config('BIFROST_PREVIEW_CACHE_SECONDS', default=86400, cast=int)
+
+# History cards per page; further pages load as the user scrolls
+BIFROST_HISTORY_PAGE_SIZE = config('BIFROST_HISTORY_PAGE_SIZE', default=24, cast=int)
+
+# Pipeline metrics are served in the Prometheus text format at /metrics/ to
+# staff users, or to scrapers sending "Authorization: Bearer <TOKEN>". The
+# run_jobs --metrics-port server listens on localhost and, when TOKEN is set,
+# requires it too.
+# SERVER_TIMING adds per-stage Server-Timing headers to responses.
+BIFROST_METRICS_TOKEN = config('BIFROST_METRICS_TOKEN', default='')
+BIFROST_SERVER_TIMING = config('BIFROST_SERVER_TIMING', default=True, cast=bool)
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bifrost_core.settings')
 
 application = get_wsgi_application()
+
+# Preload OCR readers in this worker when BIFROST_OCR_WARMUP is enabled
+from bifrost.ocr_pool import warm_up_if_enabled  # noqa: E402
+warm_up_if_enabled()
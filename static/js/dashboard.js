@@ -8,6 +8,8 @@ document.addEventListener('DOMContentLoaded', function() {
     const fileSize = document.getElementById('fileSize');
     const removeFile = document.getElementById('removeFile');
     const generateBtn = document.getElementById('generateBtn');
+    const uploadForm = document.getElementById('uploadForm');
+    const singleAction = uploadForm.getAttribute('action');
     
     // Click on dropzone to trigger file input
     dropzone.addEventListener('click', function() {
@@ -17,7 +19,7 @@ document.addEventListener('DOMContentLoaded', function() {
     // Handle file selection
     fileInput.addEventListener('change', function(e) {
         if (e.target.files.length) {
-            handleFile(e.target.files[0]);
+            handleFiles(e.target.files);
         }
     });
     
@@ -49,11 +51,25 @@ document.addEventListener('DOMContentLoaded', function() {
     
     dropzone.addEventListener('drop', function(e) {
         const dt = e.dataTransfer;
-        const file = dt.files[0];
-        handleFile(file);
+        if (!dt.files.length) return;
+        // Dropped files are submitted with the form like selected ones
+        fileInput.files = dt.files;
+        handleFiles(dt.files);
     });
     
-    function handleFile(file) {
+    function handleFiles(files) {
+        if (Array.from(files).some(f => !f.type.match('image.*'))) {
+            alert('Please upload image files only');
+            return;
+        }
+        // Several screenshots go to the batch endpoint and are converted together
+        const batch = files.length > 1;
+        uploadForm.setAttribute('action', batch ? uploadForm.dataset.batchAction : singleAction);
+        fileInput.name = batch ? 'images' : 'image';
+        handleFile(files[0], files);
+    }
+    
+    function handleFile(file, files) {
         // Check if file is an image
         if (!file.type.match('image.*')) {
             alert('Please upload an image file');
@@ -64,8 +80,14 @@ document.addEventListener('DOMContentLoaded', function() {
         const reader = new FileReader();
         reader.onload = function(e) {
             filePreview.src = e.target.result;
-            fileName.textContent = file.name;
-            fileSize.textContent = formatFileSize(file.size);
+            if (files && files.length > 1) {
+                const total = Array.from(files).reduce((sum, f) => sum + f.size, 0);
+                fileName.textContent = `${files.length} screenshots`;
+                fileSize.textContent = formatFileSize(total);
+            } else {
+                fileName.textContent = file.name;
+                fileSize.textContent = formatFileSize(file.size);
+            }
             
             dropzone.style.display = 'none';
             fileInfo.style.display = 'flex';
@@ -86,6 +108,8 @@ document.addEventListener('DOMContentLoaded', function() {
     removeFile.addEventListener('click', function(e) {
         e.stopPropagation();
         fileInput.value = '';
+        fileInput.name = 'image';
+        uploadForm.setAttribute('action', singleAction);
         dropzone.style.display = 'block';
         fileInfo.style.display = 'none';
         generateBtn.disabled = true;
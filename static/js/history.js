@@ -1,28 +1,113 @@
 document.addEventListener('DOMContentLoaded', function() {
-    // Add click event listeners to all history cards
-    const cards = document.querySelectorAll('.history-card');
-    
-    cards.forEach(card => {
-        card.addEventListener('click', function() {
-            const uploadId = this.getAttribute('data-upload-id');
-            if (uploadId) {
-                window.location.href = `/result/${uploadId}/`;
-            }
-        });
+    const grid = document.querySelector('.history-grid');
+    if (!grid) return;
+
+    // One delegated listener covers cards added by lazy loading too
+    grid.addEventListener('click', function(e) {
+        const card = e.target.closest('.history-card');
+        const uploadId = card?.getAttribute('data-upload-id');
+        if (uploadId) {
+            window.location.href = `/result/${uploadId}/`;
+        }
     });
-    
+
     // Optional: Preload images when card is hovered
-    cards.forEach(card => {
-        card.addEventListener('mouseenter', function() {
-            const img = this.querySelector('.card-image img');
-            if (img && !img.loaded) {
-                img.loaded = true;
-                const src = img.getAttribute('src');
-                if (src) {
-                    const preload = new Image();
-                    preload.src = src;
-                }
+    grid.addEventListener('mouseover', function(e) {
+        const img = e.target.closest('.history-card')?.querySelector('.card-image img');
+        if (img && !img.loaded) {
+            img.loaded = true;
+            const src = img.getAttribute('src');
+            if (src) {
+                const preload = new Image();
+                preload.src = src;
             }
-        }, { once: true });
+        }
     });
-});
\ No newline at end of file
+
+    // Further pages are fetched as the end of the grid scrolls into view
+    const sentinel = document.querySelector('.history-sentinel');
+    let nextPageUrl = grid.getAttribute('data-next-page-url');
+    let loading = false;
+    // Failed fetches are retried with a growing delay, then given up on
+    let failures = 0;
+    const MAX_FAILURES = 5;
+
+    function escapeHtml(value) {
+        const div = document.createElement('div');
+        div.textContent = value;
+        return div.innerHTML;
+    }
+
+    function renderCard(item) {
+        const card = document.createElement('div');
+        card.className = 'history-card';
+        card.setAttribute('data-upload-id', item.id);
+        card.innerHTML = `
+            <div class="card-image">
+                <img src="${escapeHtml(item.thumbnail_url)}" alt="Uploaded design" loading="lazy">
+                <div class="card-overlay"></div>
+            </div>
+            <div class="card-details">
+                <div class="detail-group">
+                    <span class="detail-label"><i class="fas fa-cube"></i> Framework</span>
+                    <span class="detail-value">${escapeHtml(item.framework)}</span>
+                </div>
+                <div class="detail-group">
+                    <span class="detail-label"><i class="fas fa-paint-brush"></i> Style</span>
+                    <span class="detail-value">${escapeHtml(item.css_style)}</span>
+                </div>
+                <div class="detail-group">
+                    <span class="detail-label"><i class="far fa-clock"></i> Converted</span>
+                    <span class="detail-value">${escapeHtml(item.created_at)}</span>
+                </div>
+                <div class="card-actions">
+                    <button class="view-btn">View Result</button>
+                </div>
+            </div>`;
+        return card;
+    }
+
+    async function loadNextPage() {
+        if (!nextPageUrl || loading) return;
+        loading = true;
+        try {
+            const response = await fetch(nextPageUrl, { headers: { 'Accept': 'application/json' } });
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            const data = await response.json();
+            const fragment = document.createDocumentFragment();
+            data.items.forEach(item => fragment.appendChild(renderCard(item)));
+            grid.appendChild(fragment);
+            nextPageUrl = data.next_page_url;
+            failures = 0;
+        } catch (error) {
+            // E.g. a login redirect answered with HTML: do not hammer the server
+            console.error('Could not load more history:', error);
+            failures += 1;
+            if (failures >= MAX_FAILURES) {
+                nextPageUrl = null;
+                if (observer) observer.disconnect();
+            } else {
+                setTimeout(loadNextPage, 1000 * 2 ** (failures - 1));
+            }
+            return;
+        } finally {
+            loading = false;
+        }
+        if (!nextPageUrl && observer) {
+            observer.disconnect();
+        } else if (sentinel && sentinel.getBoundingClientRect().top < window.innerHeight + 600) {
+            // Still at the bottom (tall screen): the observer will not fire again
+            loadNextPage();
+        }
+    }
+
+    let observer = null;
+    if (sentinel && nextPageUrl && 'IntersectionObserver' in window) {
+        observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadNextPage();
+            }
+        }, { rootMargin: '600px' });
+        observer.observe(sentinel);
+    }
+});
@@ -0,0 +1,35 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const container = document.getElementById('job');
+    if (!container) return;
+
+    const statusUrl = container.getAttribute('data-status-url');
+    const statusBadge = document.getElementById('job-status');
+    const POLL_MS = 1500;
+
+    function showFailure(error) {
+        document.getElementById('job-icon').className = 'fas fa-exclamation-triangle processing-icon';
+        document.getElementById('job-title').textContent = 'Conversion failed';
+        document.getElementById('job-message').textContent = error || 'Image processing failed';
+        document.getElementById('job-back').classList.remove('hidden');
+        statusBadge.classList.add('failed');
+    }
+
+    function poll() {
+        fetch(statusUrl, { headers: { 'Accept': 'application/json' } })
+            .then(response => response.json())
+            .then(job => {
+                statusBadge.textContent = job.status.charAt(0).toUpperCase() + job.status.slice(1);
+
+                if (job.status === 'done' && job.result_url) {
+                    window.location.href = job.result_url;
+                } else if (job.status === 'failed') {
+                    showFailure(job.error);
+                } else {
+                    setTimeout(poll, POLL_MS);
+                }
+            })
+            .catch(() => setTimeout(poll, POLL_MS * 2));
+    }
+
+    poll();
+});
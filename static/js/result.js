@@ -55,6 +55,16 @@ document.addEventListener('DOMContentLoaded', function() {
                 previewImage.webkitRequestFullscreen();
             }
         });
+
+        // Annotated preview is only fetched when first requested
+        document.getElementById('toggle-detections')?.addEventListener('click', (e) => {
+            const button = e.currentTarget;
+            const showAnnotated = !button.classList.contains('active');
+            previewImage.src = showAnnotated
+                ? previewImage.getAttribute('data-annotated-src')
+                : previewImage.getAttribute('data-original-src');
+            button.classList.toggle('active', showAnnotated);
+        });
     }
 
     // 4. Word Wrap Toggle